@@ -0,0 +1,372 @@
+"""Reproducible performance benchmarks for the Database Manager engine.
+
+Generates synthetic databases and CSV files, drives the operations behind
+the GUI (browsing, search, CSV import/export and backup) headlessly through
+db_engine, and writes throughput, p50/p99 latency and peak RSS to a JSON
+file so runs can be compared across commits:
+
+    python db_benchmark.py --rows 10k 1m --output before.json
+    python db_benchmark.py --rows 10k 1m --output after.json --compare before.json
+
+Generated data is kept in --data-dir and reused by later runs with the same
+row count, column layout and seed.
+"""
+import argparse
+import concurrent.futures
+import csv
+import json
+import multiprocessing
+import os
+import platform
+import random
+import sqlite3
+import subprocess
+import sys
+import time
+from datetime import datetime
+
+from db_engine import DatabaseEngine, fetch_page, quote_ident, PAGE_SIZE
+
+try:
+    import resource
+except ImportError:  # Windows: peak RSS is not reported
+    resource = None
+
+DEFAULT_ROWS = ["10k"]
+DEFAULT_COLUMNS = "int,text,real,text,date"
+COLUMN_TYPES = {"int": "INTEGER", "real": "REAL", "text": "TEXT", "date": "TEXT"}
+GENERATE_CHUNK_SIZE = 10000   # Rows per executemany() call while generating
+MAX_PAGES = 2000              # Pages scrolled by the browse benchmark
+SEARCH_REPEATS = 20           # Searches timed by the search benchmark
+IMPORT_SHARDS = 8             # Files the CSV is split into for the import-files benchmark
+BENCHMARKS = ["browse", "search", "import", "import-files", "export", "backup"]
+WORDS = ["alpha", "bravo", "charlie", "delta", "echo", "foxtrot", "golf", "hotel",
+         "india", "juliet", "kilo", "lima", "mike", "november", "oscar", "papa"]
+
+
+def parse_rows(text):
+    """Parses a row count such as 10000, 10k or 1m."""
+    text = text.strip().lower()
+    multiplier = {"k": 1000, "m": 1000000}.get(text[-1:], 1)
+    digits = text[:-1] if multiplier > 1 else text
+    try:
+        return int(float(digits) * multiplier)
+    except ValueError:
+        raise argparse.ArgumentTypeError(f"invalid row count: {text}")
+
+
+def parse_columns(text):
+    """Parses a column layout such as "int,text,real" into a list of kinds."""
+    kinds = [kind.strip().lower() for kind in text.split(",") if kind.strip()]
+    unknown = [kind for kind in kinds if kind not in COLUMN_TYPES]
+    if not kinds or unknown:
+        raise argparse.ArgumentTypeError(f"columns must be a list of {', '.join(COLUMN_TYPES)}")
+    return kinds
+
+
+def column_names(kinds):
+    return [f"{kind}_{i}" for i, kind in enumerate(kinds)]
+
+
+def synthetic_rows(rows, kinds, seed):
+    """Yields rows deterministic in seed; the first column of each kind is fairly selective."""
+    rng = random.Random(seed)
+    for row_id in range(1, rows + 1):
+        row = []
+        for kind in kinds:
+            if kind == "int":
+                row.append(rng.randrange(1000000))
+            elif kind == "real":
+                row.append(round(rng.uniform(0, 10000), 2))
+            elif kind == "date":
+                row.append(f"20{rng.randrange(10, 26)}-{rng.randrange(1, 13):02d}-{rng.randrange(1, 29):02d}")
+            else:
+                row.append(f"{rng.choice(WORDS)} {rng.choice(WORDS)} {row_id}")
+        yield row
+
+
+def data_paths(data_dir, rows, kinds, seed):
+    stem = f"synthetic-{rows}-{'_'.join(kinds)}-{seed}"
+    return os.path.join(data_dir, stem + ".db"), os.path.join(data_dir, stem + ".csv")
+
+
+def generate_database(path, rows, kinds, seed, table="bench"):
+    """Creates a database at path with one synthetic table of the given size and layout."""
+    part_path = path + ".part"
+    if os.path.exists(part_path):
+        os.remove(part_path)
+    names = column_names(kinds)
+    conn = sqlite3.connect(part_path)
+    try:
+        conn.execute("PRAGMA journal_mode = OFF")
+        conn.execute("PRAGMA synchronous = OFF")
+        columns_sql = ", ".join(f"{quote_ident(name)} {COLUMN_TYPES[kind]}" for name, kind in zip(names, kinds))
+        conn.execute(f"CREATE TABLE {quote_ident(table)} (id INTEGER PRIMARY KEY, {columns_sql})")
+        insert = (f"INSERT INTO {quote_ident(table)} ({', '.join(quote_ident(n) for n in names)}) "
+                  f"VALUES ({', '.join('?' * len(names))})")
+        data = synthetic_rows(rows, kinds, seed)
+        while True:
+            chunk = [row for _, row in zip(range(GENERATE_CHUNK_SIZE), data)]
+            if not chunk:
+                break
+            conn.executemany(insert, chunk)
+        conn.commit()
+    finally:
+        conn.close()
+    os.replace(part_path, path)
+
+
+def generate_csv(path, rows, kinds, seed):
+    """Writes a CSV file with a header row and the same synthetic rows as generate_database."""
+    part_path = path + ".part"
+    with open(part_path, "w", newline="", encoding="utf-8") as f:
+        writer = csv.writer(f)
+        writer.writerow(column_names(kinds))
+        writer.writerows(synthetic_rows(rows, kinds, seed))
+    os.replace(part_path, path)
+
+
+def ensure_shards(csv_path, shards):
+    """Splits csv_path into shards files (each with the header), unless that was done before; returns their paths."""
+    stem = os.path.splitext(csv_path)[0]
+    paths = [f"{stem}-shard{i + 1}of{shards}.csv" for i in range(shards)]
+    if all(os.path.exists(path) for path in paths):
+        return paths
+    with open(csv_path, newline="", encoding="utf-8") as source:
+        reader = csv.reader(source)
+        header = next(reader)
+        files = [open(path + ".part", "w", newline="", encoding="utf-8") for path in paths]
+        try:
+            writers = [csv.writer(f) for f in files]
+            for writer in writers:
+                writer.writerow(header)
+            for i, row in enumerate(reader):
+                writers[i % shards].writerow(row)
+        finally:
+            for f in files:
+                f.close()
+    for path in paths:
+        os.replace(path + ".part", path)
+    return paths
+
+
+def ensure_data(data_dir, rows, kinds, seed):
+    """Returns (db_path, csv_path), generating whichever does not exist yet."""
+    os.makedirs(data_dir, exist_ok=True)
+    db_path, csv_path = data_paths(data_dir, rows, kinds, seed)
+    if not os.path.exists(db_path):
+        print(f"Generating {rows:,}-row database...", file=sys.stderr)
+        generate_database(db_path, rows, kinds, seed)
+    if not os.path.exists(csv_path):
+        print(f"Generating {rows:,}-row CSV...", file=sys.stderr)
+        generate_csv(csv_path, rows, kinds, seed)
+    return db_path, csv_path
+
+
+def percentile(values, pct):
+    """Returns the pct-th percentile of values (nearest rank), or None if empty."""
+    if not values:
+        return None
+    ordered = sorted(values)
+    rank = max(1, -(-len(ordered) * pct // 100))
+    return ordered[int(rank) - 1]
+
+
+def peak_rss_kib():
+    """Returns the peak resident set size of this process in KiB, where the platform reports it."""
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak // 1024 if sys.platform == "darwin" else peak  # bytes on macOS, KiB on Linux
+
+
+class TimingTask:
+    """Task object (see db_engine) that records the time between progress emits as latencies."""
+    def __init__(self):
+        self.cancelled = False
+        self.rows = 0
+        self.latencies = []
+        self.last = time.perf_counter()
+
+    def emit(self, payload):
+        now = time.perf_counter()
+        self.latencies.append(now - self.last)
+        self.last = now
+
+
+# --------------------- Benchmarks --------------------- #
+# Each returns (operations, items processed, unit, latencies in seconds)
+def bench_browse(engine, table, options):
+    """Opens the table and scrolls through it page by page, as load_table_data does."""
+    page_key = engine.page_key(table)
+    latencies, last_key, loaded = [], None, 0
+    for _ in range(options["max_pages"]):
+        started = time.perf_counter()
+        rows, last_key = fetch_page(engine.reader, table, page_key, last_key, loaded, PAGE_SIZE)
+        latencies.append(time.perf_counter() - started)
+        loaded += len(rows)
+        if len(rows) < PAGE_SIZE:
+            break
+    engine.count(table)
+    return len(latencies), loaded, "rows", latencies
+
+
+def bench_search(engine, table, options):
+    """Runs searches as filter_data does: first page plus the matching row count."""
+    rng = random.Random(options["seed"])
+    page_key = engine.page_key(table)
+    latencies = []
+    for _ in range(options["search_repeats"]):
+        term = rng.choice(WORDS)
+        started = time.perf_counter()
+        where, params = engine.search_filter(table, term)
+        fetch_page(engine.reader, table, page_key, None, 0, PAGE_SIZE, where, params)
+        engine.count(table, where, params)
+        latencies.append(time.perf_counter() - started)
+    return len(latencies), len(latencies), "searches", latencies
+
+
+def bench_import(engine, table, options):
+    """Imports the synthetic CSV into a fresh table, as import_csv_to_table does."""
+    task = TimingTask()
+    rows = engine.import_csv(options["csv_path"], "bench_import", task=task, create_table=True,
+                             coerce_types=True, relax_durability=options["relax_durability"])
+    return len(task.latencies), rows, "rows", task.latencies
+
+
+def bench_import_files(engine, table, options):
+    """Imports the CSV split into shards, parsed in parallel, as importing several files does."""
+    task = TimingTask()
+    results = engine.import_csv_files(ensure_shards(options["csv_path"], options["shards"]), "bench_import",
+                                      task=task, create_table=True, coerce_types=True,
+                                      relax_durability=options["relax_durability"], workers=options["workers"])
+    return len(task.latencies), sum(result["rows"] for result in results), "rows", task.latencies
+
+
+def bench_export(engine, table, options):
+    """Streams the whole table to a CSV file, as export_table_csv does."""
+    task = TimingTask()
+    target = os.path.join(options["work_dir"], "export.csv")
+    rows = engine.export_table(table, target, task=task)
+    os.remove(target)
+    return len(task.latencies), rows, "rows", task.latencies
+
+
+def bench_backup(engine, table, options):
+    """Copies the database with the online backup API, as backup_database does."""
+    task = TimingTask()
+    target = os.path.join(options["work_dir"], "backup.db")
+    engine.backup(target, pause=0, task=task)
+    size = os.path.getsize(target)
+    os.remove(target)
+    return len(task.latencies), size / 1024 ** 2, "MiB", task.latencies
+
+
+BENCHMARK_FUNCTIONS = {"browse": bench_browse, "search": bench_search, "import": bench_import,
+                       "import-files": bench_import_files, "export": bench_export, "backup": bench_backup}
+
+
+def run_benchmark(name, db_path, options):
+    """Runs one benchmark and returns its result; called in a fresh process so peak RSS is its own."""
+    work_db = db_path
+    if name in ("import", "import-files"):
+        work_db = os.path.join(options["work_dir"], "import.db")
+        if os.path.exists(work_db):
+            os.remove(work_db)
+        engine = DatabaseEngine.create(work_db)
+    else:
+        engine = DatabaseEngine(db_path)
+    try:
+        started = time.perf_counter()
+        operations, amount, unit, latencies = BENCHMARK_FUNCTIONS[name](engine, "bench", options)
+        seconds = time.perf_counter() - started
+    finally:
+        engine.close()
+        if work_db != db_path:
+            os.remove(work_db)
+    p50, p99 = percentile(latencies, 50), percentile(latencies, 99)
+    return {
+        "benchmark": name,
+        "operations": operations,
+        "seconds": round(seconds, 6),
+        "throughput": round(amount / seconds, 2) if seconds else None,
+        "unit": f"{unit}/s",
+        "p50_ms": None if p50 is None else round(p50 * 1000, 3),
+        "p99_ms": None if p99 is None else round(p99 * 1000, 3),
+        "peak_rss_kib": peak_rss_kib(),
+    }
+
+
+def environment():
+    """Describes the machine and code a run was made on."""
+    try:
+        commit = subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True,
+                                cwd=os.path.dirname(os.path.abspath(__file__)), timeout=10).stdout.strip()
+    except (OSError, subprocess.SubprocessError):
+        commit = ""
+    return {"commit": commit or None, "python": platform.python_version(), "sqlite": sqlite3.sqlite_version,
+            "platform": platform.platform(), "cpus": os.cpu_count()}
+
+
+def compare(results, baseline):
+    """Prints the throughput change of every result found in the baseline run."""
+    previous = {(r["rows"], r["columns"], r["benchmark"]): r for r in baseline["results"]}
+    print(f"\nCompared with {baseline['environment'].get('commit') or 'baseline'}:")
+    for result in results:
+        old = previous.get((result["rows"], result["columns"], result["benchmark"]))
+        if old and old["throughput"] and result["throughput"]:
+            change = result["throughput"] / old["throughput"] - 1
+            print(f"  {result['benchmark']:<12} {result['rows']:>12,} rows  throughput {change:+.1%}  "
+                  f"p99 {old['p99_ms']} -> {result['p99_ms']} ms")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark the Database Manager engine on synthetic data.")
+    parser.add_argument("--rows", nargs="+", type=parse_rows, default=[parse_rows(r) for r in DEFAULT_ROWS],
+                        help="table sizes, e.g. 10k 1m 10m (default: %(default)s)")
+    parser.add_argument("--columns", type=parse_columns, default=parse_columns(DEFAULT_COLUMNS),
+                        help=f"column layout from {', '.join(COLUMN_TYPES)} (default: {DEFAULT_COLUMNS})")
+    parser.add_argument("--benchmarks", nargs="+", choices=BENCHMARKS, default=BENCHMARKS)
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--data-dir", default="bench_data", help="where generated data is kept")
+    parser.add_argument("--max-pages", type=int, default=MAX_PAGES)
+    parser.add_argument("--search-repeats", type=int, default=SEARCH_REPEATS)
+    parser.add_argument("--fast-import", dest="relax_durability", action="store_true",
+                        help="import with relaxed durability")
+    parser.add_argument("--shards", type=int, default=IMPORT_SHARDS, help="files for the import-files benchmark")
+    parser.add_argument("--workers", type=int, help="parsing processes for import-files (default: one per core)")
+    parser.add_argument("--output", default="benchmark-results.json")
+    parser.add_argument("--compare", metavar="JSON", help="earlier results to compare against")
+    args = parser.parse_args(argv)
+
+    results = []
+    # spawn gives every benchmark a fresh interpreter on all platforms
+    context = multiprocessing.get_context("spawn")
+    for rows in args.rows:
+        db_path, csv_path = ensure_data(args.data_dir, rows, args.columns, args.seed)
+        options = {"csv_path": csv_path, "work_dir": args.data_dir, "seed": args.seed,
+                   "max_pages": args.max_pages, "search_repeats": args.search_repeats,
+                   "relax_durability": args.relax_durability, "shards": args.shards, "workers": args.workers}
+        if "import-files" in args.benchmarks:
+            ensure_shards(csv_path, args.shards)  # Not part of the timing
+        for name in args.benchmarks:
+            with concurrent.futures.ProcessPoolExecutor(max_workers=1, mp_context=context) as pool:
+                result = pool.submit(run_benchmark, name, db_path, options).result()
+            result.update(rows=rows, columns=",".join(args.columns))
+            results.append(result)
+            print(f"{name:<12} {rows:>12,} rows  {result['throughput']:>14,.0f} {result['unit']:<10} "
+                  f"p50 {result['p50_ms']} ms  p99 {result['p99_ms']} ms  peak RSS {result['peak_rss_kib']} KiB")
+
+    report = {"started": datetime.now().isoformat(timespec="seconds"), "environment": environment(),
+              "results": results}
+    with open(args.output, "w", encoding="utf-8") as f:
+        json.dump(report, f, indent=2)
+    print(f"Results written to {args.output}")
+    if args.compare:
+        with open(args.compare, encoding="utf-8") as f:
+            compare(results, json.load(f))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
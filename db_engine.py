@@ -0,0 +1,3877 @@
+"""Headless SQLite engine behind the Database Manager, with a command-line interface.
+
+This module never imports tkinter, so it starts quickly and can be
+scripted, benchmarked and run on servers without a display. Run
+``python db_engine.py --help`` for the batch commands.
+
+Long-running functions accept an optional task: any object with a
+``cancelled`` flag, a ``rows`` counter and an ``emit(payload)`` method.
+The GUI passes a BackgroundTask, the command line a ConsoleProgress.
+"""
+import argparse
+import base64
+import copy
+import csv
+import gzip
+import hashlib
+import itertools
+import io
+import json
+import math
+import multiprocessing
+import os
+import pickle
+import queue
+import random
+import re
+import shutil
+import signal
+import sqlite3
+import sys
+import tempfile
+import threading
+import time
+from collections import Counter, OrderedDict, deque
+from concurrent.futures import ProcessPoolExecutor
+from contextlib import contextmanager
+from datetime import datetime, timedelta
+from urllib.request import pathname2url
+
+try:
+    import numpy as np
+except ImportError:  # Optional: only columnar snapshots need it
+    np = None
+
+PAGE_SIZE = 500              # Rows fetched per page when browsing a table
+
+# Connection tuning (see ConnectionManager)
+DEFAULT_CACHE_SIZE = -65536          # Page cache per connection; negative values are KiB (64 MiB)
+DEFAULT_MMAP_SIZE = 256 * 1024 ** 2  # Bytes of the database file to memory-map
+DEFAULT_STATEMENT_CACHE = 256        # Prepared statements kept per connection
+MAX_IDLE_READERS = 4                 # Pooled read-only connections kept for background work
+
+# Concurrent access (see retry_busy and ReadSnapshot)
+DEFAULT_BUSY_TIMEOUT_MS = 5000       # How long a statement waits for another connection's lock
+DEFAULT_WRITE_RETRIES = 5            # Extra attempts for a write transaction that still finds the database locked
+WRITE_RETRY_BACKOFF = 0.05           # Seconds before the first retry; doubled (with jitter) for each further one
+FOREGROUND_WRITE_WAIT = 0.5          # Seconds the GUI thread waits for another thread's write before giving up
+JOURNAL_MODES = ("delete", "truncate", "persist", "memory", "wal", "off")
+CHECKPOINT_MODES = ("PASSIVE", "FULL", "RESTART", "TRUNCATE")
+
+# Queries
+FETCH_BATCH_SIZE = 500       # Rows per fetchmany() call when streaming results
+MAX_RESULT_ROWS = 10000      # Default cap on rows fetched per statement in the Run Query window
+PROFILE_OPCODES = 100        # VM instructions per progress callback while profiling
+MAX_WORKLOAD_ENTRIES = 500   # Distinct normalized statements kept in a WorkloadLog
+
+# Result cache (see PageCache)
+DEFAULT_CACHE_BUDGET = 64 * 1024 ** 2  # Bytes of cached pages and query results per database
+CACHE_ENTRY_SHARE = 4                  # No single entry may take more than 1/4 of the budget
+
+# Instrumentation (see Metrics)
+METRICS_SAMPLES = 200        # Latest timings per operation kept for the rolling percentiles
+TRACE_EVENTS = 20000         # Operations and traced statements kept for a trace dump
+TRACE_SQL_CHARS = 1000       # Characters of a traced statement kept
+
+# Comparing databases (see diff_table)
+DIFF_ALIAS = "other"         # Schema name the compared database is attached as
+DIFF_CHUNK_ROWS = 10000      # Consecutive rows hashed together; only chunks whose hashes differ are read
+DIFF_ROWS_KEPT = 1000        # Differing rows listed per table (all are counted)
+DIFF_OPCODES = 1000          # VM instructions between cancellation checks while comparing
+
+# Storage maintenance (see storage_objects and vacuum_into)
+AUTO_VACUUM_MODES = ("none", "full", "incremental")  # In the order of PRAGMA auto_vacuum's numeric values
+VACUUM_OPCODES = 1000000     # VM instructions between progress reports (and cancellation checks) of VACUUM INTO
+VACUUM_CACHE_SIZE = -2048    # KiB of page cache during VACUUM INTO; kept small so the copy reaches disk (and
+                             # shows progress) as it is written instead of all at the end
+
+# CSV import (see import_csv)
+IMPORT_CHUNK_SIZE = 10000    # Rows per executemany() call
+TYPE_SAMPLE_ROWS = 1000      # Rows sampled to infer column types for a new table
+IMPORT_QUEUE_CHUNKS = 8      # Parsed chunks buffered between the parsing processes and the writer
+MAX_ERROR_ROWS = 100         # Error rows kept per file in a multi-file import (all are counted)
+
+# CSV export (see export_csv)
+EXPORT_CHUNK_SIZE = 5000     # Rows per fetchmany() call while writing
+
+# Columnar snapshots (see export_columnar)
+COLUMNAR_MANIFEST = "manifest.json"
+COLUMNAR_FORMAT_VERSION = 1
+
+# Online backup (see backup_to_file)
+BACKUP_PAGES_PER_STEP = 256  # Pages copied per backup step
+BACKUP_STEP_PAUSE = 0.005    # Seconds to pause between steps so writers are not starved
+SNAPSHOTS_TO_KEEP = 5
+
+# SQL dumps (see dump_database and restore_dump)
+DUMP_INSERT_ROWS = 500       # Rows per multi-row INSERT statement
+DUMP_WORKERS = 4             # Tables dumped at once, each on its own read-only connection
+DUMP_COMPRESSLEVEL = 1       # gzip level of compressed dumps; higher levels shrink SQL little and cost a lot
+
+# Column profiles (see sample_column_profiles and exact_column_profiles)
+PROFILE_SAMPLE_ROWS = 10000  # Rows sampled for the first, approximate profile
+PROFILE_TOP_K = 10           # Most frequent values listed per column
+PROFILE_HISTOGRAM_BINS = 20  # Buckets of the numeric histogram
+PROFILE_COUNTED_VALUES = 250000  # Distinct values the exact profile counts in memory, over all columns
+
+# Search (see search_filter and search_tables)
+FTS_SUFFIX = "_fts"          # Name suffix of a table's FTS5 search index
+SEARCH_WORKERS = 4           # Threads (each with its own read-only connection) searching all tables
+SEARCH_HITS_PER_TABLE = 100  # Matches reported per table by a database-wide search
+SEARCH_OPCODES = 1000        # VM instructions between cancellation checks of a database-wide search
+SEARCH_VALUE_CHARS = 200     # Characters of a matching value kept in a database-wide search hit
+
+# Command line
+PROGRESS_INTERVAL = 0.5      # Seconds between progress lines on stderr
+
+
+def quote_ident(name):
+    """Quotes an identifier (table or column name) for use in SQL."""
+    return '"' + str(name).replace('"', '""') + '"'
+
+
+def fetch_page(conn, table, page_key, last_key, offset, page_size, where=None, params=(), workload=None,
+               with_keys=False, order=None):
+    """Fetches one page of table and returns (rows, last_key).
+
+    With a page_key ("rowid" or a single-column primary key) the page starts
+    after last_key (keyset pagination), so every page costs the same no matter
+    how deep into the table it is; without one it falls back to OFFSET.
+    An optional where clause (with its params) restricts the rows, e.g. to
+    the current search. The query is recorded in workload, if given. With
+    with_keys (and a page_key) every row starts with its page_key value.
+
+    order is an optional (column, descending) sort. Rows are then ordered by
+    the column with page_key breaking ties, and last_key is the
+    (column value, page_key value) pair of the last row.
+    """
+    table = quote_ident(table)
+    conditions = [where] if where else []
+    params = list(params)
+    started = time.perf_counter()
+    if page_key is None:
+        where_sql = f" WHERE {' AND '.join(conditions)}" if conditions else ""
+        order_sql = ""
+        if order is not None:
+            column, descending = order
+            order_sql = f" ORDER BY {quote_ident(column)}{' DESC' if descending else ''}"
+        sql = f"SELECT * FROM {table}{where_sql}{order_sql} LIMIT ? OFFSET ?"
+        params += [page_size, offset]
+        rows = conn.execute(sql, params).fetchall()
+    elif order is None or order[0] == page_key:
+        key = quote_ident(page_key)
+        descending = order is not None and order[1]
+        if last_key is not None:
+            conditions.append(f"{key} {'<' if descending else '>'} ?")
+            params.append(last_key)
+        where_sql = f" WHERE {' AND '.join(conditions)}" if conditions else ""
+        sql = f"SELECT {key}, * FROM {table}{where_sql} ORDER BY {key}{' DESC' if descending else ''} LIMIT ?"
+        params.append(page_size)
+        keyed_rows = conn.execute(sql, params).fetchall()
+        if keyed_rows:
+            last_key = keyed_rows[-1][0]
+        rows = keyed_rows if with_keys else [row[1:] for row in keyed_rows]
+    else:
+        column, descending = order
+        key, column = quote_ident(page_key), quote_ident(column)
+        if last_key is not None:
+            condition, condition_params = keyset_condition(column, key, descending, last_key)
+            conditions.append(condition)
+            params += condition_params
+        where_sql = f" WHERE {' AND '.join(conditions)}" if conditions else ""
+        direction = " DESC" if descending else ""
+        sql = (f"SELECT {column}, {key}, * FROM {table}{where_sql} "
+               f"ORDER BY {column}{direction}, {key}{direction} LIMIT ?")
+        params.append(page_size)
+        keyed_rows = conn.execute(sql, params).fetchall()
+        if keyed_rows:
+            last_key = tuple(keyed_rows[-1][:2])
+        rows = [row[1:] for row in keyed_rows] if with_keys else [row[2:] for row in keyed_rows]
+    if workload is not None:
+        workload.record(conn, sql, params, time.perf_counter() - started, "browse")
+    return rows, last_key
+
+
+def keyset_condition(column, key, descending, last_key):
+    """Returns (sql, params) selecting the rows after last_key in ORDER BY column, key (both quoted).
+
+    SQLite sorts NULLs first, so they come before every value ascending and
+    after every value descending; the row-value comparison lets an index on
+    column serve the range.
+    """
+    value, last = last_key
+    if not descending:
+        if value is None:
+            return f"({column} IS NOT NULL OR {key} > ?)", [last]
+        return f"({column}, {key}) > (?, ?)", [value, last]
+    if value is None:
+        return f"({column} IS NULL AND {key} < ?)", [last]
+    return f"(({column}, {key}) < (?, ?) OR {column} IS NULL)", [value, last]
+
+
+def sort_plan(conn, table, page_key, column, descending=False, where=None, params=()):
+    """Returns the query plan of the first page of table sorted by column (see fetch_page)."""
+    table, column = quote_ident(table), quote_ident(column)
+    direction = " DESC" if descending else ""
+    order_sql = f"{column}{direction}" + (f", {quote_ident(page_key)}{direction}" if page_key else "")
+    where_sql = f" WHERE {where}" if where else ""
+    return query_plan(conn, f"SELECT * FROM {table}{where_sql} ORDER BY {order_sql} LIMIT ?",
+                      list(params) + [PAGE_SIZE])
+
+
+def index_statement(table, columns):
+    """Returns (index_name, CREATE INDEX statement) for an index of table on columns."""
+    index_name = "idx_" + re.sub(r"\W+", "_", "_".join([table] + columns)).strip("_")
+    return index_name, (f"CREATE INDEX {quote_ident(index_name)} ON {quote_ident(table)} ("
+                        + ", ".join(quote_ident(col) for col in columns) + ")")
+
+
+def split_statements(script):
+    """Splits an SQL script into complete statements, respecting quotes and comments."""
+    statements, buffer = [], ""
+    for piece in script.split(";"):
+        buffer += piece + ";"
+        if sqlite3.complete_statement(buffer):
+            statements.append(buffer)
+            buffer = ""
+    if buffer.strip(" \t\r\n;"):
+        statements.append(buffer.rstrip(";"))
+    return [statement.strip() for statement in statements if statement.strip(" \t\r\n;")]
+
+
+def iter_script_results(conn, statements, max_rows=MAX_RESULT_ROWS, batch_size=FETCH_BATCH_SIZE, workload=None):
+    """Runs statements in order and yields their results as events.
+
+    For each statement i this yields ("columns", i, names) and then
+    ("rows", i, batch) per fetched batch when it returns rows (detected from
+    cursor.description, so WITH, PRAGMA and EXPLAIN work like SELECT), and
+    finally ("done", i, count, truncated): the rows fetched, or rows
+    affected for other statements. At most max_rows rows are fetched per
+    statement; truncated tells whether more were available. Each statement
+    is recorded in workload, if given. Transaction control is left to the
+    caller.
+    """
+    for index, sql in enumerate(statements):
+        started = time.perf_counter()
+        cursor = conn.execute(sql)
+        if cursor.description is None:
+            if workload is not None:
+                workload.record(conn, sql, (), time.perf_counter() - started, "query")
+            yield ("done", index, cursor.rowcount, False)
+            continue
+        yield ("columns", index, [description[0] for description in cursor.description])
+        fetched, truncated = 0, False
+        while True:
+            limit = batch_size if max_rows is None else min(batch_size, max_rows - fetched)
+            if limit <= 0:
+                truncated = cursor.fetchone() is not None
+                break
+            batch = cursor.fetchmany(limit)
+            if not batch:
+                break
+            fetched += len(batch)
+            yield ("rows", index, batch)
+        cursor.close()
+        if workload is not None:
+            # Time spent in the UI consuming batches is included; it is small next to slow queries
+            workload.record(conn, sql, (), time.perf_counter() - started, "query")
+        yield ("done", index, fetched, truncated)
+
+
+# Progress handler installed through progress_handler on each connection, by id(connection)
+_progress_handlers = {}
+
+
+@contextmanager
+def progress_handler(conn, handler, opcodes):
+    """Installs handler as conn's SQLite progress handler for the with block, then restores the previous one.
+
+    sqlite3 cannot report the handler in place, so only handlers installed
+    through this function are restored; anything else is cleared.
+    """
+    previous = _progress_handlers.get(id(conn))
+    _progress_handlers[id(conn)] = (handler, opcodes)
+    conn.set_progress_handler(handler, opcodes)
+    try:
+        yield
+    finally:
+        if previous is None:
+            del _progress_handlers[id(conn)]
+            conn.set_progress_handler(None, 0)
+        else:
+            _progress_handlers[id(conn)] = previous
+            conn.set_progress_handler(*previous)
+
+
+def query_plan(conn, sql, params=()):
+    """Returns the EXPLAIN QUERY PLAN rows (id, parent, detail) of sql."""
+    return [row[:2] + row[3:] for row in conn.execute("EXPLAIN QUERY PLAN " + sql, params).fetchall()]
+
+
+def format_plan(plan):
+    """Renders query plan rows as an indented tree."""
+    depth = {0: -1}
+    lines = []
+    for node_id, parent, detail in plan:
+        depth[node_id] = depth.get(parent, -1) + 1
+        lines.append("  " * depth[node_id] + "- " + detail)
+    return "\n".join(lines)
+
+
+def plan_warnings(plan):
+    """Flags full table scans and temporary B-tree sorts in a query plan."""
+    warnings = []
+    for _, _, detail in plan:
+        if detail.startswith("SCAN ") and "INDEX" not in detail and "VIRTUAL TABLE" not in detail:
+            warnings.append(f"Full table scan: {detail}")
+        elif "TEMP B-TREE" in detail:
+            warnings.append(f"Temporary B-tree sort: {detail}")
+        elif "AUTOMATIC" in detail:
+            warnings.append(f"Automatic (transient) index: {detail}")
+    return warnings
+
+
+def statement_counters(conn, sql):
+    """Returns SQLite's status counters for sql from the sqlite_stmt virtual table, or None if unavailable.
+
+    Counters are cumulative for a prepared statement, so callers compare
+    readings taken before and after a run.
+    """
+    try:
+        row = conn.execute("SELECT nscan, nsort, naidx, nstep, run FROM sqlite_stmt WHERE sql = ?", (sql,)).fetchone()
+    except sqlite3.OperationalError:
+        return None
+    return dict(zip(("fullscan_steps", "sorts", "autoindexes", "vm_steps", "runs"), row or (0, 0, 0, 0, 0)))
+
+
+def profile_query(conn, sql, opcodes=PROFILE_OPCODES, task=None):
+    """Runs sql once and returns a profile of it as a dict.
+
+    The profile holds the query plan and its warnings, the time spent
+    preparing the statement (until the first VM instruction ran, so close to
+    zero when it came from the statement cache) and executing it, the rows
+    produced, the VM steps counted by a progress handler and, where SQLite
+    exposes them, the statement's full-scan step, sort and automatic-index
+    counters. The statement runs inside a savepoint that is rolled back, so
+    profiling a write changes nothing.
+    """
+    plan = query_plan(conn, sql)
+    marks = {"first": None, "calls": 0}
+
+    def on_progress():
+        marks["calls"] += 1
+        if marks["first"] is None:
+            marks["first"] = time.perf_counter()
+        return 1 if task is not None and task.cancelled else 0
+
+    before = statement_counters(conn, sql)
+    conn.execute("SAVEPOINT profile_query")
+    rows = 0
+    try:
+        with progress_handler(conn, on_progress, opcodes):
+            start = time.perf_counter()
+            cursor = conn.execute(sql)
+            while True:
+                batch = cursor.fetchmany(FETCH_BATCH_SIZE)
+                if not batch:
+                    break
+                rows += len(batch)
+            end = time.perf_counter()
+    finally:
+        conn.execute("ROLLBACK TO profile_query")
+        conn.execute("RELEASE profile_query")
+    after = statement_counters(conn, sql)
+    prepare = (marks["first"] or end) - start
+    counters = None
+    if before is not None and after is not None:
+        counters = {name: after[name] - before[name] for name in after if name != "runs"}
+    return {"sql": sql, "plan": plan, "warnings": plan_warnings(plan), "prepare": prepare,
+            "execute": end - start - prepare, "rows": rows, "vm_steps": marks["calls"] * opcodes,
+            "counters": counters}
+
+
+def format_profile(profile):
+    """Renders a profile_query() result as text."""
+    lines = [profile["sql"], "", "Query plan:", format_plan(profile["plan"]) or "(none)", "",
+             f"Prepare time: {profile['prepare'] * 1000:.3f} ms",
+             f"Execute time: {profile['execute'] * 1000:.3f} ms",
+             f"Rows produced: {profile['rows']:,}",
+             f"VM steps (progress handler): ~{profile['vm_steps']:,}"]
+    counters = profile["counters"]
+    if counters is not None:
+        lines += [f"VM steps (status counter): {counters['vm_steps']:,}",
+                  f"Full-scan steps: {counters['fullscan_steps']:,}",
+                  f"Sort operations: {counters['sorts']:,}",
+                  f"Automatic index rows: {counters['autoindexes']:,}"]
+    else:
+        lines.append("Statement status counters are not available in this SQLite build.")
+    if profile["warnings"]:
+        lines += ["", "Warnings:"] + [" ! " + warning for warning in profile["warnings"]]
+    else:
+        lines += ["", "No full table scans or temporary sorts."]
+    return "\n".join(lines)
+
+
+def normalize_sql(sql):
+    """Normalizes a statement for the workload log: literals become ?, whitespace is collapsed."""
+    sql = re.sub(r"'(?:[^']|'')*'", "?", sql)
+    sql = re.sub(r"(?<![\w\"])-?\d+(?:\.\d+)?(?:[eE][-+]?\d+)?\b", "?", sql)
+    sql = re.sub(r"\(\s*\?(?:\s*,\s*\?)*\s*\)", "(?)", sql)
+    sql = re.sub(r"\s*(<=|>=|==|!=|<>|=|<|>|,)\s*", lambda match: " " + match.group(1) + " ", sql)
+    return " ".join(sql.split()).replace(" , ", ", ").rstrip(";")
+
+
+def sql_identifiers(text):
+    """Returns the bare or double-quoted identifiers in an SQL fragment, without qualifiers."""
+    return [quoted.replace('""', '"') if quoted else bare
+            for quoted, bare in re.findall(r'"((?:[^"]|"")*)"|([A-Za-z_]\w*)', text)]
+
+
+def candidate_columns(sql, columns):
+    """Guesses (equality_columns, range_columns, order_columns) of sql that belong to columns.
+
+    A deliberately simple scan of the WHERE and ORDER BY clauses: enough to
+    spot the filter and sort columns of typical browsing and report
+    queries, while anything it gets wrong is caught by verify_index.
+    """
+    known = {name.lower(): name for name in columns}
+    ident = r'(?:\w+\.)?("(?:[^"]|"")*"|[A-Za-z_]\w*)'
+    where = re.search(r"\bWHERE\b(.*?)(?:\bGROUP\s+BY\b|\bORDER\s+BY\b|\bLIMIT\b|$)", sql, re.I | re.S)
+    equality, ranges = [], []
+    if where:
+        for name, operator in re.findall(ident + r"\s*(==|=|\bIS\b|\bIN\b|<=|>=|<|>|\bBETWEEN\b)",
+                                         where.group(1), re.I):
+            column = known.get(sql_identifiers(name)[0].lower()) if sql_identifiers(name) else None
+            if column is None:
+                continue
+            target = equality if operator.upper() in ("=", "==", "IS", "IN") else ranges
+            if column not in equality + ranges:
+                target.append(column)
+    order = []
+    order_by = re.search(r"\bORDER\s+BY\b(.*?)(?:\bLIMIT\b|$)", sql, re.I | re.S)
+    if order_by:
+        for term in order_by.group(1).split(","):
+            names = [known.get(name.lower()) for name in sql_identifiers(term)
+                     if name.upper() not in ("ASC", "DESC", "COLLATE", "NULLS", "FIRST", "LAST")]
+            if len(names) == 1 and names[0] is not None:
+                order.append(names[0])
+            else:
+                break  # Expressions cannot be served by a plain column index
+    return equality, ranges, order
+
+
+def scratch_schema_copy(conn):
+    """Returns an in-memory database with the schema (and planner statistics) of conn but no rows."""
+    scratch = sqlite3.connect(":memory:")
+    for (sql,) in conn.execute("SELECT sql FROM sqlite_master WHERE sql IS NOT NULL "
+                               "AND name NOT LIKE 'sqlite_%' ORDER BY rowid").fetchall():
+        try:
+            scratch.execute(sql)
+        except sqlite3.Error:
+            pass  # e.g. shadow tables already created by their virtual table
+    try:
+        stats = conn.execute("SELECT tbl, idx, stat FROM sqlite_stat1").fetchall()
+    except sqlite3.OperationalError:
+        stats = []
+    if stats:
+        scratch.execute("ANALYZE sqlite_master")  # Creates an empty sqlite_stat1
+        scratch.executemany("INSERT INTO sqlite_stat1 VALUES (?, ?, ?)", stats)
+        scratch.execute("ANALYZE sqlite_master")  # Reloads the copied statistics
+    return scratch
+
+
+def verify_index(scratch, create_sql, index_name, sql, params=()):
+    """Re-plans sql in scratch with a hypothetical index; returns (used, plan_with_index)."""
+    scratch.execute(create_sql)
+    try:
+        plan = query_plan(scratch, sql, params)
+    finally:
+        scratch.execute(f"DROP INDEX {quote_ident(index_name)}")
+    return any(index_name in detail for _, _, detail in plan), plan
+
+
+def advise_indexes(conn, catalog, entries):
+    """Proposes CREATE INDEX statements for the full scans and sorts in workload entries.
+
+    Each proposal is checked by re-planning the sample statement with the
+    index in a schema-only scratch copy of the database; only proposals the
+    planner would actually use are returned. The estimated benefit is the
+    time the affected statements have taken so far, which the index would
+    mostly save on future runs. Proposals are sorted by that benefit.
+    """
+    scratch = scratch_schema_copy(conn)
+    proposals = {}
+    try:
+        for entry in entries:
+            sql, params = entry["sample"]
+            plan = entry["plan"] or []
+            problems = [detail for _, _, detail in plan
+                        if (detail.startswith("SCAN ") and "INDEX" not in detail) or "TEMP B-TREE" in detail]
+            if not problems:
+                continue
+            scanned = {sql_identifiers(detail[5:])[0] for detail in problems
+                       if detail.startswith("SCAN ") and sql_identifiers(detail[5:])}
+            for table in scanned & set(catalog.tables()):
+                equality, ranges, order = candidate_columns(entry["sql"], catalog.column_names(table))
+                columns = equality + ranges[:1] if equality or ranges else order
+                if not columns:
+                    continue
+                existing = [index[3] for index in catalog.indexes(table)]
+                if any(index[:len(columns)] == columns for index in existing):
+                    continue
+                index_name, create_sql = index_statement(table, columns)
+                key = (table, tuple(columns))
+                if key not in proposals:
+                    try:
+                        used, new_plan = verify_index(scratch, create_sql, index_name, sql, params)
+                    except sqlite3.Error:
+                        continue
+                    if not used:
+                        continue
+                    proposals[key] = {"table": table, "columns": columns, "sql": create_sql,
+                                      "plan": new_plan, "statements": [], "runs": 0, "benefit": 0.0}
+                proposal = proposals[key]
+                proposal["statements"].append(entry["sql"])
+                proposal["runs"] += entry["count"]
+                proposal["benefit"] += entry["total"]
+    finally:
+        scratch.close()
+    return sorted(proposals.values(), key=lambda proposal: proposal["benefit"], reverse=True)
+
+
+def type_converter(declared_type):
+    """Returns the Python converter matching a column's declared type affinity, or None for text."""
+    declared_type = (declared_type or "").upper()
+    if "INT" in declared_type:
+        return int
+    if any(name in declared_type for name in ("REAL", "FLOA", "DOUB")):
+        return float
+    return None
+
+
+def coerce_value(convert, value):
+    """Converts a CSV field with convert, mapping empty fields to NULL and keeping unparsable ones as text."""
+    if value == "":
+        return None
+    try:
+        return convert(value)
+    except ValueError:
+        return value
+
+
+def infer_column_types(rows, width):
+    """Infers INTEGER, REAL or TEXT for each of width columns from sample rows."""
+    types = []
+    for index in range(width):
+        values = [row[index] for row in rows if index < len(row) and row[index] != ""]
+        for name, convert in (("INTEGER", int), ("REAL", float)):
+            try:
+                for value in values:
+                    convert(value)
+                types.append(name)
+                break
+            except ValueError:
+                continue
+        else:
+            types.append("TEXT")
+    return types
+
+
+def csv_target_columns(conn, table, headers, sample, width, create_table):
+    """Returns (columns_info, create_sql) of an import's target table.
+
+    create_sql is None when table exists; otherwise (with create_table) it
+    creates table with the CSV's header names and types inferred from sample.
+    """
+    columns_info = conn.execute(f"PRAGMA table_info({quote_ident(table)})").fetchall()
+    if columns_info:
+        return [tuple(col[:3]) for col in columns_info], None
+    if not create_table:
+        raise ValueError(f"Table '{table}' does not exist")
+    names = [header.strip() or f"column{i + 1}" for i, header in enumerate(headers)]
+    names += [f"column{i + 1}" for i in range(len(names), width)]
+    types = infer_column_types(sample, width)
+    create_sql = f"CREATE TABLE {quote_ident(table)} (" + ", ".join(
+        f"{quote_ident(name)} {dtype}" for name, dtype in zip(names, types)) + ")"
+    return [(i, name, dtype) for i, (name, dtype) in enumerate(zip(names, types))], create_sql
+
+
+def csv_row_shaper(headers, columns_info, width, coerce_types):
+    """Maps CSV fields to table columns by header name (or by position) and returns (column_names, shape).
+
+    shape(row) turns a CSV row into the values of column_names, converting
+    them to the columns' types with coerce_types.
+    """
+    table_columns = {col[1].lower(): (col[1], col[2]) for col in columns_info}
+    mapping = [(i, table_columns[h.strip().lower()]) for i, h in enumerate(headers)
+               if h.strip().lower() in table_columns]
+    if not mapping:
+        mapping = [(i, (col[1], col[2])) for i, col in enumerate(columns_info[:width])]
+    indexes = [i for i, _ in mapping]
+    converters = [type_converter(dtype) if coerce_types else None for _, (_, dtype) in mapping]
+    aligned = indexes == list(range(len(indexes))) and not any(converters)
+
+    def shape(row):
+        if aligned and len(row) == len(indexes):
+            return row  # Fast path: fields already line up with the target columns
+        row = [row[i] if i < len(row) else None for i in indexes]
+        for i, convert in enumerate(converters):
+            if convert is not None and row[i] is not None:
+                row[i] = coerce_value(convert, row[i])
+        return row
+
+    return [name for _, (name, _) in mapping], shape
+
+
+def insert_statement(table, column_names):
+    return (f"INSERT INTO {quote_ident(table)} (" + ", ".join(quote_ident(name) for name in column_names)
+            + ") VALUES (" + ", ".join(["?"] * len(column_names)) + ")")
+
+
+@contextmanager
+def relaxed_durability(conn, enabled=True):
+    """Turns off fsyncs (and the on-disk rollback journal outside WAL mode) on conn for a bulk load."""
+    if not enabled:
+        yield
+        return
+    synchronous = conn.execute("PRAGMA synchronous").fetchone()[0]
+    mode = conn.execute("PRAGMA journal_mode").fetchone()[0]
+    conn.execute("PRAGMA synchronous = OFF")
+    if mode.lower() != "wal":
+        conn.execute("PRAGMA journal_mode = MEMORY")
+    try:
+        yield
+    finally:
+        conn.execute(f"PRAGMA synchronous = {int(synchronous)}")
+        if mode.lower() != "wal":
+            conn.execute(f"PRAGMA journal_mode = {mode}")
+
+
+def import_csv(conn, file_path, table, has_header=True, create_table=False, coerce_types=False,
+               relax_durability=False, chunk_size=IMPORT_CHUNK_SIZE, task=None):
+    """Streams a CSV file into table and returns the number of rows imported.
+
+    Rows are inserted with executemany() in chunks of chunk_size inside a
+    single transaction, so memory use does not depend on the file size. CSV
+    headers are matched to table columns by name (falling back to column
+    order when none match). With create_table a missing table is created
+    from types inferred on the first rows; with coerce_types fields are
+    converted to their column's type before insert; relax_durability turns
+    off fsyncs and the on-disk journal for the duration of the load. With a
+    task, (bytes_read, total_bytes) is emitted per chunk and cancelling
+    rolls the whole import back.
+    """
+    total_bytes = os.path.getsize(file_path)
+    with open(file_path, "r", encoding="utf-8-sig", newline="") as f:
+        reader = csv.reader(f)
+        headers = next(reader, []) if has_header else []
+        sample = list(itertools.islice(reader, TYPE_SAMPLE_ROWS))
+        width = max([len(headers)] + [len(row) for row in sample])
+        columns_info, create_sql = csv_target_columns(conn, table, headers, sample, width, create_table)
+        column_names, shape = csv_row_shaper(headers, columns_info, width, coerce_types)
+        insert_sql = insert_statement(table, column_names)
+
+        imported = 0
+        with relaxed_durability(conn, relax_durability):
+            try:
+                conn.execute("BEGIN")
+                if create_sql:
+                    conn.execute(create_sql)
+                rows = itertools.chain(sample, reader)
+                while not (task is not None and task.cancelled):
+                    chunk = [shape(row) for row in itertools.islice(rows, chunk_size) if row]
+                    if not chunk:
+                        break
+                    conn.executemany(insert_sql, chunk)
+                    imported += len(chunk)
+                    if task is not None:
+                        task.rows = imported
+                        task.emit((f.buffer.tell(), total_bytes))
+                if task is not None and task.cancelled:
+                    raise TaskCancelled()
+                conn.commit()
+            except BaseException:
+                conn.rollback()
+                raise
+    return imported
+
+
+# Set in each parsing process of import_csv_files (see _start_csv_shard_worker)
+_shard_results = None
+_shard_stop = None
+
+
+def _start_csv_shard_worker(results, stop):
+    global _shard_results, _shard_stop
+    _shard_results, _shard_stop = results, stop
+    # An aborted import stops reading the queue; let the process exit without flushing it
+    results.cancel_join_thread()
+
+
+def _put_shard_message(message):
+    """Puts message on the bounded results queue, waiting for room; returns False once the import stops."""
+    while not _shard_stop.is_set():
+        try:
+            _shard_results.put(message, timeout=0.1)
+            return True
+        except queue.Full:
+            continue
+    return False
+
+
+def csv_shard_messages(index, file_path, columns_info, has_header, coerce_types, chunk_size):
+    """Parses and type-converts one CSV file of import_csv_files, yielding messages for the writer.
+
+    Yields ("start", index, column_names), then ("chunk", index, rows,
+    line_numbers, bytes_read, error_rows) per chunk_size rows and finally
+    ("done", index, bytes_read). Rows with more fields than the header, or
+    that the csv module cannot parse, are left out and reported as
+    (line, message, fields) error rows.
+    """
+    with open(file_path, "r", encoding="utf-8-sig", newline="") as f:
+        reader = csv.reader(f)
+        headers = next(reader, []) if has_header else []
+        width = len(headers) or len(columns_info)
+        column_names, shape = csv_row_shaper(headers, columns_info, width, coerce_types)
+        yield "start", index, column_names
+        rows, lines, errors = [], [], []
+        while True:
+            try:
+                row = next(reader)
+            except StopIteration:
+                break
+            except csv.Error as e:
+                errors.append((reader.line_num, str(e), None))
+                continue
+            if not row:
+                continue
+            if len(row) > width:
+                errors.append((reader.line_num, f"expected {width} fields, found {len(row)}", row))
+                continue
+            rows.append(shape(row))
+            lines.append(reader.line_num)
+            if len(rows) >= chunk_size:
+                yield "chunk", index, rows, lines, f.buffer.tell(), errors
+                rows, lines, errors = [], [], []
+        if rows or errors:
+            yield "chunk", index, rows, lines, f.buffer.tell(), errors
+        yield "done", index, f.buffer.tell()
+
+
+def parse_csv_shard(index, file_path, columns_info, has_header, coerce_types, chunk_size):
+    """Runs in a parsing process of import_csv_files: sends one file's messages through the results queue."""
+    for message in csv_shard_messages(index, file_path, columns_info, has_header, coerce_types, chunk_size):
+        if not _put_shard_message(message):
+            return
+
+
+def read_in_parallel(files, workers, columns_info, has_header, coerce_types, chunk_size, handle, task=None):
+    """Parses files in a pool of worker processes, passing their messages to handle in this thread.
+
+    The bounded results queue holds at most IMPORT_QUEUE_CHUNKS chunks, so
+    parsing stalls instead of piling up rows when the writer falls behind.
+    """
+    context = multiprocessing.get_context("spawn")  # Forking a process with threads is unsafe
+    results, stop = context.Queue(IMPORT_QUEUE_CHUNKS), context.Event()
+    with ProcessPoolExecutor(workers, mp_context=context, initializer=_start_csv_shard_worker,
+                             initargs=(results, stop)) as pool:
+        futures = [pool.submit(parse_csv_shard, result["index"], result["path"], columns_info,
+                               has_header, coerce_types, chunk_size) for result in files]
+        try:
+            pending = len(files)
+            while pending:
+                if task is not None and task.cancelled:
+                    raise TaskCancelled()
+                try:
+                    message = results.get(timeout=0.1)
+                except queue.Empty:
+                    for future, result in zip(futures, files):
+                        if future.done() and future.exception() is not None:
+                            raise ValueError(f"Failed to read {result['path']}: {future.exception()}")
+                    continue
+                if handle(message):
+                    pending -= 1
+        finally:
+            stop.set()
+            pool.shutdown(wait=False, cancel_futures=True)
+
+
+def import_csv_files(conn, file_paths, table, has_header=True, create_table=False, coerce_types=False,
+                     relax_durability=False, chunk_size=IMPORT_CHUNK_SIZE, workers=None, task=None):
+    """Imports several CSV files into table at once and returns their per-file results.
+
+    A pool of worker processes (workers, default one per core) parses and
+    type-converts the files in parallel; the parsed chunks reach this
+    thread, the single writer, through a bounded queue, so memory stays
+    flat however far parsing runs ahead (see read_in_parallel); with a
+    single worker the files are parsed in this thread instead. All files
+    are loaded in one transaction: a file that cannot be read, or
+    cancelling through task, rolls the whole import back. Rows that cannot
+    be parsed or inserted (e.g. a constraint violation) are skipped and
+    reported instead.
+
+    The target table is settled from the first file as in import_csv. Each
+    result (also emitted through task as it changes) is a dict with path,
+    index, total_bytes, bytes, rows, errors (the count) and error_rows
+    (the first MAX_ERROR_ROWS as (line, message, fields)).
+    """
+    if not file_paths:
+        return []
+    with open(file_paths[0], "r", encoding="utf-8-sig", newline="") as f:
+        reader = csv.reader(f)
+        headers = next(reader, []) if has_header else []
+        sample = list(itertools.islice(reader, TYPE_SAMPLE_ROWS))
+    width = max([len(headers)] + [len(row) for row in sample])
+    columns_info, create_sql = csv_target_columns(conn, table, headers, sample, width, create_table)
+
+    files = [{"index": i, "path": path, "total_bytes": os.path.getsize(path), "bytes": 0, "rows": 0,
+              "errors": 0, "error_rows": []} for i, path in enumerate(file_paths)]
+    inserts = {}
+    counts = {"imported": 0}
+
+    def add_errors(result, error_rows):
+        result["errors"] += len(error_rows)
+        room = MAX_ERROR_ROWS - len(result["error_rows"])
+        result["error_rows"].extend(error_rows[:max(0, room)])
+
+    def insert_chunk(result, insert_sql, rows, lines):
+        # A savepoint per chunk, so a failing row only costs re-inserting its chunk row by row
+        conn.execute("SAVEPOINT import_chunk")
+        try:
+            conn.executemany(insert_sql, rows)
+            inserted = len(rows)
+        except sqlite3.IntegrityError:
+            conn.execute("ROLLBACK TO import_chunk")
+            inserted, failed = 0, []
+            for row, line in zip(rows, lines):
+                try:
+                    conn.execute(insert_sql, row)
+                    inserted += 1
+                except sqlite3.IntegrityError as e:
+                    failed.append((line, str(e), list(row)))
+            add_errors(result, failed)
+        conn.execute("RELEASE import_chunk")
+        return inserted
+
+    def handle(message):
+        """Writes one message of csv_shard_messages; returns True once its file is done."""
+        kind, result = message[0], files[message[1]]
+        if kind == "start":
+            inserts[result["index"]] = insert_statement(table, message[2])
+            return False
+        if kind == "chunk":
+            _, _, rows, lines, result["bytes"], error_rows = message
+            add_errors(result, error_rows)
+            if rows:
+                inserted = insert_chunk(result, inserts[result["index"]], rows, lines)
+                result["rows"] += inserted
+                counts["imported"] += inserted
+        else:
+            result["bytes"] = message[2]
+        if task is not None:
+            task.rows = counts["imported"]
+            task.emit(dict(result, error_rows=list(result["error_rows"])))
+        return kind == "done"
+
+    workers = max(1, min(workers or os.cpu_count() or 1, len(file_paths)))
+    with relaxed_durability(conn, relax_durability):
+        try:
+            conn.execute("BEGIN")
+            if create_sql:
+                conn.execute(create_sql)
+            if workers == 1:
+                # Nothing to run in parallel: parsing here saves starting a process and pickling every chunk
+                for result in files:
+                    try:
+                        for message in csv_shard_messages(result["index"], result["path"], columns_info,
+                                                          has_header, coerce_types, chunk_size):
+                            if task is not None and task.cancelled:
+                                raise TaskCancelled()
+                            handle(message)
+                    except (OSError, UnicodeError) as e:
+                        raise ValueError(f"Failed to read {result['path']}: {e}")
+            else:
+                read_in_parallel(files, workers, columns_info, has_header, coerce_types, chunk_size, handle, task)
+            conn.commit()
+        except BaseException:
+            conn.rollback()
+            raise
+    return files
+
+
+def search_predicate(columns, term):
+    """Returns a (where_sql, params) pair matching rows where any column contains term, case-insensitively."""
+    pattern = "%" + term.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_") + "%"
+    where = " OR ".join(f"{quote_ident(col)} LIKE ? ESCAPE '\\'" for col in columns)
+    return f"({where})", [pattern] * len(columns)
+
+
+def text_columns(columns_info):
+    """Returns the names of columns with TEXT affinity (or no declared type) from PRAGMA table_info rows."""
+    names = []
+    for col in columns_info:
+        declared_type = (col[2] or "").upper()
+        if not declared_type or any(name in declared_type for name in ("CHAR", "CLOB", "TEXT")):
+            names.append(col[1])
+    return names
+
+
+def search_index_name(table):
+    return table + FTS_SUFFIX
+
+
+def hidden_index_tables(names):
+    """Returns the FTS5 search index tables (and their shadow tables) among names."""
+    names = set(names)
+    hidden = set()
+    for name in names:
+        if name.endswith(FTS_SUFFIX) and name[:-len(FTS_SUFFIX)] in names:
+            hidden.add(name)
+            hidden.update(name + suffix for suffix in ("_data", "_idx", "_docsize", "_config", "_content"))
+    return hidden & names
+
+
+def create_search_index(conn, table, columns):
+    """Builds an FTS5 index over columns of table, kept in sync with triggers.
+
+    The index is an external-content FTS5 table, so the text is not stored
+    twice; the triggers update it on every INSERT, UPDATE and DELETE.
+    """
+    index = quote_ident(search_index_name(table))
+    table_sql = quote_ident(table)
+    names = ", ".join(quote_ident(col) for col in columns)
+    new_values = ", ".join("new." + quote_ident(col) for col in columns)
+    old_values = ", ".join("old." + quote_ident(col) for col in columns)
+    content = table.replace("'", "''")
+    trigger = lambda suffix: quote_ident(search_index_name(table) + suffix)
+    with conn:
+        conn.execute(f"CREATE VIRTUAL TABLE {index} USING fts5({names}, content='{content}', content_rowid='rowid')")
+        conn.execute(f"CREATE TRIGGER {trigger('_ai')} AFTER INSERT ON {table_sql} BEGIN "
+                     f"INSERT INTO {index}(rowid, {names}) VALUES (new.rowid, {new_values}); END")
+        conn.execute(f"CREATE TRIGGER {trigger('_ad')} AFTER DELETE ON {table_sql} BEGIN "
+                     f"INSERT INTO {index}({index}, rowid, {names}) VALUES ('delete', old.rowid, {old_values}); END")
+        conn.execute(f"CREATE TRIGGER {trigger('_au')} AFTER UPDATE ON {table_sql} BEGIN "
+                     f"INSERT INTO {index}({index}, rowid, {names}) VALUES ('delete', old.rowid, {old_values}); "
+                     f"INSERT INTO {index}(rowid, {names}) VALUES (new.rowid, {new_values}); END")
+        conn.execute(f"INSERT INTO {index}({index}) VALUES ('rebuild')")
+
+
+def search_index_drops(table):
+    """Returns the statements dropping the FTS5 index of table and its triggers, if any."""
+    triggers = [f"DROP TRIGGER IF EXISTS {quote_ident(search_index_name(table) + suffix)}"
+                for suffix in ("_ai", "_ad", "_au")]
+    return triggers + [f"DROP TABLE IF EXISTS {quote_ident(search_index_name(table))}"]
+
+
+def drop_search_index(conn, table):
+    """Drops the FTS5 index of table and its triggers, if any."""
+    with conn:
+        for sql in search_index_drops(table):
+            conn.execute(sql)
+
+
+def fts_query(term):
+    """Turns free text into an FTS5 query matching every word as a prefix."""
+    return " ".join('"' + word.replace('"', '""') + '"*' for word in term.split())
+
+
+def search_filter(catalog, table, term):
+    """Returns a (where_sql, params) pair restricting table to rows matching term.
+
+    Uses the table's FTS5 index when one exists (keyword/prefix matching),
+    and otherwise a LIKE substring match over the text columns (over all
+    columns when term looks like a number).
+    """
+    if search_index_name(table) in catalog.tables() and term.split():
+        index = quote_ident(search_index_name(table))
+        return f"rowid IN (SELECT rowid FROM {index} WHERE {index} MATCH ?)", [fts_query(term)]
+    columns_info = catalog.columns(table)
+    columns = text_columns(columns_info)
+    if not columns or re.fullmatch(r"[-+.\d]+", term):
+        columns = [col[1] for col in columns_info]
+    return search_predicate(columns, term)
+
+
+def search_jobs(catalog, tables, term, page_key):
+    """Splits a database-wide search for term into per-table, per-column (table, key, columns, where, params) jobs.
+
+    page_key(table) names the column identifying a hit (None when the table
+    has none). Text columns are searched with LIKE, one job per column and
+    every column when term looks like a number, as in search_filter; a
+    table with an FTS5 index gets a single job over the index instead,
+    listing all its text columns.
+    """
+    jobs = []
+    for table in tables:
+        key = page_key(table)
+        if search_index_name(table) in catalog.tables() and term.split():
+            where, params = search_filter(catalog, table, term)
+            jobs.append((table, key, text_columns(catalog.columns(table)), where, params))
+            continue
+        columns_info = catalog.columns(table)
+        columns = text_columns(columns_info)
+        if not columns or re.fullmatch(r"[-+.\d]+", term):
+            columns = [col[1] for col in columns_info]
+        for column in columns:
+            where, params = search_predicate([column], term)
+            jobs.append((table, key, [column], where, params))
+    return jobs
+
+
+def _search_hit(term, key, columns, values):
+    """Returns the (column, key, value) hit of one matching row; values are those of the searched columns."""
+    column, value = columns[0], values[0]
+    if len(columns) > 1:
+        # FTS5 match: report the first column containing one of the words
+        words = [word.lower() for word in term.split()]
+        column, value = next(((name, value) for name, value in zip(columns, values)
+                              if value is not None and any(word in str(value).lower() for word in words)),
+                             (column, value))
+    value = "" if value is None else str(value)
+    return column, key, value[:SEARCH_VALUE_CHARS]
+
+
+def search_tables(db, jobs, term, hits_per_table=SEARCH_HITS_PER_TABLE, workers=SEARCH_WORKERS, on_event=None,
+                  task=None):
+    """Runs the jobs of search_jobs on a pool of threads and returns {table: hits found}.
+
+    Each worker thread borrows its own read-only connection from db, so
+    tables are scanned side by side. Events reach on_event in the calling
+    thread: ("hits", table, [(column, key, value), ...]) as matches are
+    found, at most hits_per_table per table, and ("progress", jobs done,
+    jobs) after every job. A table that cannot be searched is reported as
+    ("error", table, message) and skipped. Cancelling task interrupts
+    every worker.
+    """
+    pending, results = queue.Queue(), queue.Queue()
+    for job in jobs:
+        pending.put(job)
+    found = {job[0]: 0 for job in jobs}
+    lock, stop = threading.Lock(), threading.Event()
+
+    def remaining(table):
+        with lock:
+            return hits_per_table - found[table]
+
+    def claim(table, hits):
+        with lock:
+            hits = hits[:hits_per_table - found[table]]
+            found[table] += len(hits)
+            return hits
+
+    def run_job(conn, table, key, columns, where, params):
+        limit = remaining(table)
+        if limit <= 0:
+            return
+        selected = ", ".join([quote_ident(key) if key else "NULL"] + [quote_ident(col) for col in columns])
+        cursor = conn.execute(f"SELECT {selected} FROM {quote_ident(table)} WHERE {where} LIMIT ?",
+                              list(params) + [limit])
+        while not stop.is_set():
+            batch = cursor.fetchmany(FETCH_BATCH_SIZE)
+            if not batch:
+                return
+            hits = claim(table, [_search_hit(term, row[0], columns, row[1:]) for row in batch])
+            if hits:
+                results.put(("hits", table, hits))
+            if len(hits) < len(batch):
+                return
+
+    def work():
+        with db.pooled_reader() as conn:
+            conn.set_progress_handler(lambda: 1 if stop.is_set() else 0, SEARCH_OPCODES)
+            try:
+                while not stop.is_set():
+                    try:
+                        job = pending.get_nowait()
+                    except queue.Empty:
+                        return
+                    try:
+                        run_job(conn, *job)
+                    except sqlite3.Error as e:
+                        if not stop.is_set():
+                            results.put(("error", job[0], str(e)))
+                    results.put(("job",))
+            finally:
+                conn.set_progress_handler(None, 0)
+
+    threads = [threading.Thread(target=work, daemon=True) for _ in range(max(1, min(workers, len(jobs))))]
+    for thread in threads:
+        thread.start()
+    done = 0
+    try:
+        while done < len(jobs):
+            if task is not None and task.cancelled:
+                raise TaskCancelled()
+            try:
+                message = results.get(timeout=0.1)
+            except queue.Empty:
+                if not any(thread.is_alive() for thread in threads) and results.empty():
+                    break
+                continue
+            if message[0] == "job":
+                done += 1
+                message = ("progress", done, len(jobs))
+            elif message[0] == "hits" and task is not None:
+                task.rows += len(message[2])
+            if on_event is not None:
+                on_event(message)
+    finally:
+        stop.set()
+        for thread in threads:
+            thread.join()
+    return found
+
+
+def export_csv(conn, sql, file_path, params=(), compress=False, chunk_size=EXPORT_CHUNK_SIZE, task=None):
+    """Streams the result of sql to a CSV file and returns the number of rows written.
+
+    Rows are fetched and written chunk_size at a time, so memory stays flat
+    however large the result is. With compress the file is gzip-compressed
+    on the fly. With a task the running row count is emitted per chunk,
+    and a cancelled export removes the partial file.
+    """
+    opener = gzip.open if compress else open
+    cursor = conn.execute(sql, params)
+    written = 0
+    try:
+        with opener(file_path, "wt", newline="", encoding="utf-8") as f:
+            writer = csv.writer(f)
+            writer.writerow([description[0] for description in cursor.description])
+            while not (task is not None and task.cancelled):
+                batch = cursor.fetchmany(chunk_size)
+                if not batch:
+                    break
+                writer.writerows(batch)
+                written += len(batch)
+                if task is not None:
+                    task.rows = written
+                    task.emit(written)
+        if task is not None and task.cancelled:
+            raise TaskCancelled()
+    except BaseException:
+        cursor.close()
+        if os.path.exists(file_path):
+            os.remove(file_path)
+        raise
+    return written
+
+
+def require_numpy():
+    if np is None:
+        raise RuntimeError("Columnar snapshots need NumPy (pip install numpy)")
+
+
+def column_kinds(conn, sql, params, width):
+    """Returns (row_count, [(kind, nulls, has_real)]) for the width columns of sql's result.
+
+    kind is "int64" for integer columns, "float64" for numeric ones with
+    any REAL value, and "dictionary" for anything holding text or blobs.
+    One aggregate pass over the result, done in SQL.
+    """
+    names = ", ".join(f"c{i}" for i in range(width))
+    checks = ", ".join(f"sum(typeof(c{i}) = 'real'), sum(typeof(c{i}) IN ('text', 'blob')), sum(c{i} IS NULL)"
+                       for i in range(width))
+    row = conn.execute(f"WITH q({names}) AS ({sql.strip().rstrip(';')}) SELECT count(*), {checks} FROM q",
+                       params).fetchone()
+    kinds = []
+    for i in range(width):
+        real, text, nulls = (value or 0 for value in row[1 + 3 * i:4 + 3 * i])
+        kinds.append(("dictionary" if text else "float64" if real else "int64", nulls, bool(real)))
+    return row[0], kinds
+
+
+def dictionary_value(value):
+    """Encodes a value for a dictionary file (JSON); blobs become {"blob": base64}."""
+    if isinstance(value, bytes):
+        return {"blob": base64.b64encode(value).decode("ascii")}
+    return value
+
+
+def dictionary_decode(value):
+    if isinstance(value, dict):
+        return base64.b64decode(value["blob"])
+    return value
+
+
+def write_npy(path, dtype, count):
+    """Creates a .npy file of count elements and returns it memory-mapped for writing (None if empty)."""
+    if count == 0:
+        np.save(path, np.empty(0, dtype=dtype))
+        return None
+    return np.lib.format.open_memmap(path, mode="w+", dtype=dtype, shape=(count,))
+
+
+def export_columnar(conn, sql, directory, params=(), chunk_size=EXPORT_CHUNK_SIZE, task=None,
+                    declared_types=None, source=None):
+    """Writes the result of sql as a columnar snapshot in directory and returns the number of rows.
+
+    Every column becomes one typed .npy file that NumPy can memory-map
+    (np.load(path, mmap_mode="r")) without parsing: int64 or float64 for
+    numeric columns, with a boolean .mask.npy marking NULLs (also NaN in
+    float columns), and int32 dictionary codes for text and mixed columns
+    (-1 for NULL) whose values are listed in a JSON dictionary file, with
+    their SQLite types kept. manifest.json describes the columns; it is
+    written last, so a snapshot without one is incomplete.
+
+    Column types are found in a first aggregate pass; both passes run in
+    one read transaction so they see the same rows. directory must not
+    hold a snapshot already. declared_types (per column) are recorded
+    for import_columnar. With a task the running row count is emitted per
+    chunk, and a cancelled export removes the files written so far.
+    """
+    require_numpy()
+    if os.path.exists(os.path.join(directory, COLUMNAR_MANIFEST)):
+        raise ValueError(f"{directory} already holds a columnar snapshot")
+    os.makedirs(directory, exist_ok=True)
+    own_transaction = not conn.in_transaction
+    if own_transaction:
+        conn.execute("BEGIN")
+    written_files, outputs = [], []
+    written = 0
+    try:
+        cursor = conn.execute(sql, params)
+        names = [description[0] for description in cursor.description]
+        count, kinds = column_kinds(conn, sql, params, len(names))
+        columns = []
+        for i, (name, (kind, nulls, has_real)) in enumerate(zip(names, kinds)):
+            column = {"name": name, "declared_type": (declared_types or [None] * len(names))[i], "kind": kind,
+                      "nulls": nulls, "file": f"c{i:03d}.npy", "mask": None, "dictionary": None}
+            if kind == "dictionary":
+                column["dictionary"] = f"c{i:03d}.dict.json"
+                data = write_npy(os.path.join(directory, column["file"]), np.int32, count)
+                # Values -> codes, NULL being -1. Where 1 and 1.0 can meet, keys carry the type to keep them apart
+                outputs.append((kind, data, None, {(type(None), None): -1} if has_real else {None: -1}))
+            else:
+                if nulls:
+                    column["mask"] = f"c{i:03d}.mask.npy"
+                data = write_npy(os.path.join(directory, column["file"]), np.dtype(kind), count)
+                mask = write_npy(os.path.join(directory, column["mask"]), np.bool_, count) if nulls else None
+                outputs.append((kind, data, mask, None))
+            written_files += [column[key] for key in ("file", "mask", "dictionary") if column[key]]
+            columns.append(column)
+
+        while not (task is not None and task.cancelled):
+            batch = cursor.fetchmany(chunk_size)
+            if not batch:
+                break
+            end = written + len(batch)
+            for values, (kind, data, mask, lookup) in zip(zip(*batch), outputs):
+                if kind == "dictionary":
+                    code = lookup.setdefault
+                    if (type(None), None) in lookup:
+                        data[written:end] = [code((type(value), value), len(lookup) - 1) for value in values]
+                    else:
+                        data[written:end] = [code(value, len(lookup) - 1) for value in values]
+                    continue
+                if mask is None:
+                    data[written:end] = values
+                    continue
+                nulls = np.fromiter((value is None for value in values), dtype=np.bool_, count=len(values))
+                mask[written:end] = nulls
+                filler = np.nan if kind == "float64" else 0
+                data[written:end] = [filler if value is None else value for value in values]
+            written = end
+            if task is not None:
+                task.rows = written
+                task.emit(written)
+        if task is not None and task.cancelled:
+            raise TaskCancelled()
+        for column, (kind, data, mask, lookup) in zip(columns, outputs):
+            for array in (data, mask):
+                if array is not None:
+                    array.flush()
+            if kind == "dictionary":
+                keys = list(lookup)[1:]  # Codes 0, 1, ... in order, after NULL
+                values = [key[1] for key in keys] if (type(None), None) in lookup else keys
+                with open(os.path.join(directory, column["dictionary"]), "w", encoding="utf-8") as f:
+                    f.write(json.dumps([dictionary_value(value) for value in values]))
+        manifest = {"format": "db-columnar", "version": COLUMNAR_FORMAT_VERSION, "source": source or sql,
+                    "rows": written, "columns": columns,
+                    "created": time.strftime("%Y-%m-%dT%H:%M:%S")}
+        with open(os.path.join(directory, COLUMNAR_MANIFEST), "w", encoding="utf-8") as f:
+            json.dump(manifest, f, indent=2)
+    except BaseException:
+        data = mask = None
+        outputs.clear()  # Drop the memory maps before removing their files
+        for name in written_files:
+            path = os.path.join(directory, name)
+            if os.path.exists(path):
+                os.remove(path)
+        raise
+    finally:
+        if own_transaction:
+            conn.rollback()
+    return written
+
+
+def read_manifest(directory):
+    require_numpy()
+    with open(os.path.join(directory, COLUMNAR_MANIFEST), encoding="utf-8") as f:
+        manifest = json.load(f)
+    if manifest.get("format") != "db-columnar" or manifest.get("version", 0) > COLUMNAR_FORMAT_VERSION:
+        raise ValueError(f"{directory} does not hold a supported columnar snapshot")
+    return manifest
+
+
+def import_columnar(conn, directory, table, create_table=False, chunk_size=IMPORT_CHUNK_SIZE, task=None):
+    """Loads a columnar snapshot written by export_columnar into table and returns the rows imported.
+
+    The column files are memory-mapped and decoded a chunk at a time with
+    vectorized NumPy operations, then inserted with executemany() in one
+    transaction. Snapshot columns are matched to table columns by name;
+    with create_table a missing table is created with the snapshot's
+    declared (or numeric) types. With a task, (rows_done, total_rows) is
+    emitted per chunk and cancelling rolls the whole import back.
+    """
+    manifest = read_manifest(directory)
+    columns, total = manifest["columns"], manifest["rows"]
+    columns_info = conn.execute(f"PRAGMA table_info({quote_ident(table)})").fetchall()
+    create_sql = None
+    if columns_info:
+        existing = {col[1].lower(): col[1] for col in columns_info}
+        missing = [column["name"] for column in columns if column["name"].lower() not in existing]
+        if missing:
+            raise ValueError(f"Table '{table}' has no column(s) {', '.join(missing)}")
+        names = [existing[column["name"].lower()] for column in columns]
+    elif not create_table:
+        raise ValueError(f"Table '{table}' does not exist")
+    else:
+        names = [column["name"] for column in columns]
+        default_types = {"int64": "INTEGER", "float64": "REAL", "dictionary": ""}
+        create_sql = f"CREATE TABLE {quote_ident(table)} (" + ", ".join(
+            f"{quote_ident(column['name'])} "
+            f"{default_types[column['kind']] if column['declared_type'] is None else column['declared_type']}".rstrip()
+            for column in columns) + ")"
+
+    decoders = []
+    for column in columns:
+        data = np.load(os.path.join(directory, column["file"]), mmap_mode="r")
+        if column["kind"] == "dictionary":
+            with open(os.path.join(directory, column["dictionary"]), encoding="utf-8") as f:
+                values = [dictionary_decode(value) for value in json.load(f)]
+            lookup = np.empty(len(values) + 1, dtype=object)
+            lookup[:-1] = values  # Code -1 picks the trailing None
+            decoders.append(lambda start, end, data=data, lookup=lookup: lookup[data[start:end]].tolist())
+        elif column["mask"]:
+            mask = np.load(os.path.join(directory, column["mask"]), mmap_mode="r")
+
+            def decode(start, end, data=data, mask=mask):
+                values = data[start:end].astype(object)
+                values[mask[start:end]] = None
+                return values.tolist()
+            decoders.append(decode)
+        else:
+            decoders.append(lambda start, end, data=data: data[start:end].tolist())
+
+    insert_sql = insert_statement(table, names)
+    imported = 0
+    try:
+        conn.execute("BEGIN")
+        if create_sql:
+            conn.execute(create_sql)
+        while imported < total and not (task is not None and task.cancelled):
+            end = min(total, imported + chunk_size)
+            conn.executemany(insert_sql, zip(*(decode(imported, end) for decode in decoders)))
+            imported = end
+            if task is not None:
+                task.rows = imported
+                task.emit((imported, total))
+        if task is not None and task.cancelled:
+            raise TaskCancelled()
+        conn.commit()
+    except BaseException:
+        conn.rollback()
+        raise
+    return imported
+
+
+def backup_to_file(source, target_path, pages=BACKUP_PAGES_PER_STEP, pause=BACKUP_STEP_PAUSE, task=None):
+    """Copies the live database behind the source connection to target_path.
+
+    Uses SQLite's online backup API, which copies a consistent image
+    (including committed WAL content) while other connections keep writing.
+    The copy proceeds pages at a time and sleeps pause seconds between steps
+    so writers get a chance to run. The backup is written to a ".part" file
+    that replaces target_path only once complete. With a task,
+    (pages_copied, total_pages) is emitted after every step.
+    """
+    partial_path = target_path + ".part"
+    if os.path.exists(partial_path):
+        os.remove(partial_path)
+    target = sqlite3.connect(partial_path)
+
+    def progress(status, remaining, total):
+        if task is not None:
+            task.emit((total - remaining, total))
+            if task.cancelled:
+                raise TaskCancelled()
+        if pause:
+            time.sleep(pause)
+
+    try:
+        source.backup(target, pages=pages, progress=progress)
+        target.close()
+        os.replace(partial_path, target_path)
+    except BaseException:
+        target.close()
+        if os.path.exists(partial_path):
+            os.remove(partial_path)
+        raise
+    return target_path
+
+
+def snapshot_pattern(db_path):
+    """Matches db_path's snapshot names, capturing the timestamp and its microseconds (absent in older names)."""
+    stem = os.path.splitext(os.path.basename(db_path))[0]
+    return re.compile(re.escape(stem) + r"-(\d{8}-\d{6})(?:-(\d{6}))?\.db$")
+
+
+def snapshot_path(directory, db_path):
+    """Returns a new timestamped snapshot file name for db_path inside directory.
+
+    The timestamp has microseconds, so snapshots taken within the same
+    second get their own files; it is moved on should the name exist anyway.
+    """
+    stem = os.path.splitext(os.path.basename(db_path))[0]
+    stamp = datetime.now()
+    while True:
+        path = os.path.join(directory, f"{stem}-{stamp:%Y%m%d-%H%M%S-%f}.db")
+        if not os.path.exists(path):
+            return path
+        stamp += timedelta(microseconds=1)
+
+
+def prune_snapshots(directory, db_path, keep):
+    """Deletes all but the newest keep snapshots of db_path in directory and returns the removed paths."""
+    pattern = snapshot_pattern(db_path)
+    matches = (pattern.match(name) for name in os.listdir(directory))
+    snapshots = sorted((match.group(1) + (match.group(2) or "000000"), match.string) for match in matches if match)
+    removed = [os.path.join(directory, name) for _, name in snapshots[:max(0, len(snapshots) - keep)]]
+    for path in removed:
+        os.remove(path)
+    return removed
+
+
+def snapshot_readers(db, count):
+    """Opens count read-only connections of db that all read the same snapshot, each inside a read transaction.
+
+    A separate connection holds the write lock (BEGIN IMMEDIATE) while the
+    readers start, so no commit can land between them. Writers are free
+    again once they have started, although outside WAL mode they still
+    cannot commit until the readers finish. The caller closes the readers.
+    """
+    guard = sqlite3.connect(db.db_path, timeout=db.busy_timeout / 1000)
+    readers = []
+    try:
+        try:
+            guard.execute("BEGIN IMMEDIATE")
+        except sqlite3.OperationalError as e:
+            if "readonly" not in str(e).replace(" ", "").lower():
+                raise  # A read-only file has no writers to hold off
+        for _ in range(count):
+            conn = db.open_reader("dump")
+            readers.append(conn)
+            conn.execute("BEGIN")
+            conn.execute("SELECT count(*) FROM sqlite_master").fetchone()  # The snapshot starts with the first read
+    except BaseException:
+        for conn in readers:
+            conn.close()
+        raise
+    finally:
+        guard.rollback()
+        guard.close()
+    return readers
+
+
+def dump_plan(conn):
+    """Returns (tables, footer) of a dump: the (name, CREATE sql, virtual) tables to dump, and the SQL run last.
+
+    Tables come in schema order with virtual tables last, as their content
+    may come from an ordinary table. The footer restores sqlite_sequence
+    and creates the indexes, views and triggers, so they are built once
+    over the loaded rows rather than row by row.
+    """
+    objects = conn.execute("SELECT type, name, sql FROM sqlite_master WHERE sql IS NOT NULL").fetchall()
+    try:
+        shadow = {row[1] for row in conn.execute("PRAGMA table_list") if row[2] == "shadow"}
+    except sqlite3.OperationalError:  # Before SQLite 3.37
+        shadow = set()
+    shadow |= hidden_index_tables([name for kind, name, _ in objects if kind == "table"]) - \
+        {name for kind, name, sql in objects if sql.upper().startswith("CREATE VIRTUAL")}
+    tables = [(name, sql, sql.upper().startswith("CREATE VIRTUAL")) for kind, name, sql in objects
+              if kind == "table" and not name.startswith("sqlite_") and name not in shadow]
+    tables.sort(key=lambda table: table[2])
+    footer = []
+    if any(name == "sqlite_sequence" for _, name, _ in objects):
+        footer.append("DELETE FROM sqlite_sequence;")
+        footer += [f"INSERT INTO sqlite_sequence VALUES ({sql_literal(name)}, {sql_literal(seq)});"
+                   for name, seq in conn.execute("SELECT name, seq FROM sqlite_sequence")]
+    for kind in ("index", "view", "trigger"):
+        footer += [sql + ";" for object_kind, name, sql in objects
+                   if object_kind == kind and not name.startswith("sqlite_") and name not in shadow]
+    return tables, footer
+
+
+def dump_table(conn, table, create_sql, virtual, f, batch_rows=DUMP_INSERT_ROWS, progress=None):
+    """Writes table's CREATE statement and rows to the text file f; returns the rows written.
+
+    The rows go in one transaction of multi-row INSERTs, batch_rows each,
+    formatted by SQLite's quote() so every value keeps its exact type and
+    value. The rowid is kept when it is not an alias of a column, so
+    references to it (e.g. from a search index) stay valid. A virtual
+    table whose content lives in another table is rebuilt instead.
+    progress(rows) is called after each statement; it may raise to stop.
+    """
+    table_sql = quote_ident(table)
+    f.write(create_sql + ";\n")
+    if virtual:
+        content = re.search(r"content\s*=\s*'((?:[^']|'')*)'", create_sql, re.I)
+        if content is not None:
+            if content.group(1):
+                f.write(f"INSERT INTO {table_sql}({table_sql}) VALUES ('rebuild');\n")
+            return 0
+    columns = [col[1] for col in conn.execute(f"PRAGMA table_xinfo({table_sql})") if col[6] == 0]
+    pk = [col for col in conn.execute(f"PRAGMA table_info({table_sql})") if col[5]]
+    aliased = len(pk) == 1 and (pk[0][2] or "").upper() == "INTEGER"
+    try:
+        conn.execute(f"SELECT rowid FROM {table_sql} LIMIT 0")
+        has_rowid = True
+    except sqlite3.OperationalError:
+        has_rowid = False
+    if has_rowid and not aliased and not {"rowid", "oid", "_rowid_"} & {col.lower() for col in columns}:
+        columns = ["rowid"] + columns
+    names = ", ".join(quote_ident(col) for col in columns)
+    values = " || ',' || ".join(f"quote({quote_ident(col)})" for col in columns)
+    cursor = conn.execute(f"SELECT '(' || {values} || ')' FROM {table_sql}")
+    written = 0
+    while True:
+        batch = cursor.fetchmany(batch_rows)
+        if not batch:
+            break
+        if not written:
+            f.write("BEGIN;\n")
+        f.write(f"INSERT INTO {table_sql} ({names}) VALUES\n" + ",\n".join(row[0] for row in batch) + ";\n")
+        written += len(batch)
+        if progress is not None:
+            progress(written)
+    if written:
+        f.write("COMMIT;\n")
+    return written
+
+
+def dump_database(db, file_path, compress=False, workers=DUMP_WORKERS, batch_rows=DUMP_INSERT_ROWS,
+                  compresslevel=DUMP_COMPRESSLEVEL, on_event=None, task=None):
+    """Writes the database of db as an SQL script to file_path and returns {table: rows written}.
+
+    Tables are dumped side by side by workers threads, each reading on its
+    own connection; the connections share one snapshot (see
+    snapshot_readers), so the dump is consistent. Each table goes to its
+    own part file, gzip-compressed by its worker with compress, and the
+    parts are joined in schema order at the end (gzip members concatenate
+    into a valid gzip file). Events reach on_event in the calling thread:
+    ("rows", table, rows written so far) and ("table", table, rows) once
+    a table is complete. Cancelling task removes everything written.
+    """
+    if compress:
+        opener = lambda path: gzip.open(path, "wt", compresslevel=compresslevel, encoding="utf-8", newline="")
+        encode = lambda text: gzip.compress(text.encode("utf-8"), compresslevel)
+    else:
+        opener = lambda path: open(path, "w", encoding="utf-8", newline="")
+        encode = lambda text: text.encode("utf-8")
+    readers = snapshot_readers(db, max(1, workers))
+    part_dir = tempfile.mkdtemp(prefix=".dump-", dir=os.path.dirname(os.path.abspath(file_path)))
+    part_path = lambda index: os.path.join(part_dir, f"{index:06d}.sql")
+    partial_path = file_path + ".part"
+    pending, results, stop = queue.Queue(), queue.Queue(), threading.Event()
+    threads = []
+
+    def progress(table, rows):
+        if stop.is_set():
+            raise TaskCancelled()
+        results.put(("rows", table, rows))
+
+    def work(conn):
+        while not stop.is_set():
+            try:
+                index, table, create_sql, virtual = pending.get_nowait()
+            except queue.Empty:
+                return
+            try:
+                with opener(part_path(index)) as f:
+                    rows = dump_table(conn, table, create_sql, virtual, f, batch_rows,
+                                      lambda rows: progress(table, rows))
+                results.put(("table", table, rows))
+            except BaseException as e:
+                results.put(("error", table, e))
+                return
+
+    try:
+        tables, footer = dump_plan(readers[0])
+        for index, table in enumerate(tables):
+            pending.put((index,) + table)
+        threads = [threading.Thread(target=work, args=(conn,), daemon=True) for conn in readers[:max(1, len(tables))]]
+        for thread in threads:
+            thread.start()
+        dumped = {}
+        while len(dumped) < len(tables):
+            if task is not None and task.cancelled:
+                raise TaskCancelled()
+            try:
+                message = results.get(timeout=0.1)
+            except queue.Empty:
+                continue
+            if message[0] == "error":
+                raise message[2]
+            if message[0] == "table":
+                dumped[message[1]] = message[2]
+            if on_event is not None:
+                on_event(message)
+        with open(partial_path, "wb") as out:
+            out.write(encode(f"-- Dump of {os.path.basename(db.db_path)} written by the Database Manager on "
+                             f"{time.strftime('%Y-%m-%d %H:%M:%S')}\nPRAGMA foreign_keys=OFF;\n"))
+            for index in range(len(tables)):
+                with open(part_path(index), "rb") as part:
+                    shutil.copyfileobj(part, out)
+            out.write(encode("".join(statement + "\n" for statement in footer)))
+        os.replace(partial_path, file_path)
+        return dumped
+    finally:
+        stop.set()
+        for thread in threads:
+            thread.join()
+        for conn in readers:
+            conn.close()
+        shutil.rmtree(part_dir, ignore_errors=True)
+        if os.path.exists(partial_path):
+            os.remove(partial_path)
+
+
+def iter_sql_statements(lines):
+    """Yields the complete statements of an SQL script read line by line, so the script can be any size."""
+    buffer = []
+    for line in lines:
+        buffer.append(line)
+        if line.rstrip().endswith(";"):
+            statement = "".join(buffer)
+            if sqlite3.complete_statement(statement):
+                yield statement
+                buffer = []
+    rest = "".join(buffer)
+    if rest.strip():
+        yield rest
+
+
+def restore_dump(conn, file_path, relax_durability=True, task=None):
+    """Runs the SQL script at file_path (gzip-compressed or not) on conn and returns the statements run.
+
+    The script is streamed statement by statement. Its own BEGIN and COMMIT
+    statements decide the transactions; a dump from dump_database loads
+    every table in one transaction and creates the indexes after the rows.
+    With relax_durability the load skips fsyncs (see relaxed_durability).
+    An error or cancellation rolls back the open transaction, leaving the
+    tables finished before it. (bytes read, total bytes) is emitted through
+    task after each statement.
+    """
+    total = os.path.getsize(file_path)
+    isolation_level = conn.isolation_level
+    statements = 0
+    with open(file_path, "rb") as raw:
+        compressed = raw.read(2) == b"\x1f\x8b"
+        raw.seek(0)
+        binary = gzip.GzipFile(fileobj=raw) if compressed else raw
+        conn.isolation_level = None  # The script's BEGIN and COMMIT statements control the transactions
+        try:
+            with relaxed_durability(conn, relax_durability):
+                try:
+                    for statement in iter_sql_statements(io.TextIOWrapper(binary, encoding="utf-8", newline="")):
+                        if task is not None and task.cancelled:
+                            raise TaskCancelled()
+                        conn.execute(statement)
+                        statements += 1
+                        if task is not None:
+                            task.emit((raw.tell(), total))
+                finally:
+                    if conn.in_transaction:
+                        conn.rollback()  # Only an unfinished script leaves one open
+        finally:
+            conn.isolation_level = isolation_level
+    return statements
+
+
+def is_busy_error(error):
+    """Tells whether error means another connection holds a lock this one needs."""
+    message = str(error).lower()
+    return isinstance(error, sqlite3.OperationalError) and ("locked" in message or "busy" in message)
+
+
+def retry_busy(work, retries=DEFAULT_WRITE_RETRIES, backoff=WRITE_RETRY_BACKOFF):
+    """Calls work() and retries it with exponential backoff while the database is locked.
+
+    busy_timeout already makes each statement wait for locks; this covers
+    what it cannot, such as a deadlock between two writers, where SQLite
+    fails at once. work must roll back everything it did when it fails.
+    """
+    for attempt in range(retries + 1):
+        try:
+            return work()
+        except sqlite3.OperationalError as e:
+            if attempt == retries or not is_busy_error(e):
+                raise
+            time.sleep(backoff * 2 ** attempt * random.uniform(0.5, 1.5))
+
+
+def journal_mode(conn):
+    return conn.execute("PRAGMA journal_mode").fetchone()[0].lower()
+
+
+def wal_size(db_path):
+    """Returns the size in bytes of db_path's write-ahead log (0 when there is none)."""
+    wal_path = db_path + "-wal"
+    return os.path.getsize(wal_path) if os.path.exists(wal_path) else 0
+
+
+def wal_checkpoint(conn, mode="PASSIVE"):
+    """Runs a WAL checkpoint and returns (busy, wal_frames, checkpointed_frames)."""
+    mode = mode.upper()
+    if mode not in CHECKPOINT_MODES:
+        raise ValueError(f"Checkpoint mode must be one of {', '.join(CHECKPOINT_MODES)}")
+    return tuple(conn.execute(f"PRAGMA wal_checkpoint({mode})").fetchone())
+
+
+class ReadSnapshot:
+    """A read transaction held open on its own read-only connection.
+
+    Every read through it sees the database as it was when the snapshot
+    was opened, however long the reader takes. In WAL mode this never
+    blocks writers (in rollback-journal mode it would, so callers only use
+    it with WAL), but checkpoints cannot go past it, so close it when done.
+    Hold lock while reading; close() takes it too.
+    """
+    def __init__(self, db):
+        self.lock = threading.Lock()
+        self.connection = db.open_reader("snapshot")
+        self.connection.execute("BEGIN")
+        # BEGIN is deferred: the snapshot is taken by the first read
+        self.connection.execute("SELECT COUNT(*) FROM sqlite_master").fetchone()
+        self.opened = time.time()
+
+    def close(self):
+        with self.lock:
+            if self.connection is not None:
+                self.connection.close()
+                self.connection = None
+
+
+# --------------------- Column Profiles --------------------- #
+def sqlite_sort_key(value):
+    """Orders mixed values the way SQLite does: numbers, then text, then blobs."""
+    if isinstance(value, (int, float)):
+        return (0, value)
+    return (1, value) if isinstance(value, str) else (2, value)
+
+
+def sample_rows(conn, table, size, has_rowid, task=None):
+    """Returns (rows, total_rows, exact): about size rows of table picked at random.
+
+    Rowid tables are sampled by probing random rowids between the smallest
+    and the largest, a few thousand index seeks however large the table;
+    total_rows is then estimated from the rowid range. Other tables are
+    reservoir-sampled in one scan. exact tells that the whole table was read.
+    """
+    table_sql = quote_ident(table)
+    rng = random.Random()
+    if has_rowid:
+        low, high = conn.execute(f"SELECT MIN(rowid), MAX(rowid) FROM {table_sql}").fetchone()
+        if low is None:
+            return [], 0, True
+        span = high - low + 1
+        if span <= size:
+            rows = conn.execute(f"SELECT * FROM {table_sql}").fetchall()
+            return rows, len(rows), True
+        rows, seen = [], set()
+        for probe in sorted(rng.sample(range(low, high + 1), size)):
+            if task is not None and task.cancelled:
+                raise TaskCancelled()
+            hit = conn.execute(f"SELECT rowid, * FROM {table_sql} WHERE rowid >= ? ORDER BY rowid LIMIT 1",
+                               (probe,)).fetchone()
+            if hit is not None and hit[0] not in seen:
+                seen.add(hit[0])
+                rows.append(hit[1:])
+        return rows, span, False
+    reservoir, seen = [], 0
+    for row in conn.execute(f"SELECT * FROM {table_sql}"):
+        seen += 1
+        if len(reservoir) < size:
+            reservoir.append(row)
+        else:
+            slot = rng.randrange(seen)
+            if slot < size:
+                reservoir[slot] = row
+        if task is not None and seen % 10000 == 0 and task.cancelled:
+            raise TaskCancelled()
+    return reservoir, seen, seen <= size
+
+
+def histogram(values, bins=PROFILE_HISTOGRAM_BINS, scale=1.0):
+    """Returns [(low, high, count)] buckets of equal width over numeric values, counts multiplied by scale."""
+    if not values:
+        return []
+    low, high = min(values), max(values)
+    if low == high:
+        return [(low, high, round(len(values) * scale))]
+    width = (high - low) / bins
+    counts = [0] * bins
+    for value in values:
+        counts[min(int((value - low) / width), bins - 1)] += 1
+    return [(low + i * width, low + (i + 1) * width, round(count * scale)) for i, count in enumerate(counts)]
+
+
+def summarize_column(name, declared_type, values, total_rows, exact, top_k=PROFILE_TOP_K,
+                     bins=PROFILE_HISTOGRAM_BINS):
+    """Profiles one column from a sample of its values, scaled up to total_rows."""
+    present = [value for value in values if value is not None]
+    scale = total_rows / len(values) if values else 0.0
+    counts = Counter(present)
+    if exact or not present:
+        distinct = len(counts)
+    else:
+        # Haas and Stokes' Duj1 estimator: values seen only once stand for many unseen ones
+        sampled, once = len(values), sum(1 for count in counts.values() if count == 1)
+        distinct = round(sampled * len(counts) / (sampled - once + once / scale))
+        distinct = min(distinct, round(len(present) * scale))
+    numeric = [value for value in present if isinstance(value, (int, float))]
+    ordered = sorted(counts, key=sqlite_sort_key)
+    return {
+        "column": name,
+        "type": declared_type,
+        "rows": total_rows,
+        "null_fraction": (len(values) - len(present)) / len(values) if values else 0.0,
+        "distinct": distinct,
+        "min": ordered[0] if ordered else None,
+        "max": ordered[-1] if ordered else None,
+        "top": [(value, round(count * scale)) for value, count in counts.most_common(top_k)],
+        "histogram": histogram(numeric, bins, scale),
+        "exact": exact,
+    }
+
+
+def sample_column_profiles(conn, table, columns_info, has_rowid, size=PROFILE_SAMPLE_ROWS, task=None):
+    """Profiles every column of table from a random sample of about size rows (see sample_rows)."""
+    rows, total_rows, exact = sample_rows(conn, table, size, has_rowid, task)
+    return [summarize_column(col[1], col[2], [row[i] for row in rows], total_rows, exact)
+            for i, col in enumerate(columns_info)]
+
+
+def exact_column_profiles(conn, table, columns_info, top_k=PROFILE_TOP_K, bins=PROFILE_HISTOGRAM_BINS,
+                          counted_values=PROFILE_COUNTED_VALUES, task=None):
+    """Profiles every column of table exactly and returns the profiles.
+
+    The cost is two full scans of the table, whatever its width. The first
+    computes counts, distinct counts and min/max of all columns with SQL
+    aggregates. The second streams every row once, filling the histogram
+    buckets of all numeric columns and the value counts behind the top-K
+    lists. Those counts are kept in memory for the columns with the fewest
+    distinct values, up to counted_values in all; a column past that budget
+    costs one more GROUP BY query of its own, unless all its values are
+    distinct, when any K of them (read with LIMIT) are its top. With a task
+    each finished column profile is emitted as it completes.
+    """
+    table_sql = quote_ident(table)
+    aggregates = ["COUNT(*)"]
+    for col in columns_info:
+        name = quote_ident(col[1])
+        numeric = f"CASE WHEN typeof({name}) IN ('integer', 'real') THEN {name} END"
+        aggregates += [f"COUNT({name})", f"COUNT(DISTINCT {name})", f"MIN({name})", f"MAX({name})",
+                       f"COUNT({numeric})", f"MIN({numeric})", f"MAX({numeric})"]
+    totals = conn.execute(f"SELECT {', '.join(aggregates)} FROM {table_sql}").fetchone()
+    total_rows = totals[0]
+    stats = [totals[1 + 7 * i:8 + 7 * i] for i in range(len(columns_info))]
+
+    # Count the columns with the fewest distinct values in memory, as many as the budget allows
+    counters, unique, grouped = {}, [], []
+    budget = counted_values
+    for i in sorted(range(len(columns_info)), key=lambda i: stats[i][1]):
+        present, distinct = stats[i][:2]
+        if distinct == present:
+            unique.append(i)
+        elif distinct <= budget:
+            counters[i] = Counter()
+            budget -= distinct
+        else:
+            grouped.append(i)
+    buckets = {i: (numeric_low, (numeric_high - numeric_low) / bins, [0] * bins)
+               for i, (_, _, _, _, numeric_count, numeric_low, numeric_high) in enumerate(stats)
+               if numeric_count and numeric_low != numeric_high}
+
+    if counters or buckets:
+        for seen, row in enumerate(conn.execute(f"SELECT * FROM {table_sql}"), 1):
+            for i, counter in counters.items():
+                if row[i] is not None:
+                    counter[row[i]] += 1
+            for i, (low, width, counts) in buckets.items():
+                if isinstance(row[i], (int, float)):
+                    counts[min(int((row[i] - low) / width), bins - 1)] += 1
+            if task is not None and seen % 10000 == 0 and task.cancelled:
+                raise TaskCancelled()
+
+    profiles = {}
+
+    def finish(i, top):
+        present, distinct, low, high, numeric_count, numeric_low, numeric_high = stats[i]
+        if i in buckets:
+            start, width, counts = buckets[i]
+            hist = [(start + b * width, start + (b + 1) * width, count) for b, count in enumerate(counts)]
+        else:
+            hist = [(numeric_low, numeric_high, numeric_count)] if numeric_count else []
+        profiles[i] = profile = {
+            "column": columns_info[i][1],
+            "type": columns_info[i][2],
+            "rows": total_rows,
+            "null_fraction": (total_rows - present) / total_rows if total_rows else 0.0,
+            "distinct": distinct,
+            "min": low,
+            "max": high,
+            "top": top,
+            "histogram": hist,
+            "exact": True,
+        }
+        if task is not None:
+            task.rows = len(profiles)
+            task.emit(profile)
+
+    for i in sorted(counters):
+        finish(i, counters[i].most_common(top_k))
+    for i in sorted(unique) + grouped:
+        if task is not None and task.cancelled:
+            raise TaskCancelled()
+        name = quote_ident(columns_info[i][1])
+        if i in unique:
+            sql = f"SELECT {name}, 1 FROM {table_sql} WHERE {name} IS NOT NULL LIMIT ?"
+        else:
+            sql = (f"SELECT {name}, COUNT(*) FROM {table_sql} WHERE {name} IS NOT NULL "
+                   f"GROUP BY {name} ORDER BY 2 DESC LIMIT ?")
+        finish(i, [tuple(row) for row in conn.execute(sql, (top_k,))])
+    return [profiles[i] for i in range(len(columns_info))]
+
+
+# --------------------- Comparing Databases --------------------- #
+def attach_database(conn, path, alias=DIFF_ALIAS):
+    """Attaches the database file at path to conn, read-only, as schema alias."""
+    if not os.path.exists(path):
+        raise ValueError(f"No such database: {path}")
+    uri = "file:" + pathname2url(os.path.abspath(path)) + "?mode=ro"
+    conn.execute(f"ATTACH DATABASE ? AS {quote_ident(alias)}", (uri,))
+
+
+def schema_objects(conn, schema):
+    """Returns {(type, name): sql} of the tables, indexes, views and triggers in schema, without search indexes."""
+    rows = conn.execute(f"SELECT type, name, sql FROM {quote_ident(schema)}.sqlite_master "
+                        f"WHERE name NOT LIKE 'sqlite_%'").fetchall()
+    hidden = hidden_index_tables([name for kind, name, _ in rows if kind == "table"])
+    return {(kind, name): sql for kind, name, sql in rows if name not in hidden}
+
+
+def table_columns(conn, schema, table):
+    """PRAGMA table_info rows of table in schema."""
+    return conn.execute(f"PRAGMA {quote_ident(schema)}.table_info({quote_ident(table)})").fetchall()
+
+
+def diff_schemas(conn, alias=DIFF_ALIAS):
+    """Lists the differences between the schemas of main and alias as (type, name, status, detail) tuples.
+
+    status is "only here" (in main), "only there" (in alias) or "different";
+    tables are compared column by column, other objects by their SQL.
+    """
+    here, there = schema_objects(conn, "main"), schema_objects(conn, alias)
+    differences = []
+    for kind, name in sorted(set(here) | set(there)):
+        if (kind, name) not in there:
+            differences.append((kind, name, "only here", ""))
+        elif (kind, name) not in here:
+            differences.append((kind, name, "only there", ""))
+        elif kind == "table":
+            ours = {col[1]: col[2:] for col in table_columns(conn, "main", name)}
+            theirs = {col[1]: col[2:] for col in table_columns(conn, alias, name)}
+            details = []
+            for label, names in (("only here", [col for col in ours if col not in theirs]),
+                                 ("only there", [col for col in theirs if col not in ours]),
+                                 ("changed", [col for col in ours if col in theirs and ours[col] != theirs[col]])):
+                if names:
+                    details.append(f"columns {label}: {', '.join(names)}")
+            if details:
+                differences.append((kind, name, "different", "; ".join(details)))
+        elif " ".join((here[kind, name] or "").split()) != " ".join((there[kind, name] or "").split()):
+            differences.append((kind, name, "different", "definition changed"))
+    return differences
+
+
+def comparable_tables(conn, alias=DIFF_ALIAS, tables=None):
+    """Returns ([(table, columns, key_columns)], [(table, reason)]): the tables to compare and the rest.
+
+    A table is comparable when it exists on both sides with the same columns
+    and primary key. Rows are matched on the primary key, or on rowid when
+    the table has none.
+    """
+    here, there = schema_objects(conn, "main"), schema_objects(conn, alias)
+    names = [name for kind, name in here if kind == "table"] if tables is None else tables
+    comparable, skipped = [], []
+    for table in names:
+        if ("table", table) not in here or ("table", table) not in there:
+            skipped.append((table, "only in one database"))
+            continue
+        if (here["table", table] or "").upper().startswith("CREATE VIRTUAL"):
+            skipped.append((table, "virtual table"))
+            continue
+        ours, theirs = table_columns(conn, "main", table), table_columns(conn, alias, table)
+        if sorted(col[1] for col in ours) != sorted(col[1] for col in theirs):
+            skipped.append((table, "columns differ"))
+            continue
+        key_of = lambda columns: [col[1] for col in sorted((col for col in columns if col[5]), key=lambda col: col[5])]
+        if key_of(ours) != key_of(theirs):
+            skipped.append((table, "primary keys differ"))
+            continue
+        comparable.append((table, [col[1] for col in ours], key_of(ours) or ["rowid"]))
+    return comparable, skipped
+
+
+def _key_range(key_columns, low, high):
+    """Returns (where_sql, params) selecting keys in (low, high]; either bound may be None (open)."""
+    key = ", ".join(quote_ident(col) for col in key_columns)
+    if len(key_columns) > 1:
+        key = f"({key})"
+    marks = ", ".join(["?"] * len(key_columns))
+    marks = f"({marks})" if len(key_columns) > 1 else marks
+    conditions, params = [], []
+    if low is not None:
+        conditions.append(f"{key} > {marks}")
+        params += low
+    if high is not None:
+        conditions.append(f"{key} <= {marks}")
+        params += high
+    return (" WHERE " + " AND ".join(conditions) if conditions else ""), params
+
+
+def diff_rows(conn, table, columns, key_columns, low, high, alias=DIFF_ALIAS):
+    """Compares the rows of table with keys in (low, high] in main and alias.
+
+    Returns (kind, key, row here, row there) tuples in key order, kind being
+    "inserted" (only in alias), "deleted" (only in main) or "changed". Values
+    must match in type too, so 1 and 1.0 differ as they do in SQLite.
+    """
+    where, params = _key_range(key_columns, low, high)
+    selected = ", ".join(quote_ident(col) for col in key_columns + columns)
+    width = len(key_columns)
+
+    def read(schema):
+        sql = f"SELECT {selected} FROM {quote_ident(schema)}.{quote_ident(table)}{where}"
+        return {tuple(row[:width]): row[width:] for row in conn.execute(sql, params)}
+
+    here, there = read("main"), read(alias)
+    exact = lambda row: [(type(value), value) for value in row]
+    differences = [("deleted", key, row, None) for key, row in here.items() if key not in there]
+    differences += [("inserted", key, None, row) for key, row in there.items() if key not in here]
+    differences += [("changed", key, row, there[key]) for key, row in here.items()
+                    if key in there and exact(row) != exact(there[key])]
+    differences.sort(key=lambda item: [(-1, 0) if value is None else sqlite_sort_key(value) for value in item[1]])
+    return differences
+
+
+def diff_table(conn, table, columns, key_columns, alias=DIFF_ALIAS, chunk_rows=DIFF_CHUNK_ROWS,
+               max_rows=DIFF_ROWS_KEPT, on_event=None, task=None):
+    """Compares table in main and alias chunk by chunk and returns the result.
+
+    Both sides are read in key order, chunk_rows keys at a time (the chunk
+    bounds come from main), and each chunk is reduced to a hash of its
+    pickled rows, so an identical chunk costs one read and no comparisons.
+    Only chunks whose hashes differ are compared row by row (see
+    diff_rows). ("progress", table, rows hashed) is passed to on_event
+    after each chunk.
+
+    The result holds the table, columns, key, chunk and row counts, the
+    (low, high] key ranges of the differing chunks, the inserted, deleted
+    and changed counts and the first max_rows differences.
+    """
+    key = ", ".join(quote_ident(col) for col in key_columns)
+    read_columns = [col for col in key_columns if col not in columns] + columns  # i.e. rowid, if it is the key
+    selected = ", ".join(quote_ident(col) for col in read_columns)
+    positions = [read_columns.index(col) for col in key_columns]
+    result = {"table": table, "columns": columns, "key": key_columns, "chunks": 0, "rows": 0, "ranges": [],
+              "inserted": 0, "deleted": 0, "changed": 0, "differences": []}
+
+    def chunk_hash(schema, low, high, limit=None):
+        """Returns (rows, hash, last key) of the chunk; both sides use the same batches, so equal rows hash equally."""
+        where, params = _key_range(key_columns, low, high)
+        limit_sql = f" LIMIT {int(limit)}" if limit else ""
+        cursor = conn.execute(f"SELECT {selected} FROM {quote_ident(schema)}.{quote_ident(table)}{where} "
+                              f"ORDER BY {key}{limit_sql}", params)
+        digest, count, last = hashlib.blake2b(digest_size=16), 0, None
+        while True:
+            batch = cursor.fetchmany(FETCH_BATCH_SIZE)
+            if not batch:
+                return count, digest.digest(), last
+            digest.update(pickle.dumps(batch, pickle.HIGHEST_PROTOCOL))
+            count += len(batch)
+            last = tuple(batch[-1][i] for i in positions)
+
+    low = None
+    while True:
+        if task is not None and task.cancelled:
+            raise TaskCancelled()
+        count, ours, last = chunk_hash("main", low, None, chunk_rows)
+        high = last if count == chunk_rows else None  # The last chunk also takes every later key of alias
+        theirs = chunk_hash(alias, low, high)[1]
+        result["chunks"] += 1
+        result["rows"] += count
+        if theirs != ours:
+            differences = diff_rows(conn, table, columns, key_columns, low, high, alias)
+            if differences:
+                result["ranges"].append((low, high))
+            for difference in differences:
+                result[difference[0]] += 1
+            result["differences"] += differences[:max_rows - len(result["differences"])]
+        if on_event is not None:
+            on_event(("progress", table, result["rows"]))
+        if high is None:
+            return result
+        low = high
+
+
+def sql_literal(value):
+    """Returns value as an SQL literal of the same type."""
+    if value is None:
+        return "NULL"
+    if isinstance(value, bytes):
+        return "X'" + value.hex() + "'"
+    if isinstance(value, float):
+        if math.isnan(value):
+            return "NULL"
+        if math.isinf(value):
+            return "1e999" if value > 0 else "-1e999"
+        return repr(value)
+    if isinstance(value, int):
+        return str(value)
+    return "'" + str(value).replace("'", "''") + "'"
+
+
+def sync_statements(table, columns, key_columns, differences, target="main"):
+    """Yields the statements that make target ("main" or the alias) match the other side for differences."""
+    table_sql = quote_ident(table)
+    for kind, key, here, there in differences:
+        if target != "main":
+            kind = {"inserted": "deleted", "deleted": "inserted"}.get(kind, kind)
+            here, there = there, here
+        key_sql = " AND ".join(f"{quote_ident(col)} {'IS' if value is None else '='} {sql_literal(value)}"
+                               for col, value in zip(key_columns, key))
+        if kind == "deleted":
+            yield f"DELETE FROM {table_sql} WHERE {key_sql};"
+        elif kind == "inserted":
+            names, values = list(columns), list(there)
+            if key_columns == ["rowid"]:
+                names, values = ["rowid"] + names, list(key) + values
+            yield (f"INSERT INTO {table_sql} ({', '.join(quote_ident(col) for col in names)}) "
+                   f"VALUES ({', '.join(sql_literal(value) for value in values)});")
+        else:
+            changes = ", ".join(f"{quote_ident(col)} = {sql_literal(new)}"
+                                for col, old, new in zip(columns, here, there)
+                                if (type(old), old) != (type(new), new))
+            yield f"UPDATE {table_sql} SET {changes} WHERE {key_sql};"
+
+
+def write_sync_script(conn, comparison, file_path, alias=DIFF_ALIAS, target="main", task=None):
+    """Writes the SQL script making target match the other side of comparison; returns the statements written.
+
+    comparison is the result of DatabaseEngine.compare_database; the rows of
+    its differing chunks are read again, so the script is complete even
+    when only the first differences were kept. Schema differences are
+    listed as comments but not applied.
+    """
+    statements = 0
+    with open(file_path, "w", encoding="utf-8", newline="\n") as f:
+        paths = (comparison["path"], comparison["other"]) if target == "main" else \
+            (comparison["other"], comparison["path"])
+        f.write(f"-- Makes {paths[0]} match {paths[1]}\n")
+        for kind, name, status, detail in comparison["schema"]:
+            f.write(f"-- Schema difference not applied: {kind} {name} {status}{': ' + detail if detail else ''}\n")
+        f.write("BEGIN;\n")
+        for result in comparison["tables"]:
+            for low, high in result["ranges"]:
+                if task is not None and task.cancelled:
+                    raise TaskCancelled()
+                differences = diff_rows(conn, result["table"], result["columns"], result["key"], low, high, alias)
+                for statement in sync_statements(result["table"], result["columns"], result["key"], differences,
+                                                 target):
+                    f.write(statement + "\n")
+                    statements += 1
+        f.write("COMMIT;\n")
+    return statements
+
+
+# --------------------- Storage --------------------- #
+def storage_summary(conn):
+    """Returns the page size, page and free-page counts (and their bytes), auto_vacuum mode and
+    whether planner statistics exist."""
+    page_size = conn.execute("PRAGMA page_size").fetchone()[0]
+    pages = conn.execute("PRAGMA page_count").fetchone()[0]
+    free_pages = conn.execute("PRAGMA freelist_count").fetchone()[0]
+    auto_vacuum = AUTO_VACUUM_MODES[conn.execute("PRAGMA auto_vacuum").fetchone()[0]]
+    analyzed = conn.execute("SELECT 1 FROM sqlite_master WHERE name = 'sqlite_stat1'").fetchone() is not None
+    return {"page_size": page_size, "pages": pages, "bytes": pages * page_size, "free_pages": free_pages,
+            "free_bytes": free_pages * page_size, "auto_vacuum": auto_vacuum, "analyzed": analyzed}
+
+
+def storage_objects(conn, on_event=None, task=None):
+    """Measures every table and index with the dbstat virtual table; returns one dict per b-tree, largest first.
+
+    Each dict holds name, type ("table" or "index"), table (the one an index
+    belongs to), pages, overflow (pages holding the spill of large values),
+    bytes, payload (bytes of stored data), unused (free bytes inside the
+    pages) and fill (the share of the pages in use). Objects are read one
+    at a time and (pages_measured, page_count) is passed to on_event after
+    each. Raises ValueError when SQLite was built without dbstat.
+    """
+    try:
+        first = conn.execute("SELECT name FROM dbstat LIMIT 1").fetchone()
+    except sqlite3.OperationalError:
+        raise ValueError("This SQLite build has no dbstat table, so table and index sizes cannot be measured")
+    schema_table = first[0] if first else "sqlite_master"  # Page 1; newer SQLite calls it sqlite_schema
+    page_count = conn.execute("PRAGMA page_count").fetchone()[0]
+    objects = [(schema_table, "table", schema_table)] + conn.execute(
+        "SELECT name, type, tbl_name FROM sqlite_master WHERE rootpage > 0 ORDER BY name").fetchall()
+    results, measured = [], 0
+    for name, kind, table in objects:
+        if task is not None and task.cancelled:
+            raise TaskCancelled()
+        pages, overflow, size, payload, unused = conn.execute(
+            "SELECT COUNT(*), TOTAL(pagetype = 'overflow'), TOTAL(pgsize), TOTAL(payload), TOTAL(unused) "
+            "FROM dbstat WHERE name = ?", (name,)).fetchone()
+        results.append({"name": name, "type": kind, "table": table, "pages": pages, "overflow": int(overflow),
+                        "bytes": int(size), "payload": int(payload), "unused": int(unused),
+                        "fill": 1 - unused / size if size else 0.0})
+        measured += pages
+        if on_event is not None:
+            on_event((measured, page_count))
+    results.sort(key=lambda item: -item["bytes"])
+    return results
+
+
+def format_storage(storage):
+    """Renders a DatabaseEngine.storage() result as text."""
+    mib = lambda size: f"{size / 1024 ** 2:,.1f}"
+    lines = [f"File: {storage['pages']:,} pages of {storage['page_size']:,} bytes ({mib(storage['bytes'])} MiB)",
+             f"Free pages: {storage['free_pages']:,} ({mib(storage['free_bytes'])} MiB)",
+             f"Auto-vacuum: {storage['auto_vacuum']}",
+             f"Planner statistics: {'gathered' if storage['analyzed'] else 'none (run ANALYZE)'}", ""]
+    width = max([len(item["name"]) for item in storage["objects"]] + [4])
+    table_width = max([len(item["table"]) for item in storage["objects"]] + [5])
+    lines.append(f"{'Name':<{width}}  Type   {'Table':<{table_width}}  {'Pages':>10}  {'MiB':>9}  "
+                 f"{'Unused MiB':>10}  {'Fill':>5}  {'Overflow':>9}")
+    for item in storage["objects"]:
+        lines.append(f"{item['name']:<{width}}  {item['type']:<5}  {item['table']:<{table_width}}  "
+                     f"{item['pages']:>10,}  {mib(item['bytes']):>9}  {mib(item['unused']):>10}  "
+                     f"{item['fill']:>5.0%}  {item['overflow']:>9,}")
+    return "\n".join(lines)
+
+
+def incremental_vacuum(conn, pages=None):
+    """Releases up to pages free pages (all when None) from the end of the file; returns the number released.
+
+    Only databases in auto_vacuum "incremental" mode can do this; for the
+    others nothing is released (see vacuum to switch modes).
+    """
+    before = conn.execute("PRAGMA freelist_count").fetchone()[0]
+    # Each step of the pragma frees one page; executescript() steps it to the end, execute() only once
+    conn.executescript("PRAGMA incremental_vacuum" + ("" if pages is None else f"({int(pages)})"))
+    return before - conn.execute("PRAGMA freelist_count").fetchone()[0]
+
+
+def vacuum(conn, auto_vacuum=None):
+    """Rebuilds the database file in place without free pages, switching auto_vacuum mode first if given.
+
+    Returns the number of bytes the file shrank by. VACUUM needs every
+    other connection to be outside a transaction and, outside WAL mode,
+    briefly locks readers out too.
+    """
+    if auto_vacuum is not None:
+        if auto_vacuum.lower() not in AUTO_VACUUM_MODES:
+            raise ValueError(f"auto_vacuum must be one of {', '.join(AUTO_VACUUM_MODES)}")
+        conn.execute(f"PRAGMA auto_vacuum = {auto_vacuum}")
+    size = lambda: conn.execute("PRAGMA page_count").fetchone()[0] * conn.execute("PRAGMA page_size").fetchone()[0]
+    before = size()
+    conn.execute("VACUUM")
+    return before - size()
+
+
+def vacuum_into(conn, target_path, opcodes=VACUUM_OPCODES, task=None):
+    """Writes a compacted copy of the database behind conn to target_path with VACUUM INTO.
+
+    The copy has no free pages and densely packed b-trees; conn may be
+    read-only, so the live database is not locked against writers. conn's
+    cache size and progress handler are restored afterwards. It is
+    written to a ".part" file that replaces target_path once complete. With
+    a task, (bytes_written, bytes_in_use) is emitted as the copy grows and
+    cancelling aborts it.
+    """
+    summary = storage_summary(conn)
+    expected = summary["bytes"] - summary["free_bytes"]
+    partial_path = target_path + ".part"
+    if os.path.exists(partial_path):
+        os.remove(partial_path)
+
+    def on_progress():
+        if task is None:
+            return 0
+        if task.cancelled:
+            return 1
+        task.emit((min(written_bytes(partial_path), expected), expected))
+        return 0
+
+    cache_size = conn.execute("PRAGMA cache_size").fetchone()[0]
+    conn.execute(f"PRAGMA cache_size = {VACUUM_CACHE_SIZE}")  # The copy's cache is sized after conn's
+    try:
+        with progress_handler(conn, on_progress, opcodes):
+            conn.execute("VACUUM INTO ?", (partial_path,))
+        os.replace(partial_path, target_path)
+    except BaseException as e:
+        if os.path.exists(partial_path):
+            os.remove(partial_path)
+        if isinstance(e, sqlite3.OperationalError) and task is not None and task.cancelled:
+            raise TaskCancelled()
+        raise
+    finally:
+        conn.execute(f"PRAGMA cache_size = {cache_size}")
+    return target_path
+
+
+class ConnectionManager:
+    """Owns the long-lived connections to one database file.
+
+    A single read-write connection is shared by every operation so SQLite's
+    page cache and Python's prepared-statement cache stay warm between calls;
+    writer() serializes the threads using it. A separate read-only
+    connection is used for browsing, and open_reader() hands out independent
+    read-only connections for background threads.
+    """
+
+    def __init__(self, db_path, cache_size=DEFAULT_CACHE_SIZE, mmap_size=DEFAULT_MMAP_SIZE,
+                 statement_cache=DEFAULT_STATEMENT_CACHE, busy_timeout=DEFAULT_BUSY_TIMEOUT_MS,
+                 write_retries=DEFAULT_WRITE_RETRIES, foreground=None):
+        self.db_path = db_path
+        self.cache_size = cache_size
+        self.mmap_size = mmap_size
+        self.statement_cache = statement_cache
+        self.busy_timeout = busy_timeout
+        self.write_retries = write_retries
+        self.foreground = foreground  # Thread that must not block on writes (the GUI's), see writer()
+        self._connection = None
+        self._reader = None
+        self._idle_readers = []
+        self._closed = False
+        self._lock = threading.Lock()
+        self._write_lock = threading.RLock()
+        self.catalog = SchemaCatalog(self)
+        self.workload = WorkloadLog()
+        self.metrics = Metrics()
+
+    def _connect(self, label, database, **options):
+        with self.metrics.measure("connect", label):
+            conn = sqlite3.connect(database, cached_statements=self.statement_cache, check_same_thread=False, **options)
+            conn.execute(f"PRAGMA cache_size = {int(self.cache_size)}")
+            conn.execute(f"PRAGMA mmap_size = {int(self.mmap_size)}")
+            conn.execute(f"PRAGMA busy_timeout = {int(self.busy_timeout)}")
+        self._trace(conn, label)
+        return conn
+
+    def _trace(self, conn, label):
+        conn.set_trace_callback(self.metrics.trace_callback(label) if self.metrics.tracing else None)
+
+    def set_tracing(self, enabled):
+        """Turns recording of every statement run (into metrics' trace) on or off for all connections."""
+        self.metrics.tracing = bool(enabled)
+        with self._lock:
+            connections = [("writer", self._connection), ("reader", self._reader)]
+            connections += [("pool", conn) for conn in self._idle_readers]
+            for label, conn in connections:
+                if conn is not None:
+                    self._trace(conn, label)
+
+    def set_busy_timeout(self, milliseconds):
+        """Changes busy_timeout for new connections and the ones already open."""
+        self.busy_timeout = int(milliseconds)
+        with self._lock:
+            for conn in [self._connection, self._reader] + self._idle_readers:
+                if conn is not None:
+                    conn.execute(f"PRAGMA busy_timeout = {self.busy_timeout}")
+
+    @property
+    def connection(self):
+        """The shared read-write connection, opened on first use."""
+        with self._lock:
+            if self._connection is None:
+                self._connection = self._connect("writer", self.db_path)
+            return self._connection
+
+    @contextmanager
+    def writer(self):
+        """Holds the read-write connection for the with block and yields it.
+
+        Every transaction on the shared connection runs inside writer(), so
+        writes from different threads never interleave: a commit or rollback
+        by one would otherwise end another's transaction halfway. Other
+        threads wait their turn; the foreground thread waits at most
+        FOREGROUND_WRITE_WAIT and then gets WriterBusy, so the window never
+        freezes behind a long import. The lock is re-entrant.
+        """
+        timeout = FOREGROUND_WRITE_WAIT if threading.current_thread() is self.foreground else -1
+        if not self._write_lock.acquire(timeout=timeout):
+            raise WriterBusy("Another operation is writing to the database; try again once it has finished")
+        try:
+            yield self.connection
+        finally:
+            self._write_lock.release()
+
+    @property
+    def reader(self):
+        """The shared read-only connection used for browsing."""
+        with self._lock:
+            if self._reader is None:
+                self._reader = self.open_reader("reader")
+            return self._reader
+
+    def open_reader(self, label="pool"):
+        """Opens a new read-only connection; the caller is responsible for closing it."""
+        uri = "file:" + pathname2url(os.path.abspath(self.db_path)) + "?mode=ro"
+        return self._connect(label, uri, uri=True)
+
+    @contextmanager
+    def pooled_reader(self):
+        """Borrows a read-only connection from the pool for the duration of a with block."""
+        with self._lock:
+            conn = self._idle_readers.pop() if self._idle_readers else None
+        if conn is None:
+            conn = self.open_reader()
+        else:
+            self._trace(conn, "pool")  # Tracing may have been switched since it was returned
+        try:
+            yield conn
+        finally:
+            with self._lock:
+                keep = not self._closed and len(self._idle_readers) < MAX_IDLE_READERS
+                if keep:
+                    self._idle_readers.append(conn)
+            if not keep:
+                conn.close()
+
+    def close(self):
+        with self._lock:
+            self._closed = True
+            for conn in [self._reader, self._connection] + self._idle_readers:
+                if conn is not None:
+                    conn.close()
+            self._connection = self._reader = None
+            self._idle_readers = []
+
+
+class SchemaCatalog:
+    """Caches the schema of one database until PRAGMA schema_version changes.
+
+    Tables, columns, keys, indexes and foreign keys are read once and then
+    served from memory; each lookup only reads PRAGMA schema_version, which
+    SQLite bumps on every schema change by any connection.
+    """
+
+    def __init__(self, db):
+        self.db = db
+        self._version = None
+        self._cache = {}
+        self._lock = threading.RLock()
+
+    def _lookup(self, key, load):
+        with self._lock:
+            conn = self.db.reader
+            version = conn.execute("PRAGMA schema_version").fetchone()[0]
+            if version != self._version:
+                self._cache.clear()
+                self._version = version
+            if key not in self._cache:
+                with self.db.metrics.measure("schema", " ".join(map(str, key))):
+                    self._cache[key] = load(conn)
+            return self._cache[key]
+
+    def invalidate(self):
+        with self._lock:
+            self._cache.clear()
+            self._version = None
+
+    def tables(self):
+        """Names of all tables, in creation order."""
+        return self._lookup(("tables",), lambda conn: [
+            row[0] for row in conn.execute("SELECT name FROM sqlite_master WHERE type='table'")])
+
+    def columns(self, table):
+        """PRAGMA table_info rows: (cid, name, type, notnull, dflt_value, pk)."""
+        return self._lookup(("columns", table), lambda conn: conn.execute(
+            f"PRAGMA table_info({quote_ident(table)})").fetchall())
+
+    def column_names(self, table):
+        return [col[1] for col in self.columns(table)]
+
+    def primary_key(self, table):
+        """Primary key column names in key order (empty when the table has none)."""
+        return [col[1] for col in sorted((col for col in self.columns(table) if col[5]), key=lambda col: col[5])]
+
+    def data_version(self):
+        """Returns PRAGMA data_version, which changes whenever another connection commits."""
+        with self._lock:
+            return self.db.reader.execute("PRAGMA data_version").fetchone()[0]
+
+    def has_rowid(self, table):
+        def load(conn):
+            try:
+                conn.execute(f"SELECT rowid FROM {quote_ident(table)} LIMIT 0")
+                return True
+            except sqlite3.OperationalError:
+                return False
+        return self._lookup(("has_rowid", table), load)
+
+    def indexes(self, table):
+        """(name, unique, origin, columns) for each index on table; origin is c, u or pk as in PRAGMA index_list."""
+        def load(conn):
+            indexes = []
+            for _, name, unique, origin, _ in conn.execute(f"PRAGMA index_list({quote_ident(table)})").fetchall():
+                columns = [col[2] for col in conn.execute(f"PRAGMA index_info({quote_ident(name)})").fetchall()]
+                indexes.append((name, bool(unique), origin, columns))
+            return indexes
+        return self._lookup(("indexes", table), load)
+
+    def foreign_keys(self, table):
+        """PRAGMA foreign_key_list rows: (id, seq, table, from, to, on_update, on_delete, match)."""
+        return self._lookup(("foreign_keys", table), lambda conn: conn.execute(
+            f"PRAGMA foreign_key_list({quote_ident(table)})").fetchall())
+
+
+class WorkloadLog:
+    """Records the statements run against one database, grouped by normalized SQL.
+
+    For every distinct statement it keeps the run count, total and maximum
+    latency, where it came from (browsing or the query window), one sample
+    of the real SQL and parameters, and the query plan captured on first
+    sight. The Index Advisor analyses these entries.
+    """
+
+    def __init__(self, max_entries=MAX_WORKLOAD_ENTRIES):
+        self.max_entries = max_entries
+        self._entries = {}
+        self._lock = threading.Lock()
+
+    def record(self, conn, sql, params, elapsed, source):
+        normalized = normalize_sql(sql)
+        with self._lock:
+            entry = self._entries.get(normalized)
+        if entry is None:
+            try:
+                plan = query_plan(conn, sql, params)
+            except sqlite3.Error:
+                plan = None
+            entry = {"sql": normalized, "sample": (sql, tuple(params)), "plan": plan, "source": source,
+                     "count": 0, "total": 0.0, "max": 0.0}
+        with self._lock:
+            entry = self._entries.setdefault(normalized, entry)
+            entry["count"] += 1
+            entry["total"] += elapsed
+            entry["max"] = max(entry["max"], elapsed)
+            if len(self._entries) > self.max_entries:
+                rarest = min(self._entries.values(), key=lambda item: (item["count"], item["total"]))
+                del self._entries[rarest["sql"]]
+
+    def entries(self):
+        """Snapshot of the entries, most expensive (total latency) first."""
+        with self._lock:
+            entries = [dict(entry) for entry in self._entries.values()]
+        return sorted(entries, key=lambda entry: entry["total"], reverse=True)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+
+class Metrics:
+    """Times the operations run against one database and keeps a trace of them.
+
+    Each operation (connect, schema, fetch, count, query, commit, import,
+    export, backup, and render from the GUI) accumulates its count, total
+    time, rows and bytes, with its latest METRICS_SAMPLES timings kept for
+    rolling percentiles. Every operation is also appended to a bounded
+    trace, as is every statement SQLite runs while tracing is on (see
+    ConnectionManager.set_tracing); dump() writes the trace as JSON.
+    """
+
+    def __init__(self, samples=METRICS_SAMPLES, trace_events=TRACE_EVENTS):
+        self.samples = samples
+        self.tracing = False
+        self.started = time.time()
+        self._clock = time.perf_counter()
+        self._operations = {}
+        self._events = deque(maxlen=trace_events)
+        self._lock = threading.Lock()
+
+    def record(self, operation, elapsed, rows=0, size=0, detail=None, error=None):
+        """Adds one run of operation that took elapsed seconds."""
+        event = {"time": round(time.perf_counter() - self._clock, 6), "operation": operation,
+                 "ms": round(elapsed * 1000, 3), "thread": threading.current_thread().name}
+        for name, value in (("rows", rows), ("bytes", size), ("detail", detail), ("error", error)):
+            if value:
+                event[name] = value
+        with self._lock:
+            stats = self._operations.get(operation)
+            if stats is None:
+                stats = self._operations[operation] = {"count": 0, "total": 0.0, "max": 0.0, "rows": 0,
+                                                       "bytes": 0, "errors": 0, "recent": deque(maxlen=self.samples)}
+            stats["count"] += 1
+            stats["total"] += elapsed
+            stats["max"] = max(stats["max"], elapsed)
+            stats["rows"] += rows
+            stats["bytes"] += size
+            stats["errors"] += error is not None
+            stats["recent"].append(elapsed)
+            self._events.append(event)
+
+    @contextmanager
+    def measure(self, operation, detail=None):
+        """Times the with block as one run of operation.
+
+        The block may set "rows" and "bytes" in the dict it receives; a
+        block that raises is recorded with its error.
+        """
+        counts = {"rows": 0, "bytes": 0}
+        started = time.perf_counter()
+        try:
+            yield counts
+        except BaseException as e:
+            self.record(operation, time.perf_counter() - started, counts["rows"], counts["bytes"], detail,
+                        type(e).__name__)
+            raise
+        self.record(operation, time.perf_counter() - started, counts["rows"], counts["bytes"], detail)
+
+    def trace_callback(self, label):
+        """Returns a set_trace_callback function recording each statement run on the connection named label."""
+        def trace(statement):
+            event = {"time": round(time.perf_counter() - self._clock, 6), "operation": "sql", "connection": label,
+                     "thread": threading.current_thread().name, "sql": statement[:TRACE_SQL_CHARS]}
+            with self._lock:
+                self._events.append(event)
+        return trace
+
+    def summary(self):
+        """Per-operation statistics, slowest (total time) first; times are in milliseconds."""
+        with self._lock:
+            operations = [(name, dict(stats), sorted(stats["recent"])) for name, stats in self._operations.items()]
+        summary = []
+        for name, stats, recent in operations:
+            percentile = lambda share: recent[min(len(recent) - 1, int(len(recent) * share))] * 1000
+            summary.append({"operation": name, "count": stats["count"], "total_ms": stats["total"] * 1000,
+                            "mean_ms": stats["total"] * 1000 / stats["count"], "p50_ms": percentile(0.5),
+                            "p95_ms": percentile(0.95), "max_ms": stats["max"] * 1000, "rows": stats["rows"],
+                            "bytes": stats["bytes"], "errors": stats["errors"]})
+        return sorted(summary, key=lambda item: item["total_ms"], reverse=True)
+
+    def events(self):
+        with self._lock:
+            return list(self._events)
+
+    def dump(self, file_path):
+        """Writes the summary and the trace as JSON to file_path and returns the number of events written."""
+        events = self.events()
+        trace = {"started": time.strftime("%Y-%m-%dT%H:%M:%S", time.localtime(self.started)),
+                 "tracing": self.tracing, "operations": self.summary(), "events": events}
+        with open(file_path, "w", encoding="utf-8") as f:
+            json.dump(trace, f, indent=1, default=str)
+        return len(events)
+
+    def clear(self):
+        with self._lock:
+            self._operations.clear()
+            self._events.clear()
+
+
+def written_bytes(path):
+    """Size of the file at path, or of all files in the directory at path."""
+    if os.path.isdir(path):
+        return sum(entry.stat().st_size for entry in os.scandir(path) if entry.is_file())
+    return os.path.getsize(path) if os.path.exists(path) else 0
+
+
+def cacheable_script(statements):
+    """Tells whether the results of statements can be cached: plain reads giving the same rows every time."""
+    for sql in statements:
+        normalized = normalize_sql(sql).upper()
+        first = normalized.split(None, 1)[0] if normalized.strip() else ""
+        if first not in ("SELECT", "WITH", "VALUES"):
+            return False
+        if re.search(r"\b(INSERT|UPDATE|DELETE|REPLACE)\b", normalized):
+            return False  # Writing CTE
+        if re.search(r"\b(RANDOM|RANDOMBLOB|CHANGES|TOTAL_CHANGES|LAST_INSERT_ROWID)\s*\(|"
+                     r"\bCURRENT_(DATE|TIME|TIMESTAMP)\b", normalized) or "'now'" in sql.lower():
+            return False
+    return bool(statements)
+
+
+class PageCache:
+    """LRU cache of browsed pages, row counts and query results of one database.
+
+    Values are stored pickled, which is compact and a fast way to hand out
+    private copies, and evicted least recently used first once their
+    bytes exceed budget. Every lookup passes the database's current
+    PRAGMA data_version: when it differs from the version the entries were
+    stored under, some connection has committed since and the whole cache
+    is dropped, so a cached value is never older than the last commit.
+    Local writes call clear() as well.
+    """
+
+    def __init__(self, budget=DEFAULT_CACHE_BUDGET):
+        self.budget = budget
+        self._entries = OrderedDict()  # key -> pickled value
+        self._bytes = 0
+        self._version = None
+        self._lock = threading.Lock()
+        self.hits = self.misses = 0
+
+    def _check_version(self, version):
+        if version != self._version:
+            self._entries.clear()
+            self._bytes = 0
+            self._version = version
+
+    def get(self, key, version):
+        """Returns the value cached under key, or None."""
+        with self._lock:
+            self._check_version(version)
+            blob = self._entries.get(key)
+            if blob is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+        return pickle.loads(blob)
+
+    def put(self, key, value, version):
+        """Caches value under key; version is the data_version read before value was computed."""
+        blob = pickle.dumps(value, pickle.HIGHEST_PROTOCOL)
+        if len(blob) > self.budget // CACHE_ENTRY_SHARE:
+            return
+        with self._lock:
+            self._check_version(version)
+            old = self._entries.pop(key, None)
+            if old is not None:
+                self._bytes -= len(old)
+            self._entries[key] = blob
+            self._bytes += len(blob)
+            self._evict()
+
+    def _evict(self):
+        while self._bytes > self.budget and self._entries:
+            _, blob = self._entries.popitem(last=False)
+            self._bytes -= len(blob)
+
+    def resize(self, budget):
+        with self._lock:
+            self.budget = budget
+            self._evict()
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._bytes = 0
+
+    def stats(self):
+        with self._lock:
+            return {"entries": len(self._entries), "bytes": self._bytes, "budget": self.budget,
+                    "hits": self.hits, "misses": self.misses}
+
+
+class TaskCancelled(Exception):
+    """Raised when the task driving an operation has been cancelled."""
+
+
+class WriterBusy(Exception):
+    """Raised when the foreground thread would have to wait for another thread's write (see ConnectionManager.writer)."""
+
+
+class EditConflict(Exception):
+    """Raised by EditBuffer.commit when a staged change cannot be applied.
+
+    change is the offending change; the whole commit has been rolled back.
+    """
+    def __init__(self, change, message):
+        super().__init__(message)
+        self.change = change
+
+
+class EditBuffer:
+    """Row edits to one table, staged and then committed together.
+
+    Each staged change is a dict with its kind ("insert", "update" or
+    "delete"), the key of the row it applies to (a tuple of the values of
+    the table's row key columns, None for inserts), the columns and values
+    written, the row as it was displayed before the change, and any extra
+    items the caller passes along (the GUI keeps its grid item there).
+    Changes form an undo stack until they are committed.
+    """
+    def __init__(self, engine, table):
+        self.engine = engine
+        self.table = table
+        self.key_columns = engine.row_key_columns(table)
+        # Writing an INTEGER PRIMARY KEY column changes the rowid
+        self.written_key_columns = list(self.key_columns)
+        if self.key_columns == ["rowid"]:
+            pk_columns = engine.catalog.primary_key(table)
+            types = {col[1]: col[2].upper() for col in engine.catalog.columns(table)}
+            if len(pk_columns) == 1 and types[pk_columns[0]] == "INTEGER":
+                self.written_key_columns = pk_columns
+        self.changes = []
+
+    def __len__(self):
+        return len(self.changes)
+
+    def _stage(self, kind, key, columns, values, old_row, extra):
+        change = dict(extra, kind=kind, key=key, columns=list(columns), values=list(values),
+                      old_row=old_row, new_key=None)
+        self.changes.append(change)
+        return change
+
+    def insert(self, columns, values, **extra):
+        return self._stage("insert", None, columns, values, None, extra)
+
+    def update(self, key, columns, values, old_row=None, **extra):
+        return self._stage("update", key, columns, values, old_row, extra)
+
+    def delete(self, key, old_row=None, **extra):
+        return self._stage("delete", key, (), (), old_row, extra)
+
+    def undo(self):
+        """Removes and returns the most recent change, or None if nothing is staged."""
+        return self.changes.pop() if self.changes else None
+
+    def clear(self):
+        self.changes = []
+
+    def detach(self):
+        """Moves the staged changes into a new buffer, to be committed while this one takes new edits."""
+        detached = copy.copy(self)
+        detached.changes, self.changes = self.changes, []
+        return detached
+
+    def _key_where(self):
+        return " AND ".join(f"{quote_ident(col)} = ?" for col in self.key_columns)
+
+    def _stored_key(self, conn, key, columns, values):
+        """Returns the key of a row after columns were set to values, as stored (with type affinity applied)."""
+        written = dict(zip(columns, values))
+        key = tuple(written.get(name, value) for name, value in zip(self.written_key_columns, key))
+        selected = ", ".join(quote_ident(col) for col in self.key_columns)
+        row = conn.execute(f"SELECT {selected} FROM {quote_ident(self.table)} WHERE {self._key_where()}",
+                           key).fetchone()
+        return tuple(row) if row is not None else key
+
+    def _apply(self, conn, change):
+        """Runs one change and returns the key of the row it leaves behind (None once deleted)."""
+        table = quote_ident(self.table)
+        if change["kind"] == "insert":
+            columns = ", ".join(quote_ident(col) for col in change["columns"])
+            placeholders = ", ".join(["?"] * len(change["values"]))
+            cursor = conn.execute(f"INSERT INTO {table} ({columns}) VALUES ({placeholders})", change["values"])
+            if self.key_columns == ["rowid"]:
+                return (cursor.lastrowid,)
+            return self._stored_key(conn, [None] * len(self.key_columns), change["columns"], change["values"])
+        if change["kind"] == "update":
+            set_clause = ", ".join(f"{quote_ident(col)} = ?" for col in change["columns"])
+            cursor = conn.execute(f"UPDATE {table} SET {set_clause} WHERE {self._key_where()}",
+                                  change["values"] + list(change["key"]))
+        else:
+            cursor = conn.execute(f"DELETE FROM {table} WHERE {self._key_where()}", change["key"])
+        if cursor.rowcount == 0:
+            raise EditConflict(change, "The row was changed or deleted by someone else")
+        if change["kind"] == "delete":
+            return None
+        return self._stored_key(conn, change["key"], change["columns"], change["values"])
+
+    def commit(self, conn=None):
+        """Applies every staged change in one transaction and returns the committed changes.
+
+        Each change runs in its own savepoint, so a failing change is rolled
+        back on its own and reported as an EditConflict naming it; the
+        transaction as a whole is then rolled back too, leaving the database
+        untouched and the changes staged again. On success each change's
+        new_key holds the key of the row it produced, for refreshing just
+        those rows. Changes staged while a commit runs are kept for the next.
+        """
+        changes, self.changes = self.changes, []
+        try:
+            with self.engine.writer() as writer, self.engine.metrics.measure("commit", self.table) as counts:
+                retry_busy(lambda: self._commit_changes(conn or writer, changes), self.engine.db.write_retries)
+                counts["rows"] = len(changes)
+        except BaseException:
+            self.changes = changes + self.changes
+            raise
+        return changes
+
+    def _commit_changes(self, conn, changes):
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            for index, change in enumerate(changes):
+                conn.execute(f"SAVEPOINT edit_{index}")
+                try:
+                    change["new_key"] = self._apply(conn, change)
+                except sqlite3.Error as e:
+                    conn.execute(f"ROLLBACK TO edit_{index}")
+                    raise EditConflict(change, str(e)) from e
+                conn.execute(f"RELEASE edit_{index}")
+            conn.commit()
+        except BaseException:
+            conn.rollback()
+            raise
+
+
+class DatabaseEngine:
+    """All database operations of the Database Manager for one database file.
+
+    The GUI and the command line are both thin clients of this class: it
+    owns the connections (see ConnectionManager), the schema catalog and
+    the workload log, and never touches tkinter.
+    """
+    def __init__(self, db_path, cache_budget=DEFAULT_CACHE_BUDGET, **connection_options):
+        self.db_path = db_path
+        self.db = ConnectionManager(db_path, **connection_options)
+        self.catalog = self.db.catalog
+        self.workload = self.db.workload
+        self.metrics = self.db.metrics
+        self.cache = PageCache(cache_budget)
+        self._column_profiles = {}    # table -> (data_version, exact profiles)
+
+    @classmethod
+    def create(cls, db_path, **connection_options):
+        """Creates an empty database at db_path, replacing any existing file."""
+        if os.path.exists(db_path):
+            os.remove(db_path)
+        sqlite3.connect(db_path).close()
+        return cls(db_path, **connection_options)
+
+    @property
+    def connection(self):
+        """The read-write connection; all writes go through it."""
+        return self.db.connection
+
+    @property
+    def reader(self):
+        return self.db.reader
+
+    def pooled_reader(self):
+        return self.db.pooled_reader()
+
+    def writer(self):
+        return self.db.writer()
+
+    def close(self):
+        self.db.close()
+
+    def set_tracing(self, enabled):
+        self.db.set_tracing(enabled)
+
+    def _write(self, sql, params=(), conn=None):
+        """Runs one write statement in its own transaction, retrying while the database is locked."""
+        with self.db.writer() as writer:
+            conn = conn or writer
+            self.cache.clear()
+
+            def work():
+                with conn:
+                    return conn.execute(sql, params).rowcount
+            with self.metrics.measure("commit", sql.split(None, 1)[0].upper()) as counts:
+                counts["rows"] = max(0, retry_busy(work, self.db.write_retries))
+                return counts["rows"]
+
+    def _write_all(self, statements):
+        """Runs statements in one transaction, so either all or none take effect; retries while locked."""
+        with self.db.writer() as conn:
+            self.cache.clear()
+
+            def work():
+                conn.execute("BEGIN")
+                try:
+                    for sql in statements:
+                        conn.execute(sql)
+                    conn.commit()
+                except BaseException:
+                    conn.rollback()
+                    raise
+            with self.metrics.measure("commit", statements[-1].split(None, 1)[0].upper()):
+                retry_busy(work, self.db.write_retries)
+
+    def cached(self, key, compute, conn=None):
+        """Returns compute() through the result cache under key.
+
+        Reads on a connection inside a transaction (e.g. a ReadSnapshot) may
+        see older data than the latest commit, so they bypass the cache.
+        """
+        if conn is not None and conn.in_transaction:
+            return compute()
+        version = self.catalog.data_version()  # Before computing: a commit meanwhile invalidates the value
+        value = self.cache.get(key, version)
+        if value is None:
+            value = compute()
+            self.cache.put(key, value, version)
+        return value
+
+    # --------------------- Concurrency --------------------- #
+    def journal_mode(self):
+        return journal_mode(self.connection)
+
+    def set_journal_mode(self, mode):
+        """Switches the database to journal mode (e.g. "wal" or "delete"); returns the mode now in effect."""
+        if mode.lower() not in JOURNAL_MODES:
+            raise ValueError(f"Journal mode must be one of {', '.join(JOURNAL_MODES)}")
+        with self.db.writer() as conn:
+            return conn.execute(f"PRAGMA journal_mode = {mode}").fetchone()[0].lower()
+
+    def set_busy_timeout(self, milliseconds):
+        self.db.set_busy_timeout(milliseconds)
+
+    def set_write_retries(self, retries):
+        self.db.write_retries = max(0, int(retries))
+
+    def wal_size(self):
+        return wal_size(self.db_path)
+
+    def checkpoint(self, mode="PASSIVE", conn=None):
+        with self.db.writer() as writer:
+            return wal_checkpoint(conn or writer, mode)
+
+    def open_snapshot(self):
+        """Opens a ReadSnapshot for consistent browsing, or returns None unless the database is in WAL mode."""
+        if self.journal_mode() != "wal":
+            return None
+        return ReadSnapshot(self.db)
+
+    # --------------------- Storage --------------------- #
+    def storage(self, on_event=None, task=None, conn=None):
+        """Returns storage_summary() with the sizes of every table and index (see storage_objects) as "objects"."""
+        conn = conn or self.reader
+        with self.metrics.measure("storage") as counts:
+            storage = storage_summary(conn)
+            storage["objects"] = storage_objects(conn, on_event, task)
+            counts["bytes"] = storage["bytes"]
+            return storage
+
+    def _maintain(self, operation, work, conn=None):
+        """Runs work(conn) holding the read-write connection, retrying while the database is locked."""
+        with self.db.writer() as writer, self.metrics.measure("maintenance", operation):
+            return retry_busy(lambda: work(conn or writer), self.db.write_retries)
+
+    def analyze(self, table=None, conn=None):
+        """Gathers fresh query planner statistics for table, or for the whole database."""
+        sql = "ANALYZE" if table is None else f"ANALYZE {quote_ident(table)}"
+        self._maintain("analyze", lambda conn: conn.execute(sql), conn)
+
+    def optimize(self, conn=None):
+        """Runs PRAGMA optimize, which re-analyzes only the tables whose statistics look stale."""
+        # 0x10000 checks every table, not only those this connection has queried (SQLite 3.46+, ignored before)
+        self._maintain("optimize", lambda conn: conn.execute("PRAGMA optimize(0x10002)").fetchall(), conn)
+
+    def incremental_vacuum(self, pages=None, conn=None):
+        return self._maintain("incremental_vacuum", lambda conn: incremental_vacuum(conn, pages), conn)
+
+    def vacuum(self, auto_vacuum=None, conn=None):
+        return self._maintain("vacuum", lambda conn: vacuum(conn, auto_vacuum), conn)
+
+    def vacuum_into(self, target_path, task=None, conn=None):
+        """Writes a compacted copy of the database to target_path (see vacuum_into).
+
+        Without conn the copy is read through a connection of its own, closed
+        afterwards, so the shared reader is never busy for the whole copy.
+        """
+        with self.metrics.measure("vacuum_into", os.path.basename(target_path)) as counts:
+            if conn is not None:
+                vacuum_into(conn, target_path, task=task)
+            else:
+                conn = self.db.open_reader("vacuum")
+                try:
+                    vacuum_into(conn, target_path, task=task)
+                finally:
+                    conn.close()
+            counts["bytes"] = written_bytes(target_path)
+            return target_path
+
+    # --------------------- Schema --------------------- #
+    def tables(self):
+        """Returns the user's tables, without the internal tables of search indexes."""
+        tables = self.catalog.tables()
+        hidden = hidden_index_tables(tables)
+        return [table for table in tables if table not in hidden]
+
+    def create_table(self, table, column_defs):
+        """Creates table from column definitions such as "name TEXT NOT NULL"."""
+        self._write(f"CREATE TABLE {table} ({', '.join(column_defs)})")
+
+    def drop_table(self, table):
+        """Drops table together with its search index, in one transaction."""
+        self._write_all(search_index_drops(table) + [f"DROP TABLE {quote_ident(table)}"])
+
+    def rename_table(self, table, new_name):
+        """Renames table; returns True if its search index was dropped and must be built again.
+
+        The index's triggers name the old table, so it is dropped in the same
+        transaction as the rename: either both happen or neither does.
+        """
+        indexed = self.has_search_index(table)
+        self._write_all(search_index_drops(table) +
+                        [f"ALTER TABLE {quote_ident(table)} RENAME TO {quote_ident(new_name)}"])
+        return indexed
+
+    def describe_table(self, table):
+        """Returns a readable description of table's columns, indexes and foreign keys."""
+        text = f"Schema for table '{table}':\n\n"
+        text += "cid | name | type | notnull | dflt_value | pk\n"
+        text += "-" * 50 + "\n"
+        for col in self.catalog.columns(table):
+            text += " | ".join(str(item) for item in col) + "\n"
+
+        indexes = self.catalog.indexes(table)
+        text += "\nIndexes:\n"
+        for name, unique, origin, columns in indexes:
+            kind = {"pk": "primary key", "u": "unique constraint"}.get(origin, "unique" if unique else "index")
+            text += f"{name} ({kind}): {', '.join(columns)}\n"
+        if not indexes:
+            text += "(none)\n"
+
+        foreign_keys = self.catalog.foreign_keys(table)
+        text += "\nForeign keys:\n"
+        for fk in foreign_keys:
+            text += f"{fk[3]} -> {fk[2]}({fk[4]}) on update {fk[5]}, on delete {fk[6]}\n"
+        if not foreign_keys:
+            text += "(none)\n"
+        return text
+
+    # --------------------- Browsing --------------------- #
+    def page_key(self, table):
+        """Returns the column used for keyset pagination of table, or None to page by OFFSET."""
+        if self.catalog.has_rowid(table):
+            return "rowid"
+        # WITHOUT ROWID table: page on the primary key if it is a single column
+        pk_columns = self.catalog.primary_key(table)
+        return pk_columns[0] if len(pk_columns) == 1 else None
+
+    def page(self, table, page_key, last_key, offset, page_size=PAGE_SIZE, where=None, params=(), conn=None,
+             with_keys=False, order=None):
+        """Fetches one page of table (see fetch_page); reads on conn or the reader connection.
+
+        With with_keys the rows come as (key, row) pairs, key being the
+        row's values of row_key_columns, so edits can address the row.
+        order is an optional (column, descending) sort.
+        """
+        key = ("page", table, page_key, last_key, offset if page_key is None else None, page_size, where,
+               tuple(params), with_keys, order)
+        with self.metrics.measure("fetch", table) as counts:
+            rows, last_key = self.cached(key, lambda: fetch_page(
+                conn or self.reader, table, page_key, last_key, offset, page_size, where, params, self.workload,
+                with_keys and page_key is not None, order), conn)
+            counts["rows"] = len(rows)
+        if with_keys:
+            if page_key is not None:
+                rows = [((row[0],), row[1:]) for row in rows]
+            else:
+                # Composite primary key (WITHOUT ROWID): the key columns are part of the row
+                names = self.catalog.column_names(table)
+                positions = [names.index(col) for col in self.row_key_columns(table)]
+                rows = [(tuple(row[i] for i in positions), row) for row in rows]
+        return rows, last_key
+
+    def sort_needs_temp_btree(self, table, column, descending=False, where=None, params=()):
+        """Tells whether sorting table by column would sort every matching row in a temporary B-tree.
+
+        That happens when no index delivers the rows in that order; the first
+        page then costs a full scan and sort instead of a short index walk.
+        """
+        # A fresh connection: EXPLAIN neither checks for schema changes nor re-plans cached statements,
+        # so a long-lived reader could miss an index created since
+        conn = self.db.open_reader("planner")
+        try:
+            plan = sort_plan(conn, table, self.page_key(table), column, descending, where, params)
+        finally:
+            conn.close()
+        return any("TEMP B-TREE" in detail for _, _, detail in plan)
+
+    def sort_index_statement(self, table, column):
+        """Returns (index_name, CREATE INDEX statement) of an index serving sorts of table by column."""
+        return index_statement(table, [column])
+
+    def count(self, table, where=None, params=(), conn=None):
+        """Counts the rows of table, optionally only those matching where."""
+        where_sql = f" WHERE {where}" if where else ""
+        sql = f"SELECT COUNT(*) FROM {quote_ident(table)}{where_sql}"
+        with self.metrics.measure("count", table):
+            return self.cached(("count", sql, tuple(params)),
+                               lambda: (conn or self.reader).execute(sql, params).fetchone()[0], conn)
+
+    def search_filter(self, table, term):
+        return search_filter(self.catalog, table, term)
+
+    def search_all(self, term, tables=None, hits_per_table=SEARCH_HITS_PER_TABLE, workers=SEARCH_WORKERS,
+                   on_event=None, task=None):
+        """Searches every table (or only tables) for term in parallel; see search_tables."""
+        tables = self.tables() if tables is None else tables
+        jobs = search_jobs(self.catalog, tables, term, self.page_key)
+        with self.metrics.measure("search", f"{len(jobs)} columns") as counts:
+            found = search_tables(self.db, jobs, term, hits_per_table, workers, on_event, task)
+            counts["rows"] = sum(found.values())
+            return found
+
+    def has_search_index(self, table):
+        return search_index_name(table) in self.catalog.tables()
+
+    def create_search_index(self, table, columns=None, conn=None):
+        """Builds the FTS5 search index of table over columns (default: its text columns)."""
+        columns = columns or text_columns(self.catalog.columns(table))
+        if not columns:
+            raise ValueError(f"Table '{table}' has no text columns to index")
+        with self.db.writer() as writer:
+            create_search_index(conn or writer, table, columns)
+
+    def drop_search_index(self, table):
+        with self.db.writer() as conn:
+            drop_search_index(conn, table)
+
+    # --------------------- Row edits --------------------- #
+    def row_key_columns(self, table):
+        """Returns the columns identifying a row of table: rowid, or the primary key of a WITHOUT ROWID table."""
+        return ["rowid"] if self.catalog.has_rowid(table) else self.catalog.primary_key(table)
+
+    def fetch_rows(self, table, keys, conn=None):
+        """Returns {key: row} for the rows of table with the given keys (see row_key_columns)."""
+        key_columns = self.row_key_columns(table)
+        width = len(key_columns)
+        conn = conn or self.reader
+        selected = ", ".join(quote_ident(col) for col in key_columns)
+        found = {}
+        keys = list(dict.fromkeys(keys))
+        # Stay well below SQLite's host parameter limit
+        chunk_size = max(1, 500 // width)
+        with self.metrics.measure("fetch", table) as counts:
+            for start in range(0, len(keys), chunk_size):
+                chunk = keys[start:start + chunk_size]
+                if width == 1:
+                    condition = f"{selected} IN ({', '.join(['?'] * len(chunk))})"
+                else:
+                    row_value = "(" + ", ".join(["?"] * width) + ")"
+                    condition = f"({selected}) IN (VALUES {', '.join([row_value] * len(chunk))})"
+                params = [value for key in chunk for value in key]
+                for row in conn.execute(f"SELECT {selected}, * FROM {quote_ident(table)} WHERE {condition}",
+                                        params):
+                    found[tuple(row[:width])] = row[width:]
+            counts["rows"] = len(found)
+        return found
+
+    def edit_buffer(self, table):
+        return EditBuffer(self, table)
+
+    # --------------------- Bulk operations --------------------- #
+    def keys_filter(self, table, keys):
+        """Returns (where, params) matching the rows of table with the given keys.
+
+        The keys travel as a single JSON parameter, so any number of rows
+        costs one statement and stays clear of SQLite's parameter limit.
+        JSON has no blobs and no infinities, so keys holding those are
+        written into the statement as literals (see sql_literal) instead.
+        """
+        key_columns = self.row_key_columns(table)
+        selected = ", ".join(quote_ident(col) for col in key_columns)
+        if len(key_columns) > 1:
+            selected = f"({selected})"
+        plain, literal = [], []
+        for key in keys:
+            if any(isinstance(value, bytes) or isinstance(value, float) and not math.isfinite(value)
+                   for value in key):
+                literal.append(key)
+            else:
+                plain.append(key)
+        if len(key_columns) == 1:
+            where = f"{selected} IN (SELECT value FROM json_each(?))"
+            values = [key[0] for key in plain]
+        else:
+            extracted = ", ".join(f"json_extract(value, '$[{i}]')" for i in range(len(key_columns)))
+            where = f"{selected} IN (SELECT {extracted} FROM json_each(?))"
+            values = [list(key) for key in plain]
+        if literal:
+            rows = ", ".join("(" + ", ".join(sql_literal(value) for value in key) + ")" for key in literal)
+            where = f"({where} OR {selected} IN (VALUES {rows}))"
+        return where, (json.dumps(values),)
+
+    def bulk_delete(self, table, where=None, params=(), conn=None):
+        """Deletes every row of table matching where in one statement and returns the number deleted."""
+        where_sql = f" WHERE {where}" if where else ""
+        return self._write(f"DELETE FROM {quote_ident(table)}{where_sql}", params, conn)
+
+    def bulk_update(self, table, column, expression, where=None, params=(), conn=None):
+        """Sets column to the SQL expression on every row matching where; returns the number updated.
+
+        expression is SQL evaluated per row, e.g. upper(name) or price * 1.1.
+        """
+        where_sql = f" WHERE {where}" if where else ""
+        return self._write(f"UPDATE {quote_ident(table)} SET {quote_ident(column)} = {expression}{where_sql}",
+                           params, conn)
+
+    # --------------------- Column profiles --------------------- #
+    def cached_column_profiles(self, table):
+        """Returns the exact profiles of table's columns if they were computed since the data last changed."""
+        entry = self._column_profiles.get(table)
+        if entry is not None and entry[0] == self.catalog.data_version():
+            return entry[1]
+        return None
+
+    def column_profiles(self, table, exact=False, task=None, conn=None):
+        """Profiles table's columns: from a random sample, or exactly (then cached until the data changes)."""
+        cached = self.cached_column_profiles(table)
+        if cached is not None:
+            return cached
+        conn = conn or self.reader
+        columns_info = self.catalog.columns(table)
+        if not exact:
+            return sample_column_profiles(conn, table, columns_info, self.catalog.has_rowid(table), task=task)
+        version = self.catalog.data_version()
+        profiles = exact_column_profiles(conn, table, columns_info, task=task)
+        self._column_profiles[table] = (version, profiles)
+        return profiles
+
+    # --------------------- Queries --------------------- #
+    def execute_script(self, statements, max_rows=MAX_RESULT_ROWS, on_event=None, task=None, conn=None):
+        """Runs statements in one transaction, passing each result event to on_event.
+
+        The events are those of iter_script_results. Everything is committed
+        once the last statement finishes; an error or cancellation through
+        task rolls the whole script back. The events of read-only scripts
+        (see cacheable_script) are cached and replayed until the data
+        changes; any other script clears the cache.
+        """
+        with self.db.writer() as writer, self.metrics.measure("query", f"{len(statements)} statement(s)") as counts:
+            def count_rows(event):
+                if event[0] == "rows":
+                    counts["rows"] += len(event[2])
+                if on_event is not None:
+                    on_event(event)
+            self._execute_script(statements, max_rows, count_rows, task, conn or writer)
+
+    def _execute_script(self, statements, max_rows, on_event, task, conn):
+        key = ("script", tuple(statements), max_rows) if cacheable_script(statements) else None
+        if key is None:
+            self.cache.clear()
+            version = events = None
+        else:
+            version = self.catalog.data_version()
+            events = self.cache.get(key, version)
+        if events is not None:
+            for event in events:
+                if task is not None and event[0] == "rows":
+                    task.rows += len(event[2])
+                if on_event is not None:
+                    on_event(event)
+            return
+        events = [] if key is not None else None
+        try:
+            for event in iter_script_results(conn, statements, max_rows, workload=self.workload):
+                if task is not None:
+                    if task.cancelled:
+                        raise TaskCancelled()
+                    if event[0] == "rows":
+                        task.rows += len(event[2])
+                if events is not None:
+                    events.append(event)
+                if on_event is not None:
+                    on_event(event)
+            if conn.in_transaction:
+                conn.commit()
+        except Exception:
+            if conn.in_transaction:
+                conn.rollback()
+            raise
+        if events is not None:
+            self.cache.put(key, events, version)
+
+    def profile(self, statements, on_profile=None, task=None, conn=None):
+        """Profiles each statement (see profile_query) and returns the profiles.
+
+        Every statement runs inside a savepoint that is rolled back, so
+        profiling never changes the database.
+        """
+        with self.db.writer() as writer:
+            conn = conn or writer
+            profiles = []
+            for index, statement in enumerate(statements):
+                if task is not None and task.cancelled:
+                    raise TaskCancelled()
+                result = profile_query(conn, statement, task=task)
+                if task is not None:
+                    task.rows += result["rows"]
+                if on_profile is not None:
+                    on_profile(index, result)
+                profiles.append(result)
+            return profiles
+
+    def advise_indexes(self, entries=None, conn=None):
+        """Proposes indexes for entries of the workload log (default: all of them)."""
+        if entries is None:
+            entries = self.workload.entries()
+        return advise_indexes(conn or self.reader, self.catalog, entries)
+
+    def create_index(self, create_sql, conn=None):
+        self._write(create_sql, conn=conn)
+
+    # --------------------- Comparing databases --------------------- #
+    @contextmanager
+    def comparison_connection(self, other_path, task=None):
+        """Opens a connection to this database with other_path attached as DIFF_ALIAS.
+
+        Everything read in the with block comes from one snapshot of both
+        databases. Cancelling task interrupts the running statement.
+        """
+        conn = self.db.open_reader("compare")
+        try:
+            attach_database(conn, other_path)
+            if task is not None:
+                conn.set_progress_handler(lambda: 1 if task.cancelled else 0, DIFF_OPCODES)
+            conn.execute("BEGIN")
+            try:
+                yield conn
+            except sqlite3.OperationalError:
+                if task is not None and task.cancelled:
+                    raise TaskCancelled()
+                raise
+            finally:
+                conn.rollback()
+        finally:
+            conn.close()
+
+    def compare_database(self, other_path, tables=None, chunk_rows=DIFF_CHUNK_ROWS, max_rows=DIFF_ROWS_KEPT,
+                         on_event=None, task=None):
+        """Compares this database with the one at other_path: schemas, then the data of every comparable table.
+
+        Returns a dict with path, other, schema (see diff_schemas), tables
+        (one diff_table result each) and skipped ((table, reason) pairs).
+        Besides diff_table's progress events, ("table", result) is passed to
+        on_event as each table is done.
+        """
+        with self.metrics.measure("compare", os.path.basename(other_path)) as counts, \
+                self.comparison_connection(other_path, task) as conn:
+            comparison = {"path": self.db_path, "other": other_path, "schema": diff_schemas(conn),
+                          "tables": []}
+            comparable, comparison["skipped"] = comparable_tables(conn, tables=tables)
+            for table, columns, key_columns in comparable:
+                result = diff_table(conn, table, columns, key_columns, chunk_rows=chunk_rows, max_rows=max_rows,
+                                    on_event=on_event, task=task)
+                comparison["tables"].append(result)
+                counts["rows"] += result["rows"]
+                if on_event is not None:
+                    on_event(("table", result))
+            return comparison
+
+    def write_sync_script(self, comparison, file_path, target="main", task=None):
+        """Writes the SQL making this database (target "main") or the other one match the other side."""
+        with self.comparison_connection(comparison["other"], task) as conn:
+            return write_sync_script(conn, comparison, file_path, target=target, task=task)
+
+    # --------------------- Import, export and backup --------------------- #
+    def import_csv(self, file_path, table, task=None, conn=None, **options):
+        """Imports file_path into table on the read-write connection (see import_csv)."""
+        with self.db.writer() as writer, self.metrics.measure("import", table) as counts:
+            counts["rows"] = import_csv(conn or writer, file_path, table, task=task, **options)
+            return counts["rows"]
+
+    def import_csv_files(self, file_paths, table, task=None, conn=None, **options):
+        """Imports several CSV files into table in parallel (see import_csv_files)."""
+        with self.db.writer() as writer, self.metrics.measure("import", table) as counts:
+            results = import_csv_files(conn or writer, file_paths, table, task=task, **options)
+            counts["rows"] = sum(result["rows"] for result in results)
+            return results
+
+    def export_csv(self, sql, file_path, params=(), compress=False, chunk_size=EXPORT_CHUNK_SIZE,
+                   task=None, conn=None):
+        with self.metrics.measure("export", os.path.basename(file_path)) as counts:
+            counts["rows"] = export_csv(conn or self.reader, sql, file_path, params, compress, chunk_size, task)
+            counts["bytes"] = written_bytes(file_path)
+            return counts["rows"]
+
+    def table_export_query(self, table, search=None):
+        """Returns (sql, params) selecting table's rows, or only those matching the search term."""
+        sql, params = f"SELECT * FROM {quote_ident(table)}", ()
+        if search:
+            where, params = self.search_filter(table, search)
+            sql += f" WHERE {where}"
+        return sql, params
+
+    def export_table(self, table, file_path, search=None, compress=False, chunk_size=EXPORT_CHUNK_SIZE,
+                     task=None, conn=None):
+        """Exports table, or only its rows matching the search term, to file_path."""
+        sql, params = self.table_export_query(table, search)
+        return self.export_csv(sql, file_path, params, compress, chunk_size, task, conn)
+
+    def export_columnar(self, sql, directory, params=(), chunk_size=EXPORT_CHUNK_SIZE, task=None, conn=None,
+                        declared_types=None, source=None):
+        """Writes the result of sql as a columnar snapshot in directory (see export_columnar)."""
+        with self.metrics.measure("export", os.path.basename(directory)) as counts:
+            counts["rows"] = export_columnar(conn or self.reader, sql, directory, params, chunk_size, task,
+                                             declared_types, source)
+            counts["bytes"] = written_bytes(directory)
+            return counts["rows"]
+
+    def export_table_columnar(self, table, directory, search=None, chunk_size=EXPORT_CHUNK_SIZE, task=None,
+                              conn=None):
+        """Writes table, or only its rows matching the search term, as a columnar snapshot in directory."""
+        sql, params = self.table_export_query(table, search)
+        declared_types = [col[2] for col in self.catalog.columns(table)]
+        return self.export_columnar(sql, directory, params, chunk_size, task, conn, declared_types, source=table)
+
+    def import_columnar(self, directory, table, create_table=False, chunk_size=IMPORT_CHUNK_SIZE, task=None,
+                        conn=None):
+        """Loads a columnar snapshot into table on the read-write connection (see import_columnar)."""
+        with self.db.writer() as writer, self.metrics.measure("import", table) as counts:
+            counts["rows"] = import_columnar(conn or writer, directory, table, create_table, chunk_size, task)
+            return counts["rows"]
+
+    def backup(self, target_path, pages=BACKUP_PAGES_PER_STEP, pause=BACKUP_STEP_PAUSE, task=None, conn=None):
+        with self.metrics.measure("backup", os.path.basename(target_path)) as counts:
+            backup_to_file(conn or self.reader, target_path, pages, pause, task)
+            counts["bytes"] = written_bytes(target_path)
+
+    def snapshot(self, directory, keep=SNAPSHOTS_TO_KEEP, task=None, conn=None):
+        """Writes a timestamped snapshot into directory, created if missing, and returns the snapshots pruned."""
+        os.makedirs(directory, exist_ok=True)
+        target_path = snapshot_path(directory, self.db_path)
+        self.backup(target_path, task=task, conn=conn)
+        return prune_snapshots(directory, self.db_path, keep)
+
+    def dump(self, file_path, compress=None, workers=DUMP_WORKERS, on_event=None, task=None):
+        """Writes the database as an SQL script (see dump_database); compress defaults to file_path ending in .gz."""
+        compress = file_path.endswith(".gz") if compress is None else compress
+        with self.metrics.measure("dump", os.path.basename(file_path)) as counts:
+            dumped = dump_database(self.db, file_path, compress, workers, on_event=on_event, task=task)
+            counts["rows"] = sum(dumped.values())
+            counts["bytes"] = written_bytes(file_path)
+            return dumped
+
+    def restore(self, file_path, relax_durability=True, task=None, conn=None):
+        """Runs an SQL dump holding the read-write connection (see restore_dump); returns the statements run."""
+        with self.db.writer() as writer, self.metrics.measure("restore", os.path.basename(file_path)):
+            return restore_dump(conn or writer, file_path, relax_durability, task)
+
+
+# --------------------- Command Line --------------------- #
+class ConsoleProgress:
+    """Task object for the command line: reports progress on stderr.
+
+    main() cancels it on Ctrl+C the same way the GUI's Cancel buttons do,
+    so imports and queries are rolled back and partial export files removed.
+    """
+    def __init__(self, label, quiet=False, interval=PROGRESS_INTERVAL):
+        self.label = label
+        self.quiet = quiet
+        self.interval = interval
+        self.cancelled = False
+        self.rows = 0
+        self.started = time.perf_counter()
+        self.reported = 0.0
+
+    @property
+    def elapsed(self):
+        return time.perf_counter() - self.started
+
+    def emit(self, payload):
+        if self.quiet or time.perf_counter() - self.reported < self.interval:
+            return
+        self.reported = time.perf_counter()
+        if isinstance(payload, tuple) and len(payload) == 2 and all(isinstance(v, int) for v in payload):
+            done, total = payload
+            detail = f"{done / total:.0%}" if total else f"{done:,}"
+        elif isinstance(payload, int):
+            detail = f"{payload:,} rows"
+        else:
+            detail = f"{self.rows:,} rows"
+        print(f"{self.label}: {detail} ({self.elapsed:.1f}s)", file=sys.stderr)
+
+    def finish(self, message):
+        if not self.quiet:
+            print(f"{message} in {self.elapsed:.2f}s", file=sys.stderr)
+
+
+def _statements_argument(text):
+    if text == "-":
+        text = sys.stdin.read()
+    statements = split_statements(text)
+    if not statements:
+        raise argparse.ArgumentTypeError("no SQL statements given")
+    return statements
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(prog="db_engine", description="Batch operations on an SQLite database.")
+    parser.add_argument("database", help="path of the SQLite database")
+    parser.add_argument("-q", "--quiet", action="store_true", help="do not report progress on stderr")
+    parser.add_argument("--trace", metavar="JSON", help="write timings and every statement run to this file")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    commands.add_parser("tables", help="list the tables")
+    describe = commands.add_parser("describe", help="show a table's columns, indexes and foreign keys")
+    describe.add_argument("table")
+
+    query = commands.add_parser("query", help="run SQL (use - to read it from stdin); results go to stdout as CSV")
+    query.add_argument("sql", type=_statements_argument)
+    query.add_argument("--max-rows", type=int, default=MAX_RESULT_ROWS, help="rows fetched per statement")
+
+    search = commands.add_parser("search", help="find a value in every table; hits go to stdout as CSV")
+    search.add_argument("term")
+    search.add_argument("--tables", nargs="+", help="search only these tables")
+    search.add_argument("--limit", type=int, default=SEARCH_HITS_PER_TABLE, help="hits reported per table")
+    search.add_argument("--workers", type=int, default=SEARCH_WORKERS, help="tables searched at once")
+
+    profile = commands.add_parser("profile", help="show plan, timings and counters of SQL without changing data")
+    profile.add_argument("sql", type=_statements_argument)
+
+    load = commands.add_parser("import", help="import CSV files into a table (several are parsed in parallel)")
+    load.add_argument("csv_file", nargs="+")
+    load.add_argument("--table", required=True)
+    load.add_argument("--no-header", dest="has_header", action="store_false", help="the first row is data")
+    load.add_argument("--create", dest="create_table", action="store_true", help="create the table from the file")
+    load.add_argument("--coerce", dest="coerce_types", action="store_true", help="store numbers as INTEGER/REAL")
+    load.add_argument("--fast", dest="relax_durability", action="store_true",
+                      help="skip fsyncs and the rollback journal during the load")
+    load.add_argument("--chunk-size", type=int, default=IMPORT_CHUNK_SIZE)
+    load.add_argument("--workers", type=int, help="parsing processes for several files (default: one per core)")
+
+    export = commands.add_parser("export", help="export a table or query to CSV")
+    export.add_argument("csv_file")
+    source = export.add_mutually_exclusive_group(required=True)
+    source.add_argument("--table")
+    source.add_argument("--query")
+    export.add_argument("--search", help="only rows of --table matching this search term")
+    export.add_argument("--gzip", dest="compress", action="store_true")
+    export.add_argument("--chunk-size", type=int, default=EXPORT_CHUNK_SIZE)
+
+    export_columns = commands.add_parser("export-columnar",
+                                         help="write a table or query as NumPy .npy files per column (needs numpy)")
+    export_columns.add_argument("directory")
+    source = export_columns.add_mutually_exclusive_group(required=True)
+    source.add_argument("--table")
+    source.add_argument("--query")
+    export_columns.add_argument("--search", help="only rows of --table matching this search term")
+    export_columns.add_argument("--chunk-size", type=int, default=EXPORT_CHUNK_SIZE)
+
+    import_columns = commands.add_parser("import-columnar", help="load a snapshot written by export-columnar")
+    import_columns.add_argument("directory")
+    import_columns.add_argument("--table", required=True)
+    import_columns.add_argument("--create", dest="create_table", action="store_true",
+                                help="create the table from the snapshot's columns")
+    import_columns.add_argument("--chunk-size", type=int, default=IMPORT_CHUNK_SIZE)
+
+    compare = commands.add_parser("compare", help="list the schema and row differences with another database")
+    compare.add_argument("other", help="path of the other database")
+    compare.add_argument("--tables", nargs="+", help="compare only these tables")
+    compare.add_argument("--chunk-rows", type=int, default=DIFF_CHUNK_ROWS, help="rows hashed together")
+    compare.add_argument("--max-rows", type=int, default=DIFF_ROWS_KEPT, help="differing rows listed per table")
+    compare.add_argument("--sync-script", metavar="SQL", help="also write the SQL syncing the databases")
+    compare.add_argument("--sync-target", choices=("database", "other"), default="database",
+                         help="which database the sync script updates")
+
+    backup = commands.add_parser("backup", help="copy the database online to a file")
+    backup.add_argument("target")
+    backup.add_argument("--pages", type=int, default=BACKUP_PAGES_PER_STEP, help="pages copied per step")
+    backup.add_argument("--pause", type=float, default=BACKUP_STEP_PAUSE, help="seconds between steps")
+
+    dump = commands.add_parser("dump", help="write the database as an SQL script (.gz to compress it)")
+    dump.add_argument("sql_file")
+    dump.add_argument("--workers", type=int, default=DUMP_WORKERS, help="tables dumped at once")
+
+    restore = commands.add_parser("restore", help="load an SQL script or dump into the database (created if missing)")
+    restore.add_argument("sql_file")
+    restore.add_argument("--safe", dest="relax_durability", action="store_false",
+                         help="keep fsyncs and the rollback journal during the load")
+
+    commands.add_parser("storage", help="show the pages, bytes and fill of every table and index, and free pages")
+    analyze = commands.add_parser("analyze", help="gather fresh query planner statistics")
+    analyze.add_argument("--table", help="only this table")
+    commands.add_parser("optimize", help="run PRAGMA optimize (re-analyzes tables with stale statistics)")
+    incremental = commands.add_parser("incremental-vacuum",
+                                      help="release free pages from the file (auto_vacuum incremental only)")
+    incremental.add_argument("--pages", type=int, help="release at most this many (default: all)")
+    vacuum = commands.add_parser("vacuum", help="rebuild the database file in place without free pages")
+    vacuum.add_argument("--auto-vacuum", choices=AUTO_VACUUM_MODES, help="switch auto_vacuum mode first")
+    vacuum_copy = commands.add_parser("vacuum-into", help="write a compacted copy of the database to a file")
+    vacuum_copy.add_argument("target")
+
+    snapshot = commands.add_parser("snapshot", help="write a timestamped backup and prune old ones")
+    snapshot.add_argument("directory")
+    snapshot.add_argument("--keep", type=int, default=SNAPSHOTS_TO_KEEP)
+    return parser
+
+
+def run_command(engine, args, task):
+    """Runs the parsed command line args against engine."""
+    if args.command == "tables":
+        for table in engine.tables():
+            print(table)
+    elif args.command == "describe":
+        print(engine.describe_table(args.table), end="")
+    elif args.command == "query":
+        writer = csv.writer(sys.stdout)
+        queries = set()
+
+        def show(event):
+            if event[0] == "columns":
+                queries.add(event[1])
+                writer.writerow(event[2])
+            elif event[0] == "rows":
+                writer.writerows(event[2])
+            elif event[0] == "done":
+                _, index, count, truncated = event
+                if index in queries:
+                    note = f" (truncated at {count:,})" if truncated else ""
+                    summary = f"{count:,} rows{note}"
+                else:
+                    summary = f"{count:,} rows affected" if count >= 0 else "executed"
+                print(f"statement {index + 1}: {summary}", file=sys.stderr)
+
+        engine.execute_script(args.sql, args.max_rows, on_event=show, task=task)
+    elif args.command == "search":
+        writer = csv.writer(sys.stdout)
+        writer.writerow(["table", "column", "key", "value"])
+
+        def show(event):
+            if event[0] == "hits":
+                writer.writerows((event[1],) + hit for hit in event[2])
+            elif event[0] == "error":
+                print(f"{event[1]}: {event[2]}", file=sys.stderr)
+            else:
+                task.emit(event[1:])
+
+        found = engine.search_all(args.term, args.tables, args.limit, args.workers, on_event=show, task=task)
+        hits = sum(found.values())
+        task.finish(f"{hits:,} hits in {sum(1 for count in found.values() if count)} of {len(found)} tables")
+    elif args.command == "profile":
+        for result in engine.profile(args.sql, task=task):
+            print(format_profile(result))
+    elif args.command == "import":
+        options = dict(has_header=args.has_header, create_table=args.create_table, coerce_types=args.coerce_types,
+                       relax_durability=args.relax_durability, chunk_size=args.chunk_size)
+        if len(args.csv_file) == 1:
+            rows = engine.import_csv(args.csv_file[0], args.table, task=task, **options)
+        else:
+            results = engine.import_csv_files(args.csv_file, args.table, task=task, workers=args.workers, **options)
+            rows = sum(result["rows"] for result in results)
+            for result in results:
+                if result["errors"]:
+                    print(f"{result['path']}: {result['rows']:,} rows, {result['errors']:,} error rows",
+                          file=sys.stderr)
+                    for line, message, fields in result["error_rows"]:
+                        print(f"  line {line}: {message}", file=sys.stderr)
+        task.finish(f"{rows:,} rows imported into {args.table}")
+    elif args.command == "export":
+        if args.table:
+            rows = engine.export_table(args.table, args.csv_file, args.search, args.compress, args.chunk_size, task)
+        else:
+            rows = engine.export_csv(args.query, args.csv_file, (), args.compress, args.chunk_size, task)
+        task.finish(f"{rows:,} rows exported to {args.csv_file}")
+    elif args.command == "export-columnar":
+        if args.table:
+            rows = engine.export_table_columnar(args.table, args.directory, args.search, args.chunk_size, task)
+        else:
+            rows = engine.export_columnar(args.query, args.directory, (), args.chunk_size, task)
+        task.finish(f"{rows:,} rows exported to {args.directory}")
+    elif args.command == "import-columnar":
+        rows = engine.import_columnar(args.directory, args.table, args.create_table, args.chunk_size, task)
+        task.finish(f"{rows:,} rows imported into {args.table}")
+    elif args.command == "compare":
+        comparison = engine.compare_database(args.other, args.tables, args.chunk_rows, args.max_rows,
+                                             on_event=lambda event: task.emit(event[2]) if event[0] == "progress"
+                                             else None, task=task)
+        for kind, name, status, detail in comparison["schema"]:
+            print(f"{kind} {name}: {status}{': ' + detail if detail else ''}")
+        for table, reason in comparison["skipped"]:
+            print(f"table {table}: data not compared ({reason})")
+        for result in comparison["tables"]:
+            print(f"table {result['table']}: {result['rows']:,} rows, {result['inserted']:,} inserted, "
+                  f"{result['deleted']:,} deleted, {result['changed']:,} changed")
+            for kind, key, here, there in result["differences"]:
+                print(f"  {kind} {', '.join(map(repr, key))}: {here if there is None else there}")
+        if args.sync_script:
+            target = "main" if args.sync_target == "database" else DIFF_ALIAS
+            statements = engine.write_sync_script(comparison, args.sync_script, target, task)
+            print(f"{statements:,} statements written to {args.sync_script}", file=sys.stderr)
+        task.finish("Databases compared")
+    elif args.command == "backup":
+        engine.backup(args.target, args.pages, args.pause, task)
+        task.finish(f"Database backed up to {args.target}")
+    elif args.command == "dump":
+        rows = {}
+
+        def report(event):
+            rows[event[1]] = event[2]
+            task.emit(sum(rows.values()))
+
+        dumped = engine.dump(args.sql_file, workers=args.workers, on_event=report, task=task)
+        task.finish(f"{sum(dumped.values()):,} rows of {len(dumped)} tables dumped to {args.sql_file}")
+    elif args.command == "restore":
+        statements = engine.restore(args.sql_file, args.relax_durability, task)
+        task.finish(f"{statements:,} statements restored from {args.sql_file}")
+    elif args.command == "storage":
+        print(format_storage(engine.storage(on_event=task.emit, task=task)))
+    elif args.command == "analyze":
+        engine.analyze(args.table)
+        task.finish("Planner statistics gathered")
+    elif args.command == "optimize":
+        engine.optimize()
+        task.finish("Database optimized")
+    elif args.command == "incremental-vacuum":
+        released = engine.incremental_vacuum(args.pages)
+        task.finish(f"{released:,} free pages released")
+    elif args.command == "vacuum":
+        shrunk = engine.vacuum(args.auto_vacuum)
+        task.finish(f"Database rebuilt, {shrunk / 1024 ** 2:,.1f} MiB smaller")
+    elif args.command == "vacuum-into":
+        engine.vacuum_into(args.target, task)
+        task.finish(f"Compacted copy written to {args.target} ({written_bytes(args.target) / 1024 ** 2:,.1f} MiB)")
+    elif args.command == "snapshot":
+        pruned = engine.snapshot(args.directory, args.keep, task)
+        task.finish(f"Snapshot written, {len(pruned)} old snapshot(s) removed")
+
+
+def main(argv=None):
+    args = build_parser().parse_args(argv)
+    if not os.path.exists(args.database) and args.command != "restore":
+        print(f"db_engine: no such database: {args.database}", file=sys.stderr)
+        return 2
+    engine = DatabaseEngine(args.database)
+    engine.set_tracing(bool(args.trace))
+    task = ConsoleProgress(args.command, quiet=args.quiet)
+
+    def interrupt(signum, frame):
+        # Cancel like the GUI does, so the operation cleans up after itself
+        task.cancelled = True
+        engine.connection.interrupt()
+
+    previous_handler = signal.signal(signal.SIGINT, interrupt)
+    try:
+        run_command(engine, args, task)
+    except (sqlite3.Error, OSError, ValueError, TaskCancelled) as e:
+        if task.cancelled:
+            print("db_engine: cancelled", file=sys.stderr)
+            return 130
+        print(f"db_engine: {e}", file=sys.stderr)
+        return 1
+    finally:
+        signal.signal(signal.SIGINT, previous_handler)
+        if args.trace:
+            engine.metrics.dump(args.trace)
+        engine.close()
+    if task.cancelled:
+        print("db_engine: cancelled", file=sys.stderr)
+        return 130
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
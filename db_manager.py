@@ -1,19 +1,209 @@
 import tkinter as tk
 from tkinter import ttk, messagebox, filedialog, simpledialog, scrolledtext
-import sqlite3
 import os
-import csv
-import shutil
+import threading
+import queue
+import time
+
+from db_engine import (
+    DatabaseEngine, TaskCancelled, EditConflict, PAGE_SIZE, FETCH_BATCH_SIZE, MAX_RESULT_ROWS, IMPORT_CHUNK_SIZE,
+    EXPORT_CHUNK_SIZE, SNAPSHOTS_TO_KEEP, DEFAULT_CACHE_BUDGET, DEFAULT_BUSY_TIMEOUT_MS, DEFAULT_WRITE_RETRIES, CHECKPOINT_MODES,
+    SEARCH_HITS_PER_TABLE, DIFF_ALIAS, AUTO_VACUUM_MODES, split_statements, format_profile, text_columns,
+    progress_handler,
+)
+
+PREFETCH_THRESHOLD = 0.9 # Fetch the next page once the scrollbar passes this point
+
+# Background execution (see BackgroundExecutor)
+PROGRESS_OPCODES = 1000      # SQLite VM instructions between cancellation checks
+POLL_INTERVAL_MS = 50        # How often the UI thread drains worker results
+
+SNAPSHOT_INTERVAL_MINUTES = 60  # Default period of scheduled backups
+WAL_REFRESH_MS = 2000        # How often the Concurrency Settings window refreshes the WAL size
+METRICS_REFRESH_MS = 1000    # How often the Metrics window refreshes its timings
+SEARCH_DEBOUNCE_MS = 300     # Wait this long after the last keystroke before searching
+SORT_WARNING_ROWS = 100000   # Offer an index before sorting at least this many rows without one
+
+
+class BackgroundTask:
+    """A unit of work running on a worker thread of a BackgroundExecutor.
+
+    The work callable receives the task and may use task.conn (when the task
+    was submitted with a connection), task.stream() to fetch results in
+    batches and task.emit() to send data back to the UI thread.
+    """
+
+    def __init__(self, executor, work, conn, db, writer, on_batch, on_done, on_error):
+        self.executor = executor
+        self.work = work
+        self.conn = conn
+        self.db = db
+        self.writer = writer
+        self.on_batch = on_batch
+        self.on_done = on_done
+        self.on_error = on_error
+        self.description = None
+        self.rows = 0
+        self.started = time.perf_counter()
+        self.finished = None
+        self._cancel_event = threading.Event()
+
+    @property
+    def cancelled(self):
+        return self._cancel_event.is_set()
+
+    @property
+    def running(self):
+        return self.finished is None
+
+    @property
+    def elapsed(self):
+        return (self.finished or time.perf_counter()) - self.started
+
+    def cancel(self):
+        """Requests cancellation and interrupts any statement running on the task's connection."""
+        self._cancel_event.set()
+        if self.conn is not None and self.running:
+            self.conn.interrupt()
+
+    def emit(self, batch):
+        """Sends a batch of data to the on_batch callback on the UI thread."""
+        self.executor.results.put((self, "batch", batch))
+
+    def stream(self, cursor, batch_size=FETCH_BATCH_SIZE):
+        """Yields batches of rows from cursor until it is exhausted or the task is cancelled."""
+        self.description = cursor.description
+        while not self.cancelled:
+            batch = cursor.fetchmany(batch_size)
+            if not batch:
+                return
+            self.rows += len(batch)
+            yield batch
+
+    def _check_cancelled(self):
+        # SQLite progress handler: a non-zero return aborts the running statement
+        return 1 if self.cancelled else 0
+
+
+class BackgroundExecutor:
+    """Runs database work on worker threads and delivers results on the Tk thread.
+
+    Workers never touch Tk widgets; they put results on a queue that the UI
+    thread drains every POLL_INTERVAL_MS and dispatches to the task's
+    callbacks. Tasks can be cancelled: a progress handler installed on the
+    task's connection aborts the running statement once cancel() is called.
+    """
+
+    def __init__(self, root, poll_interval=POLL_INTERVAL_MS):
+        self.root = root
+        self.poll_interval = poll_interval
+        self.results = queue.Queue()
+        self.active = set()
+        self._polling = False
+
+    def submit(self, work, conn=None, db=None, writer=None, on_batch=None, on_done=None, on_error=None):
+        """Runs work(task) on a new worker thread and returns the task.
+
+        Pass conn to run on a specific connection, db (a DatabaseEngine or
+        ConnectionManager) to borrow one of its pooled read-only connections,
+        or writer (a DatabaseEngine) for anything that writes: the task then
+        waits for and holds its read-write connection until the work is done,
+        so no other write can interleave with it (see ConnectionManager.writer).
+        """
+        task = BackgroundTask(self, work, conn, db, writer, on_batch, on_done, on_error)
+        self.active.add(task)
+        threading.Thread(target=self._run, args=(task,), daemon=True).start()
+        if not self._polling:
+            self._polling = True
+            self.root.after(self.poll_interval, self._poll)
+        return task
+
+    def _run(self, task):
+        try:
+            if task.db is not None:
+                with task.db.pooled_reader() as conn:
+                    task.conn = conn
+                    result = self._execute(task)
+                task.conn = None
+            elif task.writer is not None:
+                # Connected only once the writer is ours: cancelling while waiting must not interrupt its holder
+                with task.writer.writer() as conn:
+                    task.conn = conn
+                    result = self._execute(task)
+                task.conn = None
+            else:
+                result = self._execute(task)
+            outcome = ("error", TaskCancelled()) if task.cancelled else ("done", result)
+        except Exception as e:
+            outcome = ("error", TaskCancelled() if task.cancelled else e)
+        task.finished = time.perf_counter()
+        self.results.put((task,) + outcome)
+
+    def _execute(self, task):
+        if task.cancelled:
+            raise TaskCancelled()
+        if task.conn is None:
+            return task.work(task)
+        with progress_handler(task.conn, task._check_cancelled, PROGRESS_OPCODES):
+            return task.work(task)
+
+    def _poll(self):
+        while True:
+            try:
+                task, kind, payload = self.results.get_nowait()
+            except queue.Empty:
+                break
+            if kind == "batch":
+                callback = task.on_batch
+            else:
+                self.active.discard(task)
+                callback = task.on_done if kind == "done" else task.on_error
+            if callback is not None:
+                callback(payload)
+            elif kind == "error" and not isinstance(payload, TaskCancelled):
+                messagebox.showerror("Error", f"Background task failed: {str(payload)}")
+        if self.active:
+            self.root.after(self.poll_interval, self._poll)
+        else:
+            self._polling = False
+
 
 class DataManager:
     def __init__(self, root):
         self.root = root
         self.root.title("SQLite Database Manager")
         self.current_db = None
+        self.engine = None            # DatabaseEngine for current_db
         self.current_table = None
         self.sidebar = None           # For table context sidebar
         self.data_context_menu = None # Context menu for data rows
 
+        # Paged data view state (see load_table_data)
+        self.page_size = PAGE_SIZE
+        self.page_key = None          # "rowid", a single primary key column, or None for OFFSET paging
+        self.last_key = None          # Key of the last fetched row (keyset pagination)
+        self.loaded_count = 0         # Rows fetched so far for the current table (OFFSET of the next page)
+        self.row_keys = {}            # data_tree item -> row key (see DatabaseEngine.row_key_columns); None for staged inserts
+        self.table_columns = []       # Column names of the current table
+        self.columns_info = []        # PRAGMA table_info rows of the current table
+        self.search_term = ""         # Search term the data view was last loaded with
+        self.search_filter = None     # (where_sql, params) of the active search, see apply_search
+        self.search_after_id = None   # Pending debounced search
+        self.sort = None              # (column, descending) the data view is ordered by, or None
+        self.has_more_rows = False
+        self.loading_page = False
+        self.total_rows = None
+        self.data_generation = 0      # Bumped on every table load to discard stale background results
+        self.page_task = None
+        self.count_task = None
+        self.edits = None             # EditBuffer of the current table (see add_data, update_data, delete_data)
+        self.commit_task = None
+        self.executor = BackgroundExecutor(root)
+        self.backup_schedule = None   # Settings and timer of scheduled backups (see scheduled_backup_dialog)
+        self.concurrency = {}         # Database path -> concurrency profile (see concurrency_dialog)
+        self.cache_budget = DEFAULT_CACHE_BUDGET  # Bytes of each database's result cache (see cache_dialog)
+        self.read_snapshot = None     # ReadSnapshot the data view is browsing through, if any
+
         # Create menu bar
         self.menu_bar = tk.Menu(root)
         
@@ -24,11 +214,26 @@ class DataManager:
         self.file_menu.add_separator()
         self.file_menu.add_command(label="Run Query", command=self.run_query_window)
         self.file_menu.add_command(label="Backup Database", command=self.backup_database)
+        self.file_menu.add_command(label="Scheduled Backups", command=self.scheduled_backup_dialog)
+        self.file_menu.add_command(label="Dump Database (SQL)", command=self.dump_database)
+        self.file_menu.add_command(label="Restore SQL Dump", command=self.restore_dump)
         self.file_menu.add_command(label="Import CSV", command=self.import_csv_to_table)
+        self.file_menu.add_command(label="Import Columnar Snapshot", command=self.import_columnar_dialog)
         self.file_menu.add_separator()
         self.file_menu.add_command(label="Exit", command=root.quit)
         self.menu_bar.add_cascade(label="File", menu=self.file_menu)
         
+        # Tools Menu
+        self.tools_menu = tk.Menu(self.menu_bar, tearoff=0)
+        self.tools_menu.add_command(label="Index Advisor", command=self.index_advisor_window)
+        self.tools_menu.add_command(label="Column Profile", command=lambda: self.column_profile_window(self.current_table))
+        self.tools_menu.add_command(label="Concurrency Settings", command=self.concurrency_dialog)
+        self.tools_menu.add_command(label="Result Cache", command=self.cache_dialog)
+        self.tools_menu.add_command(label="Metrics", command=self.metrics_window)
+        self.tools_menu.add_command(label="Compare Databases", command=self.compare_databases_window)
+        self.tools_menu.add_command(label="Storage", command=self.storage_window)
+        self.menu_bar.add_cascade(label="Tools", menu=self.tools_menu)
+        
         # Tutorial Menu
         self.tutorial_menu = tk.Menu(self.menu_bar, tearoff=0)
         self.tutorial_menu.add_command(label="Show Tutorial", command=self.show_tutorial)
@@ -81,12 +286,27 @@ class DataManager:
         self.search_entry = ttk.Entry(search_frame, textvariable=self.search_var)
         self.search_entry.pack(side=tk.LEFT, fill=tk.X, expand=True, padx=5)
         self.search_entry.bind("<KeyRelease>", self.filter_data)
+        self.search_index_btn = ttk.Button(search_frame, text="Build Search Index", command=self.toggle_search_index)
+        self.search_index_btn.pack(side=tk.LEFT, padx=5)
+        ttk.Button(search_frame, text="Search All Tables", command=self.search_all_dialog).pack(side=tk.LEFT, padx=5)
 
-        # Data Treeview
-        self.data_tree = ttk.Treeview(self.data_frame)
-        self.data_tree.pack(fill=tk.BOTH, expand=True)
+        # Data Treeview (paged: rows are fetched as the user scrolls)
+        tree_frame = ttk.Frame(self.data_frame)
+        tree_frame.pack(fill=tk.BOTH, expand=True)
+        self.data_tree = ttk.Treeview(tree_frame)
+        self.data_scroll = ttk.Scrollbar(tree_frame, orient=tk.VERTICAL, command=self.data_tree.yview)
+        self.data_tree.configure(yscrollcommand=self.on_data_scroll)
+        self.data_scroll.pack(side=tk.RIGHT, fill=tk.Y)
+        self.data_tree.pack(side=tk.LEFT, fill=tk.BOTH, expand=True)
+        self.row_count_var = tk.StringVar(value="")
+        ttk.Label(self.data_frame, textvariable=self.row_count_var, anchor="e").pack(fill=tk.X, padx=5)
         # Bind right-click for data context menu (older Toplevel menu style)
         self.data_tree.bind("<Button-3>", self.show_data_context_menu)
+        self.data_tree.bind("<Control-z>", lambda event: self.undo_edit())
+        # Staged (uncommitted) edits are highlighted until committed or rolled back
+        self.data_tree.tag_configure("staged_insert", background="#dff0d8")
+        self.data_tree.tag_configure("staged_update", background="#fcf8e3")
+        self.data_tree.tag_configure("staged_delete", background="#f2dede", foreground="#999999")
 
         # Data Controls (Add, Edit, Delete, Refresh, Export buttons)
         self.data_controls = ttk.Frame(self.data_frame)
@@ -99,9 +319,24 @@ class DataManager:
         self.delete_data_btn.pack(side=tk.LEFT, padx=2)
         self.refresh_data_btn = ttk.Button(self.data_controls, text="Refresh Data", command=lambda: self.load_table_data(None))
         self.refresh_data_btn.pack(side=tk.LEFT, padx=2)
-        self.export_data_btn = ttk.Button(self.data_controls, text="Export Table to CSV", command=self.export_table_csv)
+        self.bulk_edit_btn = ttk.Button(self.data_controls, text="Bulk Edit", command=self.bulk_edit_dialog)
+        self.bulk_edit_btn.pack(side=tk.LEFT, padx=2)
+        self.export_data_btn = ttk.Button(self.data_controls, text="Export to CSV", command=self.export_table_csv)
         self.export_data_btn.pack(side=tk.LEFT, padx=2)
 
+        # Edit Controls (stage edits and commit them together)
+        self.edit_controls = ttk.Frame(self.data_frame)
+        self.edit_controls.pack(pady=(0, 5))
+        self.stage_var = tk.BooleanVar(value=False)
+        ttk.Checkbutton(self.edit_controls, text="Stage edits", variable=self.stage_var,
+                        command=self.toggle_staging).pack(side=tk.LEFT, padx=2)
+        self.undo_btn = ttk.Button(self.edit_controls, text="Undo", command=self.undo_edit, state="disabled")
+        self.undo_btn.pack(side=tk.LEFT, padx=2)
+        self.commit_btn = ttk.Button(self.edit_controls, text="Commit", command=self.commit_edits, state="disabled")
+        self.commit_btn.pack(side=tk.LEFT, padx=2)
+        self.rollback_btn = ttk.Button(self.edit_controls, text="Rollback", command=self.rollback_edits, state="disabled")
+        self.rollback_btn.pack(side=tk.LEFT, padx=2)
+
         # Additional friendly feature: Status Bar
         self.status_var = tk.StringVar(value="Ready")
         self.status_bar = ttk.Label(self.main_frame, textvariable=self.status_var, relief=tk.SUNKEN, anchor="w")
@@ -117,10 +352,7 @@ class DataManager:
         file_path = filedialog.asksaveasfilename(defaultextension=".db", filetypes=[("SQLite Database", "*.db")])
         if file_path:
             try:
-                open(file_path, 'w').close()
-                self.current_db = file_path
-                self.db_path_label.config(text=file_path)
-                self.load_tables()
+                self.set_database(file_path, create=True)
                 messagebox.showinfo("Success", "New database created successfully")
                 self.set_status("New database created successfully")
             except Exception as e:
@@ -129,11 +361,26 @@ class DataManager:
     def open_database(self):
         file_path = filedialog.askopenfilename(filetypes=[("SQLite Database", "*.db")])
         if file_path:
-            self.current_db = file_path
-            self.db_path_label.config(text=file_path)
-            self.load_tables()
+            self.set_database(file_path)
             self.set_status("Database opened")
 
+    def set_database(self, file_path, create=False):
+        """Makes file_path the current database, closing the previous one's connections."""
+        previous = self.engine
+        # Its staged edits are committed in the background; close it once they are
+        self.resolve_staged_edits(then=previous.close if previous is not None else None)
+        self.edits = None
+        self.close_read_snapshot()
+        self.stop_scheduled_backups()
+        self.current_db = file_path
+        profile = self.concurrency_profile(file_path)
+        options = dict(busy_timeout=profile["busy_timeout"], write_retries=profile["write_retries"],
+                       cache_budget=self.cache_budget, foreground=threading.current_thread())
+        self.engine = DatabaseEngine.create(file_path, **options) if create else DatabaseEngine(file_path, **options)
+        self.current_table = None
+        self.db_path_label.config(text=file_path)
+        self.load_tables()
+
     def backup_database(self):
         if not self.current_db:
             messagebox.showwarning("Warning", "No database to backup")
@@ -141,49 +388,483 @@ class DataManager:
         backup_path = filedialog.asksaveasfilename(defaultextension=".db", filetypes=[("SQLite Database", "*.db")],
                                                    title="Backup Database As")
         if backup_path:
-            try:
-                shutil.copy(self.current_db, backup_path)
-                messagebox.showinfo("Success", f"Database backed up to {backup_path}")
+            if os.path.abspath(backup_path) == os.path.abspath(self.current_db):
+                messagebox.showwarning("Warning", "Please choose a different file for the backup")
+                return
+            dialog = tk.Toplevel(self.root)
+            dialog.title("Backup Database")
+            ttk.Label(dialog, text=f"Backing up to {backup_path}").pack(padx=10, pady=5)
+            progress = ttk.Progressbar(dialog, maximum=1.0, length=350)
+            progress.pack(padx=10, pady=5)
+            progress_var = tk.StringVar(value="")
+            ttk.Label(dialog, textvariable=progress_var).pack(padx=10)
+
+            def show_progress(position):
+                copied, total = position
+                if dialog.winfo_exists():
+                    progress["value"] = copied / total if total else 1.0
+                    progress_var.set(f"{copied:,} of {total:,} pages copied")
+
+            def done(path):
+                if dialog.winfo_exists():
+                    dialog.destroy()
+                messagebox.showinfo("Success", f"Database backed up to {path}")
                 self.set_status("Database backed up")
+
+            def failed(error):
+                if dialog.winfo_exists():
+                    dialog.destroy()
+                if isinstance(error, TaskCancelled):
+                    self.set_status("Backup cancelled")
+                else:
+                    messagebox.showerror("Error", f"Failed to backup database: {str(error)}")
+
+            task = self.executor.submit(lambda task: self.engine.backup(backup_path, task=task, conn=task.conn),
+                                        db=self.engine, on_batch=show_progress, on_done=done, on_error=failed)
+            ttk.Button(dialog, text="Cancel", command=task.cancel).pack(pady=5)
+            dialog.protocol("WM_DELETE_WINDOW", task.cancel)
+
+    def scheduled_backup_dialog(self):
+        """Configures periodic snapshots of the current database, keeping the newest N."""
+        if not self.current_db:
+            messagebox.showwarning("Warning", "No database to backup")
+            return
+        dialog = tk.Toplevel(self.root)
+        dialog.title("Scheduled Backups")
+        schedule = self.backup_schedule or {}
+        directory_var = tk.StringVar(value=schedule.get("directory", os.path.dirname(os.path.abspath(self.current_db))))
+        interval_var = tk.IntVar(value=schedule.get("interval", SNAPSHOT_INTERVAL_MINUTES))
+        keep_var = tk.IntVar(value=schedule.get("keep", SNAPSHOTS_TO_KEEP))
+
+        ttk.Label(dialog, text="Snapshot folder:").grid(row=0, column=0, sticky="w", padx=5, pady=2)
+        ttk.Entry(dialog, textvariable=directory_var, width=40).grid(row=0, column=1, padx=5, pady=2)
+        ttk.Button(dialog, text="Browse...", command=lambda: directory_var.set(
+            filedialog.askdirectory(parent=dialog) or directory_var.get())).grid(row=0, column=2, padx=5)
+        ttk.Label(dialog, text="Every (minutes):").grid(row=1, column=0, sticky="w", padx=5, pady=2)
+        ttk.Spinbox(dialog, from_=1, to=10080, textvariable=interval_var, width=8).grid(row=1, column=1, sticky="w", padx=5)
+        ttk.Label(dialog, text="Snapshots to keep:").grid(row=2, column=0, sticky="w", padx=5, pady=2)
+        ttk.Spinbox(dialog, from_=1, to=1000, textvariable=keep_var, width=8).grid(row=2, column=1, sticky="w", padx=5)
+
+        def start():
+            try:
+                interval, keep = int(interval_var.get()), int(keep_var.get())
+            except (tk.TclError, ValueError):
+                messagebox.showwarning("Warning", "Interval and snapshot count must be numbers", parent=dialog)
+                return
+            directory = directory_var.get().strip()
+            if not os.path.isdir(directory):
+                messagebox.showwarning("Warning", "Please choose an existing folder", parent=dialog)
+                return
+            self.stop_scheduled_backups()
+            self.backup_schedule = {"directory": directory, "interval": max(1, interval), "keep": max(1, keep),
+                                    "engine": self.engine, "timer": None}
+            self.run_scheduled_backup()
+            dialog.destroy()
+
+        def stop():
+            self.stop_scheduled_backups()
+            self.set_status("Scheduled backups stopped")
+            dialog.destroy()
+
+        buttons = ttk.Frame(dialog)
+        buttons.grid(row=3, column=0, columnspan=3, pady=5)
+        ttk.Button(buttons, text="Start", command=start).pack(side=tk.LEFT, padx=2)
+        ttk.Button(buttons, text="Stop", command=stop).pack(side=tk.LEFT, padx=2)
+
+    def run_scheduled_backup(self):
+        """Takes one snapshot in the background, prunes old ones and schedules the next run."""
+        schedule = self.backup_schedule
+        engine = schedule and schedule["engine"]
+        if engine is None or engine is not self.engine:
+            return
+
+        def work(task):
+            return engine.snapshot(schedule["directory"], schedule["keep"], task=task, conn=task.conn)
+
+        def show_progress(position):
+            copied, total = position
+            self.status_var.set(f"Snapshot in progress: {copied:,} of {total:,} pages")
+
+        def done(removed):
+            self.set_status(f"Snapshot saved to {schedule['directory']}"
+                            + (f", {len(removed)} old snapshot(s) removed" if removed else ""))
+
+        def failed(error):
+            self.set_status(f"Scheduled backup failed: {str(error)}")
+
+        self.executor.submit(work, db=engine, on_batch=show_progress, on_done=done, on_error=failed)
+        schedule["timer"] = self.root.after(schedule["interval"] * 60 * 1000, self.run_scheduled_backup)
+
+    def stop_scheduled_backups(self):
+        if self.backup_schedule is not None and self.backup_schedule["timer"] is not None:
+            self.root.after_cancel(self.backup_schedule["timer"])
+        self.backup_schedule = None
+
+    def dump_database(self):
+        """Writes the database as an SQL script (gzip-compressed for .gz) in the background."""
+        if not self.current_db:
+            messagebox.showwarning("Warning", "No database to dump")
+            return
+        dump_path = filedialog.asksaveasfilename(defaultextension=".sql.gz", title="Dump Database As",
+                                                 filetypes=[("Compressed SQL", "*.sql.gz"), ("SQL Script", "*.sql")])
+        if not dump_path:
+            return
+        dialog = tk.Toplevel(self.root)
+        dialog.title("Dump Database")
+        ttk.Label(dialog, text=f"Dumping to {dump_path}").pack(padx=10, pady=5)
+        progress_var = tk.StringVar(value="Starting...")
+        ttk.Label(dialog, textvariable=progress_var).pack(padx=10)
+        rows, finished = {}, set()
+
+        def show_progress(event):
+            kind, table, count = event
+            rows[table] = count
+            if kind == "table":
+                finished.add(table)
+            if dialog.winfo_exists():
+                progress_var.set(f"{sum(rows.values()):,} rows, {len(finished)} tables dumped")
+
+        def done(dumped):
+            if dialog.winfo_exists():
+                dialog.destroy()
+            messagebox.showinfo("Success", f"{sum(dumped.values()):,} rows of {len(dumped)} tables "
+                                           f"dumped to {dump_path} in {task.elapsed:.1f}s")
+            self.set_status("Database dumped")
+
+        def failed(error):
+            if dialog.winfo_exists():
+                dialog.destroy()
+            if isinstance(error, TaskCancelled):
+                self.set_status("Dump cancelled")
+            else:
+                messagebox.showerror("Error", f"Failed to dump database: {str(error)}")
+
+        task = self.executor.submit(lambda task: self.engine.dump(dump_path, on_event=task.emit, task=task),
+                                    on_batch=show_progress, on_done=done, on_error=failed)
+        ttk.Button(dialog, text="Cancel", command=task.cancel).pack(pady=5)
+        dialog.protocol("WM_DELETE_WINDOW", task.cancel)
+
+    def restore_dump(self):
+        """Loads an SQL dump into a new database file and opens it."""
+        dump_path = filedialog.askopenfilename(title="Select SQL Dump",
+                                               filetypes=[("SQL Dumps", "*.sql *.sql.gz"), ("All Files", "*.*")])
+        if not dump_path:
+            return
+        db_path = filedialog.asksaveasfilename(defaultextension=".db", filetypes=[("SQLite Database", "*.db")],
+                                               title="Restore Into New Database")
+        if not db_path:
+            return
+        if os.path.exists(db_path):
+            messagebox.showwarning("Warning", "Please choose a new file to restore into")
+            return
+        try:
+            engine = DatabaseEngine.create(db_path)
+        except Exception as e:
+            messagebox.showerror("Error", f"Failed to create database: {str(e)}")
+            return
+        dialog = tk.Toplevel(self.root)
+        dialog.title("Restore SQL Dump")
+        ttk.Label(dialog, text=f"Restoring {os.path.basename(dump_path)} into {db_path}").pack(padx=10, pady=5)
+        progress = ttk.Progressbar(dialog, maximum=1.0, length=350)
+        progress.pack(padx=10, pady=5)
+
+        def show_progress(position):
+            read, total = position
+            if dialog.winfo_exists():
+                progress["value"] = read / total if total else 1.0
+
+        def discard():
+            engine.close()
+            for suffix in ("", "-wal", "-shm", "-journal"):
+                if os.path.exists(db_path + suffix):
+                    os.remove(db_path + suffix)
+
+        def done(statements):
+            if dialog.winfo_exists():
+                dialog.destroy()
+            engine.close()
+            try:
+                self.set_database(db_path)
             except Exception as e:
-                messagebox.showerror("Error", f"Failed to backup database: {str(e)}")
+                messagebox.showerror("Error", f"Failed to open restored database: {str(e)}")
+                return
+            messagebox.showinfo("Success", f"{statements:,} statements restored in {task.elapsed:.1f}s")
+            self.set_status("Dump restored")
+
+        def failed(error):
+            if dialog.winfo_exists():
+                dialog.destroy()
+            discard()
+            if isinstance(error, TaskCancelled):
+                self.set_status("Restore cancelled")
+            else:
+                messagebox.showerror("Error", f"Failed to restore dump: {str(error)}")
+
+        task = self.executor.submit(lambda task: engine.restore(dump_path, task=task, conn=task.conn),
+                                    writer=engine, on_batch=show_progress, on_done=done, on_error=failed)
+        ttk.Button(dialog, text="Cancel", command=task.cancel).pack(pady=5)
+        dialog.protocol("WM_DELETE_WINDOW", task.cancel)
 
     def import_csv_to_table(self):
-        if not self.current_table:
-            messagebox.showwarning("Warning", "Please select a table to import data into")
+        if not self.current_db:
+            messagebox.showwarning("Warning", "Please open a database first")
             return
-        file_path = filedialog.askopenfilename(filetypes=[("CSV Files", "*.csv")],
-                                               title="Select CSV File")
-        if file_path:
+        file_paths = filedialog.askopenfilenames(filetypes=[("CSV Files", "*.csv")],
+                                                 title="Select CSV File(s)")
+        if file_paths:
+            self.import_csv_dialog(list(file_paths))
+
+    def import_csv_dialog(self, file_paths):
+        """Shows import options for file_paths and runs the import in the background with progress.
+
+        Several files are parsed in parallel by worker processes and loaded
+        together in one transaction (see DatabaseEngine.import_csv_files),
+        with progress and error rows shown per file.
+        """
+        multiple = len(file_paths) > 1
+        dialog = tk.Toplevel(self.root)
+        dialog.title(f"Import {len(file_paths)} files" if multiple else f"Import {os.path.basename(file_paths[0])}")
+
+        tables = [self.tables_tree.item(item, "text") for item in self.tables_tree.get_children()]
+        default_table = self.current_table or os.path.splitext(os.path.basename(file_paths[0]))[0]
+        table_var = tk.StringVar(value=default_table)
+        header_var = tk.BooleanVar(value=True)
+        create_var = tk.BooleanVar(value=True)
+        coerce_var = tk.BooleanVar(value=False)
+        fast_var = tk.BooleanVar(value=True)
+        chunk_var = tk.IntVar(value=IMPORT_CHUNK_SIZE)
+        workers_var = tk.IntVar(value=min(os.cpu_count() or 1, len(file_paths)))
+
+        ttk.Label(dialog, text="Target table:").grid(row=0, column=0, sticky="w", padx=5, pady=2)
+        ttk.Combobox(dialog, textvariable=table_var, values=tables).grid(row=0, column=1, sticky="ew", padx=5, pady=2)
+        ttk.Checkbutton(dialog, text="First row is a header", variable=header_var).grid(
+            row=1, column=0, columnspan=2, sticky="w", padx=5)
+        ttk.Checkbutton(dialog, text="Create the table from inferred column types if it does not exist",
+                        variable=create_var).grid(row=2, column=0, columnspan=2, sticky="w", padx=5)
+        ttk.Checkbutton(dialog, text="Convert values to the column types", variable=coerce_var).grid(
+            row=3, column=0, columnspan=2, sticky="w", padx=5)
+        ttk.Checkbutton(dialog, text="Fast load (relaxed synchronous/journal during the import)",
+                        variable=fast_var).grid(row=4, column=0, columnspan=2, sticky="w", padx=5)
+        ttk.Label(dialog, text="Rows per batch:").grid(row=5, column=0, sticky="w", padx=5, pady=2)
+        ttk.Spinbox(dialog, from_=100, to=1000000, increment=1000, textvariable=chunk_var, width=10).grid(
+            row=5, column=1, sticky="w", padx=5, pady=2)
+        file_items = {}
+        total_bytes = sum(os.path.getsize(path) for path in file_paths)
+        if multiple:
+            ttk.Label(dialog, text="Parsing processes:").grid(row=6, column=0, sticky="w", padx=5, pady=2)
+            ttk.Spinbox(dialog, from_=1, to=max(64, os.cpu_count() or 1), textvariable=workers_var, width=10).grid(
+                row=6, column=1, sticky="w", padx=5, pady=2)
+            files_frame = ttk.Frame(dialog, height=200)
+            files_frame.grid(row=7, column=0, columnspan=2, sticky="nsew", padx=5, pady=2)
+            files_grid = self.make_result_grid(files_frame, ["File", "Progress", "Rows", "Errors"])
+            files_grid.column("c0", width=250)
+            for index, path in enumerate(file_paths):
+                file_items[index] = files_grid.insert("", tk.END, values=(os.path.basename(path), "queued", "", ""))
+
+        progress = ttk.Progressbar(dialog, maximum=1.0, length=350)
+        progress.grid(row=8, column=0, columnspan=2, sticky="ew", padx=5, pady=5)
+        rate_var = tk.StringVar(value="")
+        ttk.Label(dialog, textvariable=rate_var).grid(row=9, column=0, columnspan=2, sticky="w", padx=5)
+        current = {"task": None, "files": {}}
+
+        def show_progress(position):
+            task = current["task"]
+            if not dialog.winfo_exists() or task is None:
+                return
+            if isinstance(position, dict):
+                # One file of a multi-file import
+                current["files"][position["index"]] = position
+                done_bytes = sum(result["bytes"] for result in current["files"].values())
+                progress["value"] = done_bytes / total_bytes if total_bytes else 1.0
+                share = position["bytes"] / position["total_bytes"] if position["total_bytes"] else 1.0
+                files_grid.item(file_items[position["index"]], values=(
+                    os.path.basename(position["path"]), f"{share:.0%}", f"{position['rows']:,}",
+                    f"{position['errors']:,}"))
+            else:
+                bytes_read, file_bytes = position
+                progress["value"] = bytes_read / file_bytes if file_bytes else 1.0
+            rate = task.rows / task.elapsed if task.elapsed else 0
+            rate_var.set(f"{task.rows:,} rows imported ({rate:,.0f} rows/sec)")
+
+        def start():
+            table = table_var.get().strip()
+            if not table:
+                messagebox.showwarning("Warning", "Please enter a target table", parent=dialog)
+                return
             try:
-                conn = sqlite3.connect(self.current_db)
-                cursor = conn.cursor()
-                with open(file_path, "r", encoding="utf-8") as f:
-                    reader = csv.reader(f)
-                    headers = next(reader)  # assume first row is header
-                    for row in reader:
-                        placeholders = ", ".join(["?"] * len(row))
-                        query = f"INSERT INTO {self.current_table} VALUES ({placeholders})"
-                        cursor.execute(query, row)
-                conn.commit()
-                conn.close()
-                self.load_table_data(None)
-                messagebox.showinfo("Success", f"Data imported from {file_path}")
+                chunk_size = max(1, int(chunk_var.get()))
+                workers = max(1, int(workers_var.get()))
+            except (tk.TclError, ValueError):
+                messagebox.showwarning("Warning", "Rows per batch and processes must be numbers", parent=dialog)
+                return
+            options = dict(has_header=header_var.get(), create_table=create_var.get(),
+                           coerce_types=coerce_var.get(), relax_durability=fast_var.get(),
+                           chunk_size=chunk_size)
+
+            def work(task):
+                if multiple:
+                    return self.engine.import_csv_files(file_paths, table, task=task, conn=task.conn,
+                                                        workers=workers, **options)
+                return self.engine.import_csv(file_paths[0], table, task=task, conn=task.conn, **options)
+
+            def done(result):
+                task = current["task"]
+                if dialog.winfo_exists():
+                    dialog.destroy()
+                self.load_tables()
+                self.select_table(table)
+                if multiple:
+                    rows = sum(r["rows"] for r in result)
+                    errors = sum(r["errors"] for r in result)
+                    source = f"{len(file_paths)} files"
+                else:
+                    rows, errors, source = result, 0, file_paths[0]
+                message = f"{rows:,} rows imported from {source} in {task.elapsed:.1f}s"
+                if errors:
+                    self.show_import_errors(result, f"{message}; {errors:,} rows were skipped")
+                else:
+                    messagebox.showinfo("Success", message)
                 self.set_status("CSV data imported")
-            except Exception as e:
-                messagebox.showerror("Error", f"Failed to import CSV: {str(e)}")
+
+            def failed(error):
+                if dialog.winfo_exists():
+                    import_btn.configure(state="normal")
+                    progress["value"] = 0
+                    rate_var.set("")
+                if isinstance(error, TaskCancelled):
+                    self.set_status("CSV import cancelled")
+                else:
+                    messagebox.showerror("Error", f"Failed to import CSV: {str(error)}")
+
+            import_btn.configure(state="disabled")
+            current["files"] = {}
+            current["task"] = self.executor.submit(work, writer=self.engine, on_batch=show_progress,
+                                                   on_done=done, on_error=failed)
+
+        def cancel():
+            task = current["task"]
+            if task is not None and task.running:
+                task.cancel()
+            else:
+                dialog.destroy()
+
+        buttons = ttk.Frame(dialog)
+        buttons.grid(row=10, column=0, columnspan=2, pady=5)
+        import_btn = ttk.Button(buttons, text="Import", command=start)
+        import_btn.pack(side=tk.LEFT, padx=2)
+        ttk.Button(buttons, text="Cancel", command=cancel).pack(side=tk.LEFT, padx=2)
+        dialog.protocol("WM_DELETE_WINDOW", cancel)
+
+    def import_columnar_dialog(self):
+        """Loads a columnar snapshot folder (see export_csv_dialog) into a table in the background."""
+        if not self.current_db:
+            messagebox.showwarning("Warning", "Please open a database first")
+            return
+        directory = filedialog.askdirectory(title="Select Columnar Snapshot Folder")
+        if not directory:
+            return
+        dialog = tk.Toplevel(self.root)
+        dialog.title(f"Import {os.path.basename(directory)}")
+        tables = [self.tables_tree.item(item, "text") for item in self.tables_tree.get_children()]
+        table_var = tk.StringVar(value=self.current_table or os.path.basename(directory))
+        create_var = tk.BooleanVar(value=True)
+
+        ttk.Label(dialog, text="Target table:").grid(row=0, column=0, sticky="w", padx=5, pady=2)
+        ttk.Combobox(dialog, textvariable=table_var, values=tables).grid(row=0, column=1, sticky="ew", padx=5, pady=2)
+        ttk.Checkbutton(dialog, text="Create the table from the snapshot's columns if it does not exist",
+                        variable=create_var).grid(row=1, column=0, columnspan=2, sticky="w", padx=5)
+        progress = ttk.Progressbar(dialog, maximum=1.0, length=350)
+        progress.grid(row=2, column=0, columnspan=2, sticky="ew", padx=5, pady=5)
+        rate_var = tk.StringVar(value="")
+        ttk.Label(dialog, textvariable=rate_var).grid(row=3, column=0, columnspan=2, sticky="w", padx=5)
+        current = {"task": None}
+
+        def show_progress(position):
+            task = current["task"]
+            if not dialog.winfo_exists() or task is None:
+                return
+            imported, total = position
+            progress["value"] = imported / total if total else 1.0
+            rate = imported / task.elapsed if task.elapsed else 0
+            rate_var.set(f"{imported:,} of {total:,} rows imported ({rate:,.0f} rows/sec)")
+
+        def start():
+            table, create_table = table_var.get().strip(), create_var.get()
+            if not table:
+                messagebox.showwarning("Warning", "Please enter a target table", parent=dialog)
+                return
+
+            def done(rows):
+                task = current["task"]
+                if dialog.winfo_exists():
+                    dialog.destroy()
+                self.load_tables()
+                self.select_table(table)
+                messagebox.showinfo("Success", f"{rows:,} rows imported from {directory} in {task.elapsed:.1f}s")
+                self.set_status("Columnar snapshot imported")
+
+            def failed(error):
+                if dialog.winfo_exists():
+                    import_btn.configure(state="normal")
+                    progress["value"] = 0
+                    rate_var.set("")
+                if isinstance(error, TaskCancelled):
+                    self.set_status("Import cancelled")
+                else:
+                    messagebox.showerror("Error", f"Failed to import snapshot: {str(error)}")
+
+            import_btn.configure(state="disabled")
+            current["task"] = self.executor.submit(
+                lambda task: self.engine.import_columnar(directory, table, create_table, task=task, conn=task.conn),
+                writer=self.engine, on_batch=show_progress, on_done=done, on_error=failed)
+
+        def cancel():
+            task = current["task"]
+            if task is not None and task.running:
+                task.cancel()
+            else:
+                dialog.destroy()
+
+        buttons = ttk.Frame(dialog)
+        buttons.grid(row=4, column=0, columnspan=2, pady=5)
+        import_btn = ttk.Button(buttons, text="Import", command=start)
+        import_btn.pack(side=tk.LEFT, padx=2)
+        ttk.Button(buttons, text="Cancel", command=cancel).pack(side=tk.LEFT, padx=2)
+        dialog.protocol("WM_DELETE_WINDOW", cancel)
+
+    def show_import_errors(self, results, message):
+        """Lists the rows a multi-file import skipped, per file and line."""
+        errors_win = tk.Toplevel(self.root)
+        errors_win.title("Import Errors")
+        ttk.Label(errors_win, text=message).pack(anchor="w", padx=5, pady=5)
+        grid_frame = ttk.Frame(errors_win)
+        grid_frame.pack(fill=tk.BOTH, expand=True, padx=5)
+        grid = self.make_result_grid(grid_frame, ["File", "Line", "Error", "Fields"])
+        grid.column("c2", width=250)
+        grid.column("c3", width=300)
+        for result in results:
+            for line, error, fields in result["error_rows"]:
+                grid.insert("", tk.END, values=(os.path.basename(result["path"]), line, error,
+                                                "" if fields is None else ", ".join(map(str, fields))))
+            if result["errors"] > len(result["error_rows"]):
+                grid.insert("", tk.END, values=(os.path.basename(result["path"]), "",
+                                                f"... {result['errors'] - len(result['error_rows']):,} more", ""))
+        ttk.Button(errors_win, text="Close", command=errors_win.destroy).pack(pady=5)
+
+    def select_table(self, table_name):
+        """Selects table_name in the tables list, which loads it into the data view."""
+        for item in self.tables_tree.get_children():
+            if self.tables_tree.item(item, "text") == table_name:
+                self.tables_tree.selection_set(item)
+                self.tables_tree.see(item)
+                return
 
     def load_tables(self):
         self.tables_tree.delete(*self.tables_tree.get_children())
         if self.current_db:
             try:
-                conn = sqlite3.connect(self.current_db)
-                cursor = conn.cursor()
-                cursor.execute("SELECT name FROM sqlite_master WHERE type='table'")
-                tables = cursor.fetchall()
-                for table in tables:
-                    self.tables_tree.insert("", tk.END, text=table[0], values=table[0])
-                conn.close()
+                for table in self.engine.tables():
+                    self.tables_tree.insert("", tk.END, text=table, values=(table,))
                 self.set_status("Tables loaded")
             except Exception as e:
                 messagebox.showerror("Error", f"Failed to load tables: {str(e)}")
@@ -245,12 +926,7 @@ class DataManager:
             return
 
         try:
-            conn = sqlite3.connect(self.current_db)
-            cursor = conn.cursor()
-            query = f"CREATE TABLE {table_name} ({', '.join(columns)})"
-            cursor.execute(query)
-            conn.commit()
-            conn.close()
+            self.engine.create_table(table_name, columns)
             self.load_tables()
             self.table_dialog.destroy()
             messagebox.showinfo("Success", "Table created successfully")
@@ -267,11 +943,7 @@ class DataManager:
         table_name = self.tables_tree.item(selected[0], "text")
         if messagebox.askyesno("Confirm", f"Delete table '{table_name}'?"):
             try:
-                conn = sqlite3.connect(self.current_db)
-                cursor = conn.cursor()
-                cursor.execute(f"DROP TABLE {table_name}")
-                conn.commit()
-                conn.close()
+                self.engine.drop_table(table_name)
                 self.load_tables()
                 messagebox.showinfo("Success", "Table deleted successfully")
                 self.set_status("Table deleted successfully")
@@ -279,35 +951,237 @@ class DataManager:
                 messagebox.showerror("Error", f"Failed to delete table: {str(e)}")
 
     def load_table_data(self, event):
+        """Opens the selected table in the paged data view.
+
+        Only the first page is requested here; further pages are fetched by
+        fetch_next_page as the user scrolls, and the total row count is
+        computed on a worker thread so opening a table takes constant time
+        and memory regardless of its size.
+        """
         selected = self.tables_tree.selection()
         if not selected:
             return
         
-        self.current_table = self.tables_tree.item(selected[0], "text")
-        self.data_tree.delete(*self.data_tree.get_children())
+        table = self.tables_tree.item(selected[0], "text")
+
+        def show():
+            self.current_table = table
         
-        try:
-            conn = sqlite3.connect(self.current_db)
-            cursor = conn.cursor()
-            cursor.execute(f"PRAGMA table_info({self.current_table})")
-            columns_info = cursor.fetchall()
-            columns = [col[1] for col in columns_info]
-            
-            self.data_tree["columns"] = columns
-            self.data_tree["show"] = "headings"
-            for col in columns:
-                self.data_tree.heading(col, text=col)
-                self.data_tree.column(col, width=100)
+            try:
+                columns_info = self.engine.catalog.columns(self.current_table)
+                columns = [col[1] for col in columns_info]
+                self.columns_info = columns_info
+                self.table_columns = columns
+                self.page_key = self.engine.page_key(self.current_table)
+                self.edits = self.engine.edit_buffer(self.current_table)
+                self.update_edit_controls()
             
-            cursor.execute(f"SELECT * FROM {self.current_table}")
-            self.all_rows = cursor.fetchall()  # Store rows for searching/filtering
-            for row in self.all_rows:
-                self.data_tree.insert("", tk.END, values=row)
+                self.sort = None
+                self.data_tree["columns"] = columns
+                self.data_tree["show"] = "headings"
+                for col in columns:
+                    self.data_tree.heading(col, text=col, command=lambda c=col: self.sort_by_column(c))
+                    self.data_tree.column(col, width=100)
             
-            conn.close()
-            self.set_status("Table data loaded")
-        except Exception as e:
-            messagebox.showerror("Error", f"Failed to load table data: {str(e)}")
+                self.reload_data_view()
+                self.update_search_index_button()
+                self.set_status("Table data loaded")
+            except Exception as e:
+                messagebox.showerror("Error", f"Failed to load table data: {str(e)}")
+
+        self.resolve_staged_edits(then=show)
+
+    def reload_data_view(self):
+        """Clears the data view and starts paging the current table from the top, applying the search."""
+        self.resolve_staged_edits(then=self.restart_data_view)
+
+    def restart_data_view(self):
+        """Does the work of reload_data_view once staged edits are resolved."""
+        if self.current_table is None:
+            return  # The database was switched while staged edits were committed
+        self.data_tree.delete(*self.data_tree.get_children())
+        self.cancel_data_tasks()
+        self.open_read_snapshot()
+        self.data_generation += 1
+        self.loaded_count = 0
+        self.row_keys = {}
+        self.last_key = None
+        self.has_more_rows = True
+        self.loading_page = False
+        self.total_rows = None
+        self.search_term = self.search_var.get().strip()
+        self.search_filter = (self.engine.search_filter(self.current_table, self.search_term)
+                              if self.search_term else None)
+        self.fetch_next_page()
+        self.count_rows_async()
+
+    def fetch_next_page(self):
+        """Fetches the next page of the current table on a worker thread and appends it to the view."""
+        if not self.current_table or not self.has_more_rows or self.loading_page:
+            return
+        self.loading_page = True
+        generation = self.data_generation
+        table, page_key, last_key, order = self.current_table, self.page_key, self.last_key, self.sort
+        page_size, offset = self.page_size, self.loaded_count
+        where, params = self.search_filter or (None, ())
+        engine, snapshot = self.engine, self.read_snapshot
+
+        def fetch(task):
+            if snapshot is None:
+                return engine.page(table, page_key, last_key, offset, page_size, where, params, task.conn,
+                                   with_keys=True, order=order)
+            with snapshot.lock:
+                if snapshot.connection is None:
+                    raise TaskCancelled()  # Closed by a reload
+                return engine.page(table, page_key, last_key, offset, page_size, where, params,
+                                   snapshot.connection, with_keys=True, order=order)
+
+        def done(result):
+            if generation != self.data_generation:
+                return
+            self.loading_page = False
+            rows, self.last_key = result
+            self.has_more_rows = len(rows) == page_size
+            self.loaded_count += len(rows)
+            self.insert_rows(rows)
+            self.update_row_count_label()
+
+        def failed(error):
+            if generation != self.data_generation:
+                return
+            self.loading_page = False
+            self.has_more_rows = False
+            if not isinstance(error, TaskCancelled):
+                messagebox.showerror("Error", f"Failed to load table data: {str(error)}")
+
+        # Pages of a snapshot all come from its one connection; others borrow a pooled reader
+        self.page_task = self.executor.submit(fetch, db=engine if snapshot is None else None,
+                                              on_done=done, on_error=failed)
+
+    def insert_rows(self, rows):
+        """Appends (key, row) pairs to the data view, remembering each item's row key."""
+        with self.engine.metrics.measure("render", self.current_table) as counts:
+            for key, row in rows:
+                item = self.data_tree.insert("", tk.END, values=row)
+                self.row_keys[item] = key
+            self.data_tree.update_idletasks()  # Include drawing the rows, not just queuing them
+            counts["rows"] = len(rows)
+
+    def on_data_scroll(self, first, last):
+        """Scrollbar callback for data_tree; prefetches the next page near the end."""
+        self.data_scroll.set(first, last)
+        if self.has_more_rows and float(last) >= PREFETCH_THRESHOLD:
+            # Defer so the fetch does not run inside Tk's scroll callback
+            self.root.after_idle(self.fetch_next_page)
+
+    def count_rows_async(self):
+        """Counts the rows of the current table (matching the search, if any) on a worker thread."""
+        generation, table = self.data_generation, self.current_table
+        where, params = self.search_filter or (None, ())
+        engine = self.engine
+
+        def count(task):
+            return engine.count(table, where, params, task.conn)
+
+        def done(total):
+            if generation == self.data_generation:
+                self.total_rows = total
+                self.update_row_count_label()
+
+        self.count_task = self.executor.submit(count, db=engine, on_done=done, on_error=lambda error: None)
+
+    def open_read_snapshot(self):
+        """Starts a new read snapshot for the data view if the database's concurrency profile asks for one."""
+        self.close_read_snapshot()
+        if self.concurrency_profile(self.current_db)["snapshot_reads"]:
+            try:
+                self.read_snapshot = self.engine.open_snapshot()
+            except Exception as e:
+                self.set_status(f"Browsing without a snapshot: {str(e)}")
+
+    def close_read_snapshot(self):
+        snapshot, self.read_snapshot = self.read_snapshot, None
+        if snapshot is not None:
+            # Wait for a page still being read from it on a worker thread, not here
+            self.executor.submit(lambda task: snapshot.close())
+
+    def cancel_data_tasks(self):
+        """Cancels page and count fetches still running for the previously loaded table."""
+        for task in (self.page_task, self.count_task):
+            if task is not None and task.running:
+                task.cancel()
+        self.page_task = self.count_task = None
+
+    def sort_by_column(self, column):
+        """Heading click: sorts the data view by column, ascending, then descending, then unsorted.
+
+        Sorting happens in the database (ORDER BY with keyset pagination), so
+        only one page is fetched at a time. When no index delivers that order
+        and the table is large, offers to create one first.
+        """
+        if not self.current_table:
+            return
+        if self.sort is None or self.sort[0] != column:
+            sort = (column, False)
+        elif not self.sort[1]:
+            sort = (column, True)
+        else:
+            sort = None
+        if sort is not None and (self.total_rows is None or self.total_rows >= SORT_WARNING_ROWS):
+            where, params = self.search_filter or (None, ())
+            try:
+                needs_sort = self.engine.sort_needs_temp_btree(self.current_table, column, sort[1], where, params)
+            except Exception as e:
+                messagebox.showerror("Error", f"Failed to plan the sort: {str(e)}")
+                return
+            if needs_sort:
+                index_name, create_sql = self.engine.sort_index_statement(self.current_table, column)
+                rows = "an unknown number of" if self.total_rows is None else f"{self.total_rows:,}"
+                answer = messagebox.askyesnocancel(
+                    "Sort Without Index",
+                    f"No index orders '{self.current_table}' by '{column}', so every page would sort "
+                    f"{rows} rows in a temporary B-tree.\n\nCreate the index {index_name} first?\n"
+                    "(Yes: create it and sort; No: sort without it)")
+                if answer is None:
+                    return
+                if answer:
+                    self.create_sort_index(create_sql, index_name, sort)
+                    return
+        self.apply_sort(sort)
+
+    def create_sort_index(self, create_sql, index_name, sort):
+        """Creates the index serving sort in the background, then sorts the data view by it."""
+        table = self.current_table
+
+        def done(result):
+            self.set_status(f"Index {index_name} created")
+            if self.current_table == table:
+                self.apply_sort(sort)
+
+        def failed(error):
+            messagebox.showerror("Error", f"Failed to create index: {str(error)}")
+
+        self.set_status(f"Creating index {index_name}...")
+        self.executor.submit(lambda task: self.engine.create_index(create_sql, task.conn),
+                             writer=self.engine, on_done=done, on_error=failed)
+
+    def apply_sort(self, sort):
+        """Orders the data view by sort ((column, descending) or None) and reloads it from the top."""
+        self.sort = sort
+        for col in self.table_columns:
+            arrow = ""
+            if sort is not None and sort[0] == col:
+                arrow = " \u25bc" if sort[1] else " \u25b2"
+            self.data_tree.heading(col, text=col + arrow)
+        self.reload_data_view()
+        if sort is not None:
+            self.set_status(f"Sorted by {sort[0]} {'descending' if sort[1] else 'ascending'}")
+
+    def update_row_count_label(self):
+        total = "counting..." if self.total_rows is None else f"{self.total_rows:,}"
+        matching = " matching" if self.search_filter else ""
+        staged = f" | {len(self.edits):,} staged change(s)" if self.edits else ""
+        self.row_count_var.set(f"Rows loaded: {self.loaded_count:,} of {total}{matching}{staged}")
 
     # --------------------- Data Row Operations --------------------- #
     def add_data_dialog(self):
@@ -319,11 +1193,7 @@ class DataManager:
         self.data_dialog.title("Add Data")
         
         try:
-            conn = sqlite3.connect(self.current_db)
-            cursor = conn.cursor()
-            cursor.execute(f"PRAGMA table_info({self.current_table})")
-            columns = cursor.fetchall()
-            conn.close()
+            columns = self.engine.catalog.columns(self.current_table)
             
             self.data_entries = []
             for i, col in enumerate(columns):
@@ -338,9 +1208,6 @@ class DataManager:
 
     def add_data(self):
         try:
-            conn = sqlite3.connect(self.current_db)
-            cursor = conn.cursor()
-            
             columns = []
             values = []
             for entry in self.data_entries:
@@ -353,14 +1220,12 @@ class DataManager:
                     continue
                 values.append(entry.get())
             
-            query = f"INSERT INTO {self.current_table} ({', '.join(columns)}) VALUES ({', '.join(['?']*len(values))})"
-            cursor.execute(query, values)
-            conn.commit()
-            conn.close()
-            self.load_table_data(None)
+            item = self.data_tree.insert("", tk.END, values=values, tags=("staged_insert",))
+            self.row_keys[item] = None
+            self.edits.insert(columns, values, item=item)
+            self.data_tree.see(item)
             self.data_dialog.destroy()
-            messagebox.showinfo("Success", "Data added successfully")
-            self.set_status("Data added successfully")
+            self.after_edit("Data added successfully")
         except Exception as e:
             messagebox.showerror("Error", f"Failed to add data: {str(e)}")
 
@@ -369,15 +1234,14 @@ class DataManager:
         if not selected:
             messagebox.showwarning("Warning", "Please select a record to edit")
             return
+        if not self.check_editable(selected[0]):
+            return
         
         self.edit_data_window = tk.Toplevel(self.root)
         self.edit_data_window.title("Edit Data")
         
         try:
-            conn = sqlite3.connect(self.current_db)
-            cursor = conn.cursor()
-            cursor.execute(f"PRAGMA table_info({self.current_table})")
-            columns = [col[1] for col in cursor.fetchall()]
+            columns = self.engine.catalog.column_names(self.current_table)
             values = self.data_tree.item(selected[0], "values")
             
             self.edit_entries = []
@@ -390,15 +1254,11 @@ class DataManager:
             
             ttk.Button(self.edit_data_window, text="Update", 
                       command=lambda: self.update_data(selected[0])).grid(row=len(columns), column=0, columnspan=2, pady=10)
-            conn.close()
         except Exception as e:
             messagebox.showerror("Error", f"Failed to load data: {str(e)}")
 
     def update_data(self, item_id):
         try:
-            conn = sqlite3.connect(self.current_db)
-            cursor = conn.cursor()
-            
             columns = []
             for entry in self.edit_entries:
                 row = entry.grid_info()["row"]
@@ -406,18 +1266,11 @@ class DataManager:
                 if label_widgets:
                     columns.append(label_widgets[0]["text"])
             values = [entry.get() for entry in self.edit_entries]
-            primary_key = self.get_primary_key()
-            pk_value = self.data_tree.item(item_id, "values")[0]
-            
-            set_clause = ", ".join([f"{col} = ?" for col in columns])
-            query = f"UPDATE {self.current_table} SET {set_clause} WHERE {primary_key} = ?"
-            cursor.execute(query, values + [pk_value])
-            conn.commit()
-            conn.close()
-            self.load_table_data(None)
+            old_row = self.data_tree.item(item_id, "values")
+            self.edits.update(self.row_keys[item_id], columns, values, old_row, item=item_id)
+            self.data_tree.item(item_id, values=values, tags=("staged_update",))
             self.edit_data_window.destroy()
-            messagebox.showinfo("Success", "Data updated successfully")
-            self.set_status("Data updated successfully")
+            self.after_edit("Data updated successfully")
         except Exception as e:
             messagebox.showerror("Error", f"Failed to update data: {str(e)}")
 
@@ -426,35 +1279,323 @@ class DataManager:
         if not selected:
             messagebox.showwarning("Warning", "Please select a record to delete")
             return
+        if not all(self.check_editable(item) for item in selected):
+            return
         
-        if messagebox.askyesno("Confirm", "Delete selected record?"):
+        prompt = "Delete selected record?" if len(selected) == 1 else f"Delete {len(selected):,} selected records?"
+        if messagebox.askyesno("Confirm", prompt):
             try:
-                conn = sqlite3.connect(self.current_db)
-                cursor = conn.cursor()
-                primary_key = self.get_primary_key()
-                value = self.data_tree.item(selected[0], "values")[0]
-                cursor.execute(f"DELETE FROM {self.current_table} WHERE {primary_key} = ?", (value,))
-                conn.commit()
-                conn.close()
-                self.load_table_data(None)
-                messagebox.showinfo("Success", "Data deleted successfully")
-                self.set_status("Data deleted successfully")
+                for item in selected:
+                    self.edits.delete(self.row_keys[item], self.data_tree.item(item, "values"), item=item)
+                    self.data_tree.item(item, tags=("staged_delete",))
+                self.after_edit("Data deleted successfully")
             except Exception as e:
                 messagebox.showerror("Error", f"Failed to delete data: {str(e)}")
 
-    def get_primary_key(self):
-        try:
-            conn = sqlite3.connect(self.current_db)
-            cursor = conn.cursor()
-            cursor.execute(f"PRAGMA table_info({self.current_table})")
-            for col in cursor.fetchall():
-                if col[5] == 1:
-                    conn.close()
-                    return col[1]
-            conn.close()
-            return "rowid"
-        except Exception as e:
-            return "rowid"
+    # --------------------- Staged Edits --------------------- #
+    def check_editable(self, item):
+        """Warns and returns False if item is a staged insert or staged delete, which cannot be edited further."""
+        if self.row_keys.get(item) is None:
+            messagebox.showwarning("Warning", "This row has not been committed yet; commit or undo it first")
+            return False
+        if "staged_delete" in self.data_tree.item(item, "tags"):
+            messagebox.showwarning("Warning", "This row is staged for deletion; commit or undo it first")
+            return False
+        return True
+
+    def after_edit(self, message):
+        """Commits an edit right away, or keeps it staged in Stage edits mode."""
+        if self.stage_var.get():
+            self.update_edit_controls()
+            self.update_row_count_label()
+            self.set_status(f"{message} (staged, not committed)")
+        elif self.commit_task is not None and self.commit_task.running:
+            self.set_status(f"{message} (committed after the running commit)")
+        else:
+            self.commit_edits(message)
+
+    def toggle_staging(self):
+        if not self.stage_var.get() and self.edits:
+            self.commit_edits()
+
+    def update_edit_controls(self):
+        pending = len(self.edits) if self.edits is not None else 0
+        state = "normal" if pending else "disabled"
+        self.undo_btn.configure(state=state)
+        self.rollback_btn.configure(state=state)
+        self.commit_btn.configure(state=state, text=f"Commit ({pending})" if pending else "Commit")
+
+    def revert_change(self, change):
+        """Restores the data view to how it was before change was staged."""
+        item = change["item"]
+        if not self.data_tree.exists(item):
+            return
+        if change["kind"] == "insert":
+            self.data_tree.delete(item)
+            self.row_keys.pop(item, None)
+            return
+        if change["kind"] == "update":
+            self.data_tree.item(item, values=change["old_row"])
+        # The item keeps the highlight of its earlier staged change, if any
+        earlier = [c for c in self.edits.changes if c["item"] == item]
+        self.data_tree.item(item, tags=(f"staged_{earlier[-1]['kind']}",) if earlier else ())
+
+    def undo_edit(self):
+        if self.edits is None:
+            return
+        change = self.edits.undo()
+        if change is not None:
+            self.revert_change(change)
+            self.update_edit_controls()
+            self.update_row_count_label()
+            self.set_status(f"Undid staged {change['kind']}")
+
+    def rollback_edits(self):
+        """Discards every staged change, restoring the rows as they were loaded."""
+        if not self.edits:
+            return
+        while self.edits:
+            self.revert_change(self.edits.undo())
+        self.update_edit_controls()
+        self.update_row_count_label()
+        self.set_status("Staged changes rolled back")
+
+    def commit_edits(self, message=None):
+        """Commits all staged changes in one transaction, then refreshes just the affected rows.
+
+        message is shown on success; it is given for edits committed right
+        away (Stage edits off), which are rolled back out of the view if the
+        commit fails.
+        """
+        if not self.edits:
+            return
+        if self.commit_task is not None and self.commit_task.running:
+            messagebox.showwarning("Warning", "A commit is already in progress")
+            return
+        edits, engine, table = self.edits, self.engine, self.current_table
+        generation = self.data_generation
+
+        def work(task):
+            changes = edits.commit(task.conn)
+            keys = [change["new_key"] for change in changes if change["new_key"] is not None]
+            return changes, engine.fetch_rows(table, keys, task.conn)
+
+        def done(result):
+            changes, rows = result
+            if generation == self.data_generation:
+                self.apply_committed(changes, rows)
+            self.update_edit_controls()
+            if message:
+                messagebox.showinfo("Success", message)
+                self.set_status(message)
+            else:
+                self.set_status(f"{len(changes):,} change(s) committed")
+            if edits is self.edits and edits and not self.stage_var.get():
+                self.commit_edits()  # Edits made while this commit ran
+
+        def failed(error):
+            item = error.change.get("item") if isinstance(error, EditConflict) else None
+            if item is not None and self.data_tree.exists(item):
+                self.data_tree.selection_set(item)
+                self.data_tree.see(item)
+            messagebox.showerror("Error", f"Failed to commit changes, nothing was saved: {str(error)}")
+            if not self.stage_var.get() and edits is self.edits:
+                self.rollback_edits()
+            self.update_edit_controls()
+
+        self.set_status(f"Committing {len(edits):,} change(s)...")
+        self.commit_task = self.executor.submit(work, writer=engine, on_done=done, on_error=failed)
+
+    def apply_committed(self, changes, rows):
+        """Updates the rows touched by committed changes from their re-read values."""
+        for change in changes:
+            item = change["item"]
+            if not self.data_tree.exists(item):
+                continue
+            if change["kind"] == "delete":
+                self.data_tree.delete(item)
+                self.row_keys.pop(item, None)
+                self.loaded_count -= 1
+                if self.total_rows is not None:
+                    self.total_rows -= 1
+                continue
+            if change["kind"] == "insert":
+                if self.total_rows is not None:
+                    self.total_rows += 1
+                if self.has_more_rows and self.read_snapshot is None and self.sort is None:
+                    # The new row sorts after the loaded pages and will arrive with them
+                    self.data_tree.delete(item)
+                    self.row_keys.pop(item, None)
+                    continue
+                self.loaded_count += 1
+            self.row_keys[item] = change["new_key"]
+            if any(c["item"] == item for c in self.edits.changes):
+                continue  # Staged again while the commit ran; keep showing the staged values
+            row = rows.get(change["new_key"])
+            self.data_tree.item(item, values=row if row is not None else change["values"], tags=())
+        self.update_row_count_label()
+
+    def resolve_staged_edits(self, then=None):
+        """Offers to commit staged edits before the data view is reloaded; otherwise they are discarded.
+
+        The commit runs in the background like commit_edits; then, if given,
+        is called once it has finished (whether or not it succeeded), or
+        right away when there is nothing to commit.
+        """
+        proceed = then or (lambda: None)
+        if not self.edits or (self.commit_task is not None and self.commit_task.running):
+            proceed()
+            return
+        count, table = len(self.edits), self.edits.table
+        if not messagebox.askyesno("Staged Changes", f"Commit {count:,} staged change(s) to '{table}'?\n"
+                                                     "Choosing No discards them."):
+            self.edits.clear()
+            self.update_edit_controls()
+            proceed()
+            return
+        edits = self.edits.detach()
+        self.update_edit_controls()
+
+        def done(changes):
+            self.set_status(f"{len(changes):,} change(s) committed")
+            proceed()
+
+        def failed(error):
+            messagebox.showerror("Error", f"Failed to commit changes, nothing was saved: {str(error)}")
+            proceed()
+
+        self.set_status(f"Committing {count:,} change(s)...")
+        self.commit_task = self.executor.submit(lambda task: edits.commit(task.conn), writer=edits.engine,
+                                                on_done=done, on_error=failed)
+
+    # --------------------- Bulk Operations --------------------- #
+    def bulk_edit_dialog(self):
+        """Deletes or updates many rows with one set-based statement.
+
+        The rows are the selected ones (addressed by their row keys), those
+        matching the current search, those matching a WHERE clause, or the
+        whole table. Preview counts them before anything is changed.
+        """
+        if not self.current_table:
+            messagebox.showwarning("Warning", "Please select a table first")
+            return
+        table = self.current_table
+        keys = [self.row_keys[item] for item in self.data_tree.selection() if self.row_keys.get(item) is not None]
+        search, search_term = self.search_filter, self.search_term
+
+        dialog = tk.Toplevel(self.root)
+        dialog.title(f"Bulk Edit: {table}")
+        target_var = tk.StringVar(value="selected" if keys else ("search" if search else "where"))
+        ttk.Label(dialog, text="Rows:").grid(row=0, column=0, sticky="w", padx=5, pady=(5, 0))
+        ttk.Radiobutton(dialog, text=f"Selected rows ({len(keys):,})", value="selected", variable=target_var,
+                        state="normal" if keys else "disabled").grid(row=1, column=0, columnspan=3, sticky="w", padx=15)
+        ttk.Radiobutton(dialog, text=f"Rows matching the search '{search_term}'", value="search",
+                        variable=target_var, state="normal" if search else "disabled").grid(
+            row=2, column=0, columnspan=3, sticky="w", padx=15)
+        ttk.Radiobutton(dialog, text="Rows matching WHERE:", value="where", variable=target_var).grid(
+            row=3, column=0, sticky="w", padx=15)
+        where_entry = ttk.Entry(dialog, width=40)
+        where_entry.grid(row=3, column=1, columnspan=2, sticky="ew", padx=5)
+        ttk.Radiobutton(dialog, text="All rows of the table", value="all", variable=target_var).grid(
+            row=4, column=0, columnspan=3, sticky="w", padx=15)
+
+        action_var = tk.StringVar(value="update")
+        ttk.Label(dialog, text="Action:").grid(row=5, column=0, sticky="w", padx=5, pady=(5, 0))
+        ttk.Radiobutton(dialog, text="Set", value="update", variable=action_var).grid(row=6, column=0, sticky="w", padx=15)
+        column_box = ttk.Combobox(dialog, values=self.table_columns, state="readonly", width=15)
+        column_box.grid(row=6, column=1, sticky="w", padx=5)
+        if self.table_columns:
+            column_box.current(0)
+        expression_entry = ttk.Entry(dialog, width=25)
+        expression_entry.grid(row=6, column=2, sticky="ew", padx=5)
+        ttk.Label(dialog, text="= SQL expression, e.g. upper(name) or price * 1.1").grid(
+            row=7, column=1, columnspan=2, sticky="w", padx=5)
+        ttk.Radiobutton(dialog, text="Delete rows", value="delete", variable=action_var).grid(
+            row=8, column=0, columnspan=3, sticky="w", padx=15)
+        result_var = tk.StringVar(value="")
+        ttk.Label(dialog, textvariable=result_var).grid(row=9, column=0, columnspan=3, sticky="w", padx=5, pady=5)
+
+        def row_filter():
+            target = target_var.get()
+            if target == "selected":
+                return self.engine.keys_filter(table, keys)
+            if target == "search":
+                return search
+            if target == "where":
+                where = where_entry.get().strip()
+                if not where:
+                    raise ValueError("Please enter a WHERE clause")
+                return where, ()
+            return None, ()
+
+        def preview(then=None):
+            try:
+                where, params = row_filter()
+            except ValueError as e:
+                messagebox.showwarning("Warning", str(e), parent=dialog)
+                return
+
+            def done(count):
+                if not dialog.winfo_exists():
+                    return
+                result_var.set(f"{count:,} row(s) will be affected")
+                if then is not None:
+                    then(where, params, count)
+
+            def failed(error):
+                if dialog.winfo_exists():
+                    result_var.set("")
+                messagebox.showerror("Error", f"Failed to count rows: {str(error)}", parent=dialog)
+
+            result_var.set("Counting rows...")
+            engine = self.engine
+            self.executor.submit(lambda task: engine.count(table, where, params, task.conn),
+                                 db=engine, on_done=done, on_error=failed)
+
+        def apply():
+            action = action_var.get()
+            column, expression = column_box.get(), expression_entry.get().strip()
+            if action == "update" and not (column and expression):
+                messagebox.showwarning("Warning", "Please choose a column and enter an expression", parent=dialog)
+                return
+            self.resolve_staged_edits(then=lambda: preview(
+                then=lambda where, params, count: confirm(action, column, expression, where, params, count)))
+
+        def confirm(action, column, expression, where, params, count):
+            if count == 0:
+                return
+            change = "Delete" if action == "delete" else f"Set {column} = {expression} on"
+            if not messagebox.askyesno("Confirm", f"{change} {count:,} row(s) of '{table}'?", parent=dialog):
+                return
+            engine = self.engine
+
+            def work(task):
+                if action == "delete":
+                    return engine.bulk_delete(table, where, params, task.conn)
+                return engine.bulk_update(table, column, expression, where, params, task.conn)
+
+            def done(affected):
+                if dialog.winfo_exists():
+                    dialog.destroy()
+                if self.current_table == table:
+                    self.reload_data_view()
+                self.set_status(f"{affected:,} row(s) {'deleted' if action == 'delete' else 'updated'}")
+
+            def failed(error):
+                if dialog.winfo_exists():
+                    result_var.set("")
+                if not isinstance(error, TaskCancelled):
+                    messagebox.showerror("Error", f"Bulk {action} failed, nothing was changed: {str(error)}",
+                                         parent=dialog)
+
+            result_var.set(f"Applying to {count:,} row(s)...")
+            self.executor.submit(work, writer=engine, on_done=done, on_error=failed)
+
+        buttons = ttk.Frame(dialog)
+        buttons.grid(row=10, column=0, columnspan=3, pady=5)
+        ttk.Button(buttons, text="Preview", command=preview).pack(side=tk.LEFT, padx=2)
+        ttk.Button(buttons, text="Apply", command=apply).pack(side=tk.LEFT, padx=2)
+        ttk.Button(buttons, text="Close", command=dialog.destroy).pack(side=tk.LEFT, padx=2)
 
     # --------------------- Right-Click Context Menus --------------------- #
     # Table list sidebar (for table operations)
@@ -474,16 +1615,13 @@ class DataManager:
         
         ttk.Button(self.sidebar, text="Edit Table Name", command=lambda: self.edit_table_name(table_name)).pack(fill=tk.X, padx=10, pady=5)
         ttk.Button(self.sidebar, text="View Table Schema", command=lambda: self.edit_table_schema(table_name)).pack(fill=tk.X, padx=10, pady=5)
+        ttk.Button(self.sidebar, text="Profile Columns", command=lambda: self.column_profile_window(table_name)).pack(fill=tk.X, padx=10, pady=5)
         ttk.Button(self.sidebar, text="Delete Table", command=lambda: self.delete_table_by_sidebar(table_name)).pack(fill=tk.X, padx=10, pady=5)
 
     def delete_table_by_sidebar(self, table_name):
         if messagebox.askyesno("Confirm", f"Delete table '{table_name}'?"):
             try:
-                conn = sqlite3.connect(self.current_db)
-                cursor = conn.cursor()
-                cursor.execute(f"DROP TABLE {table_name}")
-                conn.commit()
-                conn.close()
+                self.engine.drop_table(table_name)
                 self.load_tables()
                 messagebox.showinfo("Success", "Table deleted successfully")
                 if self.sidebar is not None:
@@ -496,13 +1634,12 @@ class DataManager:
         new_name = simpledialog.askstring("Edit Table Name", f"Enter new name for table '{old_name}':")
         if new_name and new_name.strip():
             try:
-                conn = sqlite3.connect(self.current_db)
-                cursor = conn.cursor()
-                cursor.execute(f"ALTER TABLE {old_name} RENAME TO {new_name.strip()}")
-                conn.commit()
-                conn.close()
+                index_dropped = self.engine.rename_table(old_name, new_name.strip())
                 self.load_tables()
-                messagebox.showinfo("Success", f"Table renamed to '{new_name.strip()}'")
+                message = f"Table renamed to '{new_name.strip()}'"
+                if index_dropped:
+                    message += "\n\nIts search index was removed; use Build Search Index to recreate it."
+                messagebox.showinfo("Success", message)
                 if self.sidebar is not None:
                     self.sidebar.destroy()
                 self.set_status("Table renamed successfully")
@@ -511,17 +1648,7 @@ class DataManager:
 
     def edit_table_schema(self, table_name):
         try:
-            conn = sqlite3.connect(self.current_db)
-            cursor = conn.cursor()
-            cursor.execute(f"PRAGMA table_info({table_name})")
-            schema_info = cursor.fetchall()
-            conn.close()
-            
-            schema_text = f"Schema for table '{table_name}':\n\n"
-            schema_text += "cid | name | type | notnull | dflt_value | pk\n"
-            schema_text += "-" * 50 + "\n"
-            for col in schema_info:
-                schema_text += " | ".join(str(item) for item in col) + "\n"
+            schema_text = self.engine.describe_table(table_name)
             
             schema_window = tk.Toplevel(self.root)
             schema_window.title(f"Schema of {table_name}")
@@ -537,11 +1664,13 @@ class DataManager:
         row_id = self.data_tree.identify_row(event.y)
         if not row_id:
             return
-        self.data_tree.selection_set(row_id)
+        if row_id not in self.data_tree.selection():
+            self.data_tree.selection_set(row_id)
         if self.data_context_menu is None:
             self.data_context_menu = tk.Menu(self.root, tearoff=0)
             self.data_context_menu.add_command(label="Edit Row", command=self.edit_data_dialog)
-            self.data_context_menu.add_command(label="Delete Row", command=self.delete_data)
+            self.data_context_menu.add_command(label="Delete Row(s)", command=self.delete_data)
+            self.data_context_menu.add_command(label="Bulk Edit...", command=self.bulk_edit_dialog)
             self.data_context_menu.add_separator()
             self.data_context_menu.add_command(label="Export Table to CSV", command=self.export_table_csv)
         self.data_context_menu.post(event.x_root, event.y_root)
@@ -551,25 +1680,140 @@ class DataManager:
         if not self.current_table:
             messagebox.showwarning("Warning", "Please select a table first")
             return
-        file_path = filedialog.asksaveasfilename(defaultextension=".csv", filetypes=[("CSV Files", "*.csv")],
-                                                 title="Export Table to CSV")
-        if file_path:
+        self.export_csv_dialog()
+
+    def export_csv_dialog(self, sql=None):
+        """Shows export options and streams the chosen rows to CSV in the background.
+
+        The rows can be the whole current table, the rows matching the current
+        search, or the result of an arbitrary query (pre-filled with sql).
+        They can also be written as a columnar snapshot: one NumPy .npy file
+        per column in a folder (see DatabaseEngine.export_columnar).
+        """
+        dialog = tk.Toplevel(self.root)
+        dialog.title("Export Data")
+        search_term = self.search_var.get().strip() if self.current_table else ""
+        search = self.search_filter if search_term else None
+
+        source_var = tk.StringVar(value="query" if sql or not self.current_table else "table")
+        compress_var = tk.BooleanVar(value=False)
+        format_var = tk.StringVar(value="csv")
+        chunk_var = tk.IntVar(value=EXPORT_CHUNK_SIZE)
+
+        table_state = "normal" if self.current_table else "disabled"
+        ttk.Radiobutton(dialog, text=f"Whole table {self.current_table or ''}", value="table",
+                        variable=source_var, state=table_state).grid(row=0, column=0, columnspan=2, sticky="w", padx=5)
+        ttk.Radiobutton(dialog, text=f"Rows matching the search '{search_term}'", value="search",
+                        variable=source_var, state="normal" if search else "disabled").grid(
+            row=1, column=0, columnspan=2, sticky="w", padx=5)
+        ttk.Radiobutton(dialog, text="Query result:", value="query", variable=source_var).grid(
+            row=2, column=0, columnspan=2, sticky="w", padx=5)
+        query_text = scrolledtext.ScrolledText(dialog, width=60, height=5)
+        query_text.grid(row=3, column=0, columnspan=2, padx=5, pady=2)
+        if sql:
+            query_text.insert(tk.END, sql)
+        format_frame = ttk.Frame(dialog)
+        format_frame.grid(row=4, column=0, columnspan=2, sticky="w", padx=5)
+        compress_check = ttk.Checkbutton(format_frame, text="Compress with gzip (.csv.gz)", variable=compress_var)
+
+        def format_changed():
+            compress_check.configure(state="normal" if format_var.get() == "csv" else "disabled")
+
+        ttk.Radiobutton(format_frame, text="CSV", value="csv", variable=format_var,
+                        command=format_changed).pack(side=tk.LEFT)
+        compress_check.pack(side=tk.LEFT, padx=(0, 10))
+        ttk.Radiobutton(format_frame, text="Columnar snapshot (NumPy .npy per column)", value="columnar",
+                        variable=format_var, command=format_changed).pack(side=tk.LEFT)
+        ttk.Label(dialog, text="Rows per batch:").grid(row=5, column=0, sticky="w", padx=5, pady=2)
+        ttk.Spinbox(dialog, from_=100, to=1000000, increment=1000, textvariable=chunk_var, width=10).grid(
+            row=5, column=1, sticky="w", padx=5, pady=2)
+
+        progress = ttk.Progressbar(dialog, maximum=1.0, length=350)
+        progress.grid(row=6, column=0, columnspan=2, sticky="ew", padx=5, pady=5)
+        progress_var = tk.StringVar(value="")
+        ttk.Label(dialog, textvariable=progress_var).grid(row=7, column=0, columnspan=2, sticky="w", padx=5)
+        current = {"task": None, "total": None}
+
+        def show_progress(rows):
+            task = current["task"]
+            if not dialog.winfo_exists() or task is None:
+                return
+            if current["total"]:
+                progress["value"] = min(1.0, rows / current["total"])
+            rate = rows / task.elapsed if task.elapsed else 0
+            progress_var.set(f"{rows:,} rows written ({rate:,.0f} rows/sec)")
+
+        def start():
+            source, table = source_var.get(), self.current_table
+            current["total"] = None
+            if source == "table":
+                current["total"] = self.total_rows
+            elif source == "query":
+                export_sql = query_text.get("1.0", tk.END).strip()
+                if not export_sql:
+                    messagebox.showwarning("Warning", "Please enter a SQL query", parent=dialog)
+                    return
             try:
-                conn = sqlite3.connect(self.current_db)
-                cursor = conn.cursor()
-                cursor.execute(f"SELECT * FROM {self.current_table}")
-                rows = cursor.fetchall()
-                cursor.execute(f"PRAGMA table_info({self.current_table})")
-                headers = [col[1] for col in cursor.fetchall()]
-                conn.close()
-                with open(file_path, "w", newline="", encoding="utf-8") as f:
-                    writer = csv.writer(f)
-                    writer.writerow(headers)
-                    writer.writerows(rows)
-                messagebox.showinfo("Success", f"Data exported to {file_path}")
-                self.set_status("Data exported to CSV")
-            except Exception as e:
-                messagebox.showerror("Error", f"Failed to export data: {str(e)}")
+                chunk_size = max(1, int(chunk_var.get()))
+            except (tk.TclError, ValueError):
+                messagebox.showwarning("Warning", "Rows per batch must be a number", parent=dialog)
+                return
+            columnar = format_var.get() == "columnar"
+            compress = compress_var.get() and not columnar
+            if columnar:
+                file_path = filedialog.askdirectory(parent=dialog, mustexist=False,
+                                                    title="Folder for the columnar snapshot")
+            else:
+                extension = ".csv.gz" if compress else ".csv"
+                file_path = filedialog.asksaveasfilename(
+                    parent=dialog, defaultextension=extension, title="Export to CSV",
+                    filetypes=[("Gzipped CSV Files", "*.csv.gz")] if compress else [("CSV Files", "*.csv")])
+            if not file_path:
+                return
+
+            def work(task):
+                term = search_term if source == "search" else None
+                if columnar:
+                    if source == "query":
+                        return self.engine.export_columnar(export_sql, file_path, (), chunk_size, task, task.conn)
+                    return self.engine.export_table_columnar(table, file_path, term, chunk_size, task, task.conn)
+                if source == "query":
+                    return self.engine.export_csv(export_sql, file_path, (), compress, chunk_size, task, task.conn)
+                return self.engine.export_table(table, file_path, term, compress, chunk_size, task, task.conn)
+
+            def done(rows):
+                if dialog.winfo_exists():
+                    dialog.destroy()
+                messagebox.showinfo("Success", f"{rows:,} rows exported to {file_path}")
+                self.set_status("Columnar snapshot written" if columnar else "Data exported to CSV")
+
+            def failed(error):
+                if dialog.winfo_exists():
+                    export_btn.configure(state="normal")
+                    progress["value"] = 0
+                    progress_var.set("")
+                if isinstance(error, TaskCancelled):
+                    self.set_status("Export cancelled")
+                else:
+                    messagebox.showerror("Error", f"Failed to export data: {str(error)}")
+
+            export_btn.configure(state="disabled")
+            current["task"] = self.executor.submit(work, db=self.engine, on_batch=show_progress,
+                                                   on_done=done, on_error=failed)
+
+        def cancel():
+            task = current["task"]
+            if task is not None and task.running:
+                task.cancel()
+            else:
+                dialog.destroy()
+
+        buttons = ttk.Frame(dialog)
+        buttons.grid(row=8, column=0, columnspan=2, pady=5)
+        export_btn = ttk.Button(buttons, text="Export...", command=start)
+        export_btn.pack(side=tk.LEFT, padx=2)
+        ttk.Button(buttons, text="Cancel", command=cancel).pack(side=tk.LEFT, padx=2)
+        dialog.protocol("WM_DELETE_WINDOW", cancel)
 
     def run_query_window(self):
         if not self.current_db:
@@ -580,45 +1824,937 @@ class DataManager:
         query_win.title("Run SQL Query")
         
         # Query input
-        ttk.Label(query_win, text="Enter SQL Query:").pack(padx=5, pady=5)
+        ttk.Label(query_win, text="Enter SQL Query (separate statements with ;):").pack(padx=5, pady=5)
         query_text = scrolledtext.ScrolledText(query_win, width=80, height=10)
-        query_text.pack(padx=5, pady=5)
+        query_text.pack(fill=tk.X, padx=5, pady=5)
         
-        # Results display
+        # Results display: one tab per statement
         ttk.Label(query_win, text="Results:").pack(padx=5, pady=5)
-        results_text = scrolledtext.ScrolledText(query_win, width=80, height=15)
-        results_text.pack(padx=5, pady=5)
-        results_text.configure(state="disabled")
+        results = ttk.Notebook(query_win)
+        results.pack(fill=tk.BOTH, expand=True, padx=5, pady=5)
+
+        # Live progress of the running query
+        progress_var = tk.StringVar(value="")
+        ttk.Label(query_win, textvariable=progress_var).pack(padx=5)
+        limit_var = tk.IntVar(value=MAX_RESULT_ROWS)
+        current = {"task": None, "statements": [], "grids": {}}
+
+        def show_progress():
+            task = current["task"]
+            if task is None or not query_win.winfo_exists():
+                return
+            progress_var.set(f"Elapsed: {task.elapsed:.1f}s | Rows fetched: {task.rows:,}")
+            if task.running:
+                query_win.after(100, show_progress)
+
+        def finish():
+            run_btn.configure(state="normal")
+            profile_btn.configure(state="normal")
+            cancel_btn.configure(state="disabled")
+            show_progress()
+
+        def add_tab(index):
+            """Adds the result tab of statement index; returns the frame and its summary label variable."""
+            frame = ttk.Frame(results)
+            sql = " ".join(current["statements"][index].split())
+            results.add(frame, text=f"{index + 1}: {sql[:20]}")
+            summary_var = tk.StringVar(value=sql[:200])
+            ttk.Label(frame, textvariable=summary_var, anchor="w").pack(fill=tk.X, padx=2)
+            results.select(frame)
+            return frame, summary_var
+
+        def show_event(event):
+            if not query_win.winfo_exists():
+                return
+            kind, index = event[0], event[1]
+            if kind == "profile":
+                frame, _ = add_tab(index)
+                text_widget = scrolledtext.ScrolledText(frame, width=80, height=15)
+                text_widget.pack(fill=tk.BOTH, expand=True)
+                text_widget.insert(tk.END, format_profile(event[2]))
+                text_widget.configure(state="disabled")
+            elif kind == "columns":
+                frame, summary_var = add_tab(index)
+                grid = self.make_result_grid(frame, event[2])
+                current["grids"][index] = (grid, summary_var)
+            elif kind == "rows":
+                grid, _ = current["grids"][index]
+                for row in event[2]:
+                    grid.insert("", tk.END, values=row)
+            elif index in current["grids"]:
+                _, summary_var = current["grids"][index]
+                count, truncated = event[2], event[3]
+                summary_var.set(f"{count:,} rows" + (f" (limited to the first {count:,}; raise the row limit "
+                                                     "or use Export to CSV for the rest)" if truncated else ""))
+            else:
+                _, summary_var = add_tab(index)
+                affected = f"{event[2]:,} rows affected" if event[2] >= 0 else "Query executed successfully."
+                summary_var.set(f"{summary_var.get()}\n{affected}")
         
-        def execute_query():
+        def execute_query(profile=False):
             sql = query_text.get("1.0", tk.END).strip()
-            if not sql:
-                messagebox.showwarning("Warning", "Please enter a SQL query")
+            statements = split_statements(sql)
+            if not statements:
+                messagebox.showwarning("Warning", "Please enter a SQL query", parent=query_win)
                 return
             try:
-                conn = sqlite3.connect(self.current_db)
-                cursor = conn.cursor()
-                cursor.execute(sql)
-                # If it's a SELECT query, fetch results
-                if sql.lower().startswith("select"):
-                    rows = cursor.fetchall()
-                    headers = [description[0] for description in cursor.description]
-                    output = "\t".join(headers) + "\n" + "-" * 50 + "\n"
-                    for row in rows:
-                        output += "\t".join(str(item) for item in row) + "\n"
+                max_rows = max(1, int(limit_var.get()))
+            except (tk.TclError, ValueError):
+                messagebox.showwarning("Warning", "Row limit must be a number", parent=query_win)
+                return
+            engine = self.engine
+
+            def work(task):
+                if profile:
+                    engine.profile(statements, lambda index, result: task.emit(("profile", index, result)), task)
                 else:
-                    conn.commit()
-                    output = "Query executed successfully."
-                conn.close()
-                results_text.configure(state="normal")
-                results_text.delete("1.0", tk.END)
-                results_text.insert(tk.END, output)
-                results_text.configure(state="disabled")
-                self.set_status("Query executed")
+                    engine.execute_script(statements, max_rows, task.emit, task)
+
+            def done(result):
+                if not query_win.winfo_exists():
+                    return
+                finish()
+                self.set_status("Query profiled" if profile else "Query executed")
+
+            def failed(error):
+                if not query_win.winfo_exists():
+                    return
+                finish()
+                if isinstance(error, TaskCancelled):
+                    progress_var.set(progress_var.get() + " | Cancelled")
+                    self.set_status("Query cancelled")
+                else:
+                    messagebox.showerror("Error", f"Query failed: {str(error)}", parent=query_win)
+
+            for tab in results.tabs():
+                results.forget(tab)
+            current["statements"], current["grids"] = statements, {}
+            run_btn.configure(state="disabled")
+            profile_btn.configure(state="disabled")
+            cancel_btn.configure(state="normal")
+            current["task"] = self.executor.submit(work, writer=engine, on_batch=show_event,
+                                                   on_done=done, on_error=failed)
+            show_progress()
+
+        def cancel_query():
+            if current["task"] is not None:
+                current["task"].cancel()
+
+        def close_window():
+            cancel_query()
+            query_win.destroy()
+
+        buttons = ttk.Frame(query_win)
+        buttons.pack(pady=5)
+        run_btn = ttk.Button(buttons, text="Run Query", command=execute_query)
+        run_btn.pack(side=tk.LEFT, padx=2)
+        profile_btn = ttk.Button(buttons, text="Profile", command=lambda: execute_query(profile=True))
+        profile_btn.pack(side=tk.LEFT, padx=2)
+        cancel_btn = ttk.Button(buttons, text="Cancel", command=cancel_query, state="disabled")
+        cancel_btn.pack(side=tk.LEFT, padx=2)
+        ttk.Button(buttons, text="Export to CSV",
+                   command=lambda: self.export_csv_dialog(query_text.get("1.0", tk.END).strip())).pack(side=tk.LEFT, padx=2)
+        ttk.Label(buttons, text="Row limit:").pack(side=tk.LEFT, padx=(10, 2))
+        ttk.Spinbox(buttons, from_=1, to=10000000, increment=1000, textvariable=limit_var, width=10).pack(side=tk.LEFT)
+        query_win.protocol("WM_DELETE_WINDOW", close_window)
+
+    def make_result_grid(self, parent, columns):
+        """Creates a scrollable Treeview grid with the given column headings inside parent."""
+        frame = ttk.Frame(parent)
+        frame.pack(fill=tk.BOTH, expand=True)
+        ids = [f"c{i}" for i in range(len(columns))]  # Column names may repeat or be empty
+        grid = ttk.Treeview(frame, columns=ids, show="headings")
+        for column_id, name in zip(ids, columns):
+            grid.heading(column_id, text=name)
+            grid.column(column_id, width=100, stretch=False)
+        y_scroll = ttk.Scrollbar(frame, orient=tk.VERTICAL, command=grid.yview)
+        x_scroll = ttk.Scrollbar(frame, orient=tk.HORIZONTAL, command=grid.xview)
+        grid.configure(yscrollcommand=y_scroll.set, xscrollcommand=x_scroll.set)
+        y_scroll.pack(side=tk.RIGHT, fill=tk.Y)
+        x_scroll.pack(side=tk.BOTTOM, fill=tk.X)
+        grid.pack(side=tk.LEFT, fill=tk.BOTH, expand=True)
+        return grid
+
+    def index_advisor_window(self):
+        """Shows the recorded workload and proposes indexes for its full scans and sorts."""
+        if not self.current_db:
+            messagebox.showwarning("Warning", "Please open a database first")
+            return
+        engine = self.engine
+        advisor_win = tk.Toplevel(self.root)
+        advisor_win.title("Index Advisor")
+
+        ttk.Label(advisor_win, text="Recorded workload (browsing and Run Query):").pack(anchor="w", padx=5, pady=(5, 0))
+        workload_frame = ttk.Frame(advisor_win)
+        workload_frame.pack(fill=tk.BOTH, expand=True, padx=5)
+        workload_tree = self.make_result_grid(workload_frame, ["Source", "Runs", "Avg ms", "Max ms", "Total ms",
+                                                               "Plan", "Statement"])
+        workload_tree.column("c5", width=250)
+        workload_tree.column("c6", width=400)
+
+        ttk.Label(advisor_win, text="Proposed indexes (verified against a scratch copy of the schema):").pack(
+            anchor="w", padx=5, pady=(5, 0))
+        proposals_frame = ttk.Frame(advisor_win)
+        proposals_frame.pack(fill=tk.BOTH, expand=True, padx=5)
+        proposals_tree = self.make_result_grid(proposals_frame, ["Index", "Statements", "Runs",
+                                                                 "Est. benefit (ms)", "Plan with index"])
+        proposals_tree.column("c0", width=350)
+        proposals_tree.column("c4", width=300)
+        status_var = tk.StringVar(value="")
+        ttk.Label(advisor_win, textvariable=status_var).pack(anchor="w", padx=5)
+        proposals = {}
+
+        def refresh_workload():
+            workload_tree.delete(*workload_tree.get_children())
+            for entry in engine.workload.entries():
+                plan = "; ".join(detail for _, _, detail in entry["plan"] or [])
+                workload_tree.insert("", tk.END, values=(
+                    entry["source"], entry["count"], f"{entry['total'] / entry['count'] * 1000:.2f}",
+                    f"{entry['max'] * 1000:.2f}", f"{entry['total'] * 1000:.2f}", plan, entry["sql"]))
+
+        def analyze():
+            entries = engine.workload.entries()
+            refresh_workload()
+
+            def done(results):
+                if not advisor_win.winfo_exists():
+                    return
+                proposals_tree.delete(*proposals_tree.get_children())
+                proposals.clear()
+                for proposal in results:
+                    item = proposals_tree.insert("", tk.END, values=(
+                        proposal["sql"], len(proposal["statements"]), proposal["runs"],
+                        f"{proposal['benefit'] * 1000:.2f}",
+                        "; ".join(detail for _, _, detail in proposal["plan"])))
+                    proposals[item] = proposal
+                status_var.set(f"{len(results)} index(es) proposed from {len(entries)} recorded statement(s)")
+
+            def failed(error):
+                messagebox.showerror("Error", f"Index analysis failed: {str(error)}", parent=advisor_win)
+
+            status_var.set("Analyzing workload...")
+            self.executor.submit(lambda task: engine.advise_indexes(entries, task.conn),
+                                 db=engine, on_done=done, on_error=failed)
+
+        def apply_selected():
+            selected = [proposals[item] for item in proposals_tree.selection() if item in proposals]
+            if not selected:
+                messagebox.showwarning("Warning", "Please select a proposed index", parent=advisor_win)
+                return
+
+            def work(task):
+                for proposal in selected:
+                    engine.create_index(proposal["sql"], task.conn)
+
+            def done(result):
+                self.set_status(f"{len(selected)} index(es) created")
+                if advisor_win.winfo_exists():
+                    engine.workload.clear()  # Recorded plans predate the new indexes
+                    refresh_workload()
+                    analyze()
+
+            def failed(error):
+                messagebox.showerror("Error", f"Failed to create index: {str(error)}", parent=advisor_win)
+
+            status_var.set("Creating index(es)...")
+            self.executor.submit(work, writer=engine, on_done=done, on_error=failed)
+
+        def clear_log():
+            engine.workload.clear()
+            refresh_workload()
+            proposals_tree.delete(*proposals_tree.get_children())
+            proposals.clear()
+
+        buttons = ttk.Frame(advisor_win)
+        buttons.pack(pady=5)
+        ttk.Button(buttons, text="Refresh Log", command=refresh_workload).pack(side=tk.LEFT, padx=2)
+        ttk.Button(buttons, text="Clear Log", command=clear_log).pack(side=tk.LEFT, padx=2)
+        ttk.Button(buttons, text="Analyze", command=analyze).pack(side=tk.LEFT, padx=2)
+        ttk.Button(buttons, text="Apply Selected", command=apply_selected).pack(side=tk.LEFT, padx=2)
+        analyze()
+
+    def concurrency_profile(self, db_path):
+        """Returns the concurrency settings of db_path, creating the defaults on first use."""
+        return self.concurrency.setdefault(db_path, {"busy_timeout": DEFAULT_BUSY_TIMEOUT_MS,
+                                                     "write_retries": DEFAULT_WRITE_RETRIES,
+                                                     "snapshot_reads": False})
+
+    def concurrency_dialog(self):
+        """Shows and changes how this database is shared with other programs writing to it.
+
+        WAL mode lets readers and one writer work at the same time; the busy
+        timeout and write retries ride out locks held by other connections;
+        snapshot browsing keeps the data view consistent while others write;
+        checkpoints move the write-ahead log back into the database file.
+        """
+        if not self.current_db:
+            messagebox.showwarning("Warning", "Please open a database first")
+            return
+        engine, profile = self.engine, self.concurrency_profile(self.current_db)
+        dialog = tk.Toplevel(self.root)
+        dialog.title("Concurrency Settings")
+        mode_var = tk.StringVar(value="")
+        busy_var = tk.IntVar(value=profile["busy_timeout"])
+        retries_var = tk.IntVar(value=profile["write_retries"])
+        snapshot_var = tk.BooleanVar(value=profile["snapshot_reads"])
+        wal_var = tk.StringVar(value="")
+        checkpoint_var = tk.StringVar(value=CHECKPOINT_MODES[0])
+        result_var = tk.StringVar(value="")
+
+        ttk.Label(dialog, text="Journal mode:").grid(row=0, column=0, sticky="w", padx=5, pady=2)
+        ttk.Label(dialog, textvariable=mode_var).grid(row=0, column=1, sticky="w", padx=5)
+        mode_btn = ttk.Button(dialog, text="Switch to WAL")
+        mode_btn.grid(row=0, column=2, sticky="ew", padx=5)
+        ttk.Label(dialog, text="Busy timeout (ms):").grid(row=1, column=0, sticky="w", padx=5, pady=2)
+        ttk.Spinbox(dialog, from_=0, to=600000, increment=500, textvariable=busy_var, width=10).grid(
+            row=1, column=1, sticky="w", padx=5)
+        ttk.Label(dialog, text="Write retries:").grid(row=2, column=0, sticky="w", padx=5, pady=2)
+        ttk.Spinbox(dialog, from_=0, to=50, textvariable=retries_var, width=10).grid(row=2, column=1, sticky="w", padx=5)
+        snapshot_check = ttk.Checkbutton(dialog, text="Browse tables through a consistent snapshot (WAL only)",
+                                         variable=snapshot_var)
+        snapshot_check.grid(row=3, column=0, columnspan=3, sticky="w", padx=5, pady=2)
+        ttk.Label(dialog, text="WAL size:").grid(row=4, column=0, sticky="w", padx=5, pady=2)
+        ttk.Label(dialog, textvariable=wal_var).grid(row=4, column=1, sticky="w", padx=5)
+        checkpoint_frame = ttk.Frame(dialog)
+        checkpoint_frame.grid(row=5, column=0, columnspan=3, sticky="w", padx=5, pady=2)
+        ttk.Label(checkpoint_frame, text="Checkpoint mode:").pack(side=tk.LEFT)
+        ttk.Combobox(checkpoint_frame, values=CHECKPOINT_MODES, textvariable=checkpoint_var, state="readonly",
+                     width=10).pack(side=tk.LEFT, padx=5)
+        checkpoint_btn = ttk.Button(checkpoint_frame, text="Checkpoint Now")
+        checkpoint_btn.pack(side=tk.LEFT)
+        ttk.Label(dialog, textvariable=result_var).grid(row=6, column=0, columnspan=3, sticky="w", padx=5)
+
+        def refresh():
+            if not dialog.winfo_exists() or engine is not self.engine:
+                return
+            try:
+                mode = engine.journal_mode()
             except Exception as e:
-                messagebox.showerror("Error", f"Query failed: {str(e)}")
-        
-        ttk.Button(query_win, text="Run Query", command=execute_query).pack(pady=5)
+                mode = f"unknown ({str(e)})"
+            wal = mode == "wal"
+            mode_var.set(mode.upper())
+            mode_btn.configure(text="Switch to Rollback Journal" if wal else "Switch to WAL")
+            snapshot_check.configure(state="normal" if wal else "disabled")
+            checkpoint_btn.configure(state="normal" if wal else "disabled")
+            wal_var.set(f"{engine.wal_size() / 1024:,.1f} KiB" if wal else "(no write-ahead log)")
+            dialog.after(WAL_REFRESH_MS, refresh)
+
+        def switch_mode():
+            target = "delete" if engine.journal_mode() == "wal" else "wal"
+            self.close_read_snapshot()
+            try:
+                mode = engine.set_journal_mode(target)
+                if mode != target:
+                    messagebox.showwarning("Warning", f"The database stayed in {mode.upper()} mode "
+                                                      "(other connections may be using it)", parent=dialog)
+                self.set_status(f"Journal mode: {mode.upper()}")
+            except Exception as e:
+                messagebox.showerror("Error", f"Failed to change journal mode: {str(e)}", parent=dialog)
+            if self.current_table:
+                self.reload_data_view()
+
+        def checkpoint():
+            def done(result):
+                busy, frames, checkpointed = result
+                blocked = " (blocked by readers or writers)" if busy else ""
+                if dialog.winfo_exists():
+                    result_var.set(f"Checkpointed {checkpointed:,} of {frames:,} WAL frames{blocked}")
+                self.set_status("Checkpoint finished")
+
+            def failed(error):
+                messagebox.showerror("Error", f"Checkpoint failed: {str(error)}", parent=dialog)
+
+            result_var.set("Checkpointing...")
+            mode = checkpoint_var.get()
+            self.executor.submit(lambda task: engine.checkpoint(mode, task.conn), writer=engine,
+                                 on_done=done, on_error=failed)
+
+        def apply():
+            try:
+                busy_timeout, retries = max(0, int(busy_var.get())), max(0, int(retries_var.get()))
+            except (tk.TclError, ValueError):
+                messagebox.showwarning("Warning", "Busy timeout and retries must be numbers", parent=dialog)
+                return
+            snapshot_changed = profile["snapshot_reads"] != snapshot_var.get()
+            profile.update(busy_timeout=busy_timeout, write_retries=retries, snapshot_reads=snapshot_var.get())
+            engine.set_busy_timeout(busy_timeout)
+            engine.set_write_retries(retries)
+            if snapshot_changed and self.current_table:
+                self.reload_data_view()
+            self.set_status("Concurrency settings applied")
+
+        mode_btn.configure(command=switch_mode)
+        checkpoint_btn.configure(command=checkpoint)
+        buttons = ttk.Frame(dialog)
+        buttons.grid(row=7, column=0, columnspan=3, pady=5)
+        ttk.Button(buttons, text="Apply", command=apply).pack(side=tk.LEFT, padx=2)
+        ttk.Button(buttons, text="Close", command=dialog.destroy).pack(side=tk.LEFT, padx=2)
+        refresh()
+
+    def cache_dialog(self):
+        """Shows the result cache that makes revisited tables and re-run queries instant, and sets its size.
+
+        Pages, row counts and the results of read-only queries are kept
+        until the database changes, least recently used first out once the
+        memory budget is reached.
+        """
+        if not self.current_db:
+            messagebox.showwarning("Warning", "Please open a database first")
+            return
+        engine = self.engine
+        dialog = tk.Toplevel(self.root)
+        dialog.title("Result Cache")
+        stats_var = tk.StringVar(value="")
+        budget_var = tk.IntVar(value=self.cache_budget // 1024 ** 2)
+        ttk.Label(dialog, textvariable=stats_var, justify=tk.LEFT).grid(row=0, column=0, columnspan=2, sticky="w",
+                                                                        padx=5, pady=5)
+        ttk.Label(dialog, text="Memory budget (MiB):").grid(row=1, column=0, sticky="w", padx=5)
+        ttk.Spinbox(dialog, from_=0, to=65536, increment=16, textvariable=budget_var, width=10).grid(
+            row=1, column=1, sticky="w", padx=5)
+
+        def refresh():
+            stats = engine.cache.stats()
+            lookups = stats["hits"] + stats["misses"]
+            hit_rate = f"{stats['hits'] / lookups:.0%}" if lookups else "-"
+            stats_var.set(f"Cached pages and results: {stats['entries']:,}\n"
+                          f"Memory used: {stats['bytes'] / 1024 ** 2:,.1f} of {stats['budget'] / 1024 ** 2:,.0f} MiB\n"
+                          f"Hits: {stats['hits']:,}   Misses: {stats['misses']:,}   Hit rate: {hit_rate}")
+
+        def apply():
+            try:
+                budget = max(0, int(budget_var.get())) * 1024 ** 2
+            except (tk.TclError, ValueError):
+                messagebox.showwarning("Warning", "The budget must be a number", parent=dialog)
+                return
+            self.cache_budget = budget
+            engine.cache.resize(budget)
+            refresh()
+            self.set_status("Result cache resized")
+
+        def clear():
+            engine.cache.clear()
+            refresh()
+            self.set_status("Result cache cleared")
+
+        buttons = ttk.Frame(dialog)
+        buttons.grid(row=2, column=0, columnspan=2, pady=5)
+        ttk.Button(buttons, text="Apply", command=apply).pack(side=tk.LEFT, padx=2)
+        ttk.Button(buttons, text="Clear", command=clear).pack(side=tk.LEFT, padx=2)
+        ttk.Button(buttons, text="Refresh", command=refresh).pack(side=tk.LEFT, padx=2)
+        ttk.Button(buttons, text="Close", command=dialog.destroy).pack(side=tk.LEFT, padx=2)
+        refresh()
+
+    def metrics_window(self):
+        """Shows rolling timings of every operation on the database, including drawing rows in the data view.
+
+        Comparing fetch (SQLite) with render (Tk) tells where the time of a
+        slow table goes. Trace SQL records every statement as well, and Save
+        Trace writes everything as JSON for offline analysis.
+        """
+        if not self.current_db:
+            messagebox.showwarning("Warning", "Please open a database first")
+            return
+        engine = self.engine
+        metrics_win = tk.Toplevel(self.root)
+        metrics_win.title(f"Metrics - {os.path.basename(self.current_db)}")
+        columns = ("count", "mean", "p50", "p95", "max", "total", "rows", "bytes", "errors")
+        headings = ("Runs", "Mean ms", "p50 ms", "p95 ms", "Max ms", "Total ms", "Rows", "Bytes", "Errors")
+        grid = ttk.Treeview(metrics_win, columns=columns, height=12)
+        grid.heading("#0", text="Operation")
+        grid.column("#0", width=110)
+        for col, heading in zip(columns, headings):
+            grid.heading(col, text=heading)
+            grid.column(col, width=80, anchor="e")
+        grid.pack(fill=tk.BOTH, expand=True, padx=5, pady=5)
+        trace_var = tk.BooleanVar(value=engine.metrics.tracing)
+
+        def refresh():
+            if not metrics_win.winfo_exists():
+                return
+            grid.delete(*grid.get_children())
+            for item in engine.metrics.summary():
+                grid.insert("", tk.END, text=item["operation"], values=(
+                    f"{item['count']:,}", f"{item['mean_ms']:,.2f}", f"{item['p50_ms']:,.2f}",
+                    f"{item['p95_ms']:,.2f}", f"{item['max_ms']:,.2f}", f"{item['total_ms']:,.0f}",
+                    f"{item['rows']:,}", f"{item['bytes']:,}", f"{item['errors']:,}"))
+            metrics_win.after(METRICS_REFRESH_MS, refresh)
+
+        def save_trace():
+            file_path = filedialog.asksaveasfilename(parent=metrics_win, defaultextension=".json",
+                                                     filetypes=[("JSON Files", "*.json")])
+            if not file_path:
+                return
+            try:
+                events = engine.metrics.dump(file_path)
+                self.set_status(f"Trace of {events:,} events saved")
+            except Exception as e:
+                messagebox.showerror("Error", f"Failed to save trace: {str(e)}", parent=metrics_win)
+
+        def reset():
+            engine.metrics.clear()
+            grid.delete(*grid.get_children())
+
+        buttons = ttk.Frame(metrics_win)
+        buttons.pack(fill=tk.X, padx=5, pady=5)
+        ttk.Checkbutton(buttons, text="Trace SQL statements", variable=trace_var,
+                        command=lambda: engine.set_tracing(trace_var.get())).pack(side=tk.LEFT)
+        ttk.Button(buttons, text="Close", command=metrics_win.destroy).pack(side=tk.RIGHT, padx=2)
+        ttk.Button(buttons, text="Reset", command=reset).pack(side=tk.RIGHT, padx=2)
+        ttk.Button(buttons, text="Save Trace...", command=save_trace).pack(side=tk.RIGHT, padx=2)
+        refresh()
+
+    def compare_databases_window(self):
+        """Compares the open database with another one (e.g. a backup or a staging copy) in the background.
+
+        Lists the schema differences, then each table's inserted, deleted and
+        changed rows; tables are hashed in chunks so only the chunks that
+        differ are read row by row (see DatabaseEngine.compare_database).
+        Save Sync Script writes the SQL bringing either database in line
+        with the other.
+        """
+        if not self.current_db:
+            messagebox.showwarning("Warning", "Please open a database first")
+            return
+        other = filedialog.askopenfilename(filetypes=[("SQLite Database", "*.db")], title="Compare With Database")
+        if not other:
+            return
+        engine = self.engine
+        compare_win = tk.Toplevel(self.root)
+        compare_win.title(f"Compare {os.path.basename(self.current_db)} with {os.path.basename(other)}")
+        status_var = tk.StringVar(value="Comparing...")
+        ttk.Label(compare_win, textvariable=status_var).pack(fill=tk.X, padx=5, pady=(5, 0))
+
+        ttk.Label(compare_win, text="Schema differences:").pack(anchor="w", padx=5, pady=(5, 0))
+        schema_grid = ttk.Treeview(compare_win, columns=("type", "name", "status", "detail"), show="headings",
+                                   height=4)
+        for col, heading, width in (("type", "Type", 70), ("name", "Name", 160), ("status", "Status", 90),
+                                    ("detail", "Detail", 380)):
+            schema_grid.heading(col, text=heading)
+            schema_grid.column(col, width=width)
+        schema_grid.pack(fill=tk.X, padx=5)
+
+        ttk.Label(compare_win, text="Tables:").pack(anchor="w", padx=5, pady=(5, 0))
+        table_grid = ttk.Treeview(compare_win, columns=("rows", "inserted", "deleted", "changed", "note"), height=7)
+        table_grid.heading("#0", text="Table")
+        table_grid.column("#0", width=160)
+        for col, heading in (("rows", "Rows"), ("inserted", "Inserted"), ("deleted", "Deleted"),
+                             ("changed", "Changed"), ("note", "")):
+            table_grid.heading(col, text=heading)
+            table_grid.column(col, width=80 if col != "note" else 220, anchor="e" if col != "note" else "w")
+        table_grid.pack(fill=tk.X, padx=5)
+
+        ttk.Label(compare_win, text="Rows of the selected table (this database -> other database):").pack(
+            anchor="w", padx=5, pady=(5, 0))
+        rows_frame = ttk.Frame(compare_win)
+        rows_frame.pack(fill=tk.BOTH, expand=True, padx=5)
+        row_grid = ttk.Treeview(rows_frame, columns=("change", "key", "values"), show="headings", height=10)
+        for col, heading, width in (("change", "Change", 80), ("key", "Key", 120), ("values", "Values", 500)):
+            row_grid.heading(col, text=heading)
+            row_grid.column(col, width=width)
+        row_scroll = ttk.Scrollbar(rows_frame, orient=tk.VERTICAL, command=row_grid.yview)
+        row_grid.configure(yscrollcommand=row_scroll.set)
+        row_scroll.pack(side=tk.RIGHT, fill=tk.Y)
+        row_grid.pack(side=tk.LEFT, fill=tk.BOTH, expand=True)
+        current = {"task": None, "comparison": None, "results": {}}
+
+        def show_rows(event):
+            row_grid.delete(*row_grid.get_children())
+            selection = table_grid.selection()
+            result = current["results"].get(selection[0]) if selection else None
+            if result is None:
+                return
+            for kind, key, here, there in result["differences"]:
+                if kind == "changed":
+                    values = "; ".join(f"{col}: {old!r} -> {new!r}" for col, old, new
+                                       in zip(result["columns"], here, there) if (type(old), old) != (type(new), new))
+                else:
+                    values = ", ".join(map(repr, here if there is None else there))
+                row_grid.insert("", tk.END, values=(kind, ", ".join(map(str, key)), values))
+            listed = len(result["differences"])
+            total = result["inserted"] + result["deleted"] + result["changed"]
+            if total > listed:
+                row_grid.insert("", tk.END, values=("", "", f"... {total - listed:,} more (the sync script has all)"))
+
+        def show(event):
+            if not compare_win.winfo_exists():
+                return
+            if event[0] == "progress":
+                status_var.set(f"Comparing {event[1]}: {event[2]:,} rows checked...")
+                return
+            result = event[1]
+            same = not (result["inserted"] or result["deleted"] or result["changed"])
+            item = table_grid.insert("", tk.END, text=result["table"], values=(
+                f"{result['rows']:,}", f"{result['inserted']:,}", f"{result['deleted']:,}", f"{result['changed']:,}",
+                "identical" if same else f"{len(result['ranges']):,} of {result['chunks']:,} chunks differ"))
+            current["results"][item] = result
+
+        def done(comparison):
+            task = current["task"]
+            current["comparison"] = comparison
+            if not compare_win.winfo_exists():
+                return
+            for difference in comparison["schema"]:
+                schema_grid.insert("", tk.END, values=difference)
+            for table, reason in comparison["skipped"]:
+                table_grid.insert("", tk.END, text=table, values=("", "", "", "", f"not compared: {reason}"))
+            differing = sum(1 for result in comparison["tables"]
+                            if result["inserted"] or result["deleted"] or result["changed"])
+            status_var.set(f"{len(comparison['schema']):,} schema differences, {differing:,} of "
+                           f"{len(comparison['tables']):,} tables with different rows ({task.elapsed:.1f}s)")
+            sync_btn.configure(state="normal")
+            self.set_status("Databases compared")
+
+        def failed(error):
+            if compare_win.winfo_exists():
+                status_var.set("Cancelled" if isinstance(error, TaskCancelled) else f"Failed: {error}")
+            if not isinstance(error, TaskCancelled):
+                messagebox.showerror("Error", f"Failed to compare databases: {str(error)}")
+
+        def save_sync_script():
+            comparison = current["comparison"]
+            target = "main" if target_var.get() == targets[0] else DIFF_ALIAS
+            file_path = filedialog.asksaveasfilename(parent=compare_win, defaultextension=".sql",
+                                                     filetypes=[("SQL Files", "*.sql")], title="Save Sync Script")
+            if not file_path:
+                return
+
+            def written(statements):
+                if compare_win.winfo_exists():
+                    status_var.set(f"Sync script of {statements:,} statements saved to {file_path}")
+                self.set_status("Sync script saved")
+
+            def failed_script(error):
+                if not isinstance(error, TaskCancelled):
+                    messagebox.showerror("Error", f"Failed to write sync script: {str(error)}")
+
+            status_var.set("Writing sync script...")
+            current["task"] = self.executor.submit(
+                lambda task: engine.write_sync_script(comparison, file_path, target, task),
+                on_done=written, on_error=failed_script)
+
+        def cancel():
+            task = current["task"]
+            if task is not None and task.running:
+                task.cancel()
+
+        def close():
+            cancel()
+            compare_win.destroy()
+
+        buttons = ttk.Frame(compare_win)
+        buttons.pack(fill=tk.X, padx=5, pady=5)
+        targets = (f"Update {os.path.basename(self.current_db)}", f"Update {os.path.basename(other)}")
+        target_var = tk.StringVar(value=targets[0])
+        ttk.Combobox(buttons, textvariable=target_var, values=targets, state="readonly", width=30).pack(
+            side=tk.LEFT, padx=2)
+        sync_btn = ttk.Button(buttons, text="Save Sync Script...", command=save_sync_script, state="disabled")
+        sync_btn.pack(side=tk.LEFT, padx=2)
+        ttk.Button(buttons, text="Close", command=close).pack(side=tk.RIGHT, padx=2)
+        ttk.Button(buttons, text="Cancel", command=cancel).pack(side=tk.RIGHT, padx=2)
+        table_grid.bind("<<TreeviewSelect>>", show_rows)
+        compare_win.protocol("WM_DELETE_WINDOW", close)
+        current["task"] = self.executor.submit(
+            lambda task: engine.compare_database(other, on_event=task.emit, task=task),
+            on_batch=show, on_done=done, on_error=failed)
+
+    def storage_window(self):
+        """Shows the space each table and index takes and runs maintenance on the database file.
+
+        Pages, bytes, fill and overflow pages come from SQLite's dbstat table
+        and are measured in the background, as is every maintenance action:
+        Analyze and Optimize refresh the query planner's statistics,
+        Incremental Vacuum and Vacuum give free pages back to the file system
+        and Vacuum Into writes a compacted copy without touching this file.
+        """
+        if not self.current_db:
+            messagebox.showwarning("Warning", "Please open a database first")
+            return
+        engine = self.engine
+        storage_win = tk.Toplevel(self.root)
+        storage_win.title(f"Storage - {os.path.basename(self.current_db)}")
+        summary_var = tk.StringVar(value="")
+        ttk.Label(storage_win, textvariable=summary_var, justify=tk.LEFT).pack(anchor="w", padx=5, pady=(5, 0))
+
+        grid_frame = ttk.Frame(storage_win)
+        grid_frame.pack(fill=tk.BOTH, expand=True, padx=5, pady=5)
+        grid = ttk.Treeview(grid_frame, columns=("type", "table", "pages", "size", "unused", "fill", "overflow"),
+                            height=15)
+        grid.heading("#0", text="Name")
+        grid.column("#0", width=180)
+        for col, heading, width in (("type", "Type", 60), ("table", "Table", 140), ("pages", "Pages", 80),
+                                    ("size", "MiB", 80), ("unused", "Unused MiB", 90), ("fill", "Fill", 60),
+                                    ("overflow", "Overflow Pages", 100)):
+            grid.heading(col, text=heading)
+            grid.column(col, width=width, anchor="w" if col in ("type", "table") else "e")
+        grid_scroll = ttk.Scrollbar(grid_frame, orient=tk.VERTICAL, command=grid.yview)
+        grid.configure(yscrollcommand=grid_scroll.set)
+        grid_scroll.pack(side=tk.RIGHT, fill=tk.Y)
+        grid.pack(side=tk.LEFT, fill=tk.BOTH, expand=True)
+
+        progress = ttk.Progressbar(storage_win, maximum=1.0)
+        progress.pack(fill=tk.X, padx=5)
+        status_var = tk.StringVar(value="")
+        ttk.Label(storage_win, textvariable=status_var).pack(anchor="w", padx=5)
+        auto_vacuum_modes = ("keep auto_vacuum",) + tuple(f"auto_vacuum {mode}" for mode in AUTO_VACUUM_MODES)
+        auto_vacuum_var = tk.StringVar(value=auto_vacuum_modes[0])
+        current = {"task": None, "action": None, "auto_vacuum": None}
+        mib = lambda size: f"{size / 1024 ** 2:,.1f}"
+
+        def show_progress(position):
+            done, total = position
+            if storage_win.winfo_exists():
+                progress["value"] = done / total if total else 1.0
+
+        def set_running(running):
+            for button in action_buttons:
+                button.configure(state="disabled" if running else "normal")
+            if current["auto_vacuum"] != "incremental":
+                incremental_btn.configure(state="disabled")
+            if running:
+                progress["value"] = 0
+
+        def run(action, work, on_done, **connection):
+            """Runs work(task) in the background with the action buttons disabled until it ends."""
+            current["action"] = action
+            set_running(True)
+            status_var.set(action[0].upper() + action[1:] + "...")
+            current["task"] = self.executor.submit(work, on_batch=show_progress, on_done=on_done, on_error=failed,
+                                                   **connection)
+
+        def failed(error):
+            if storage_win.winfo_exists():
+                set_running(False)
+                status_var.set("Cancelled" if isinstance(error, TaskCancelled) else f"Failed: {error}")
+            if not isinstance(error, TaskCancelled):
+                messagebox.showerror("Error", f"Failed to {current['action']}: {str(error)}")
+
+        def measured(storage):
+            task = current["task"]
+            if not storage_win.winfo_exists():
+                return
+            current["auto_vacuum"] = storage["auto_vacuum"]
+            set_running(False)
+            unused = sum(item["unused"] for item in storage["objects"])
+            summary_var.set(
+                f"File: {mib(storage['bytes'])} MiB in {storage['pages']:,} pages of {storage['page_size']:,} bytes\n"
+                f"Free pages: {storage['free_pages']:,} ({mib(storage['free_bytes'])} MiB); "
+                f"unused space inside pages: {mib(unused)} MiB\n"
+                f"Auto-vacuum: {storage['auto_vacuum']}"
+                + ("" if storage["auto_vacuum"] == "incremental"
+                   else " (Vacuum with auto_vacuum incremental to enable Incremental Vacuum)") + "\n"
+                f"Planner statistics: {'gathered' if storage['analyzed'] else 'none yet (run Analyze)'}")
+            grid.delete(*grid.get_children())
+            for item in storage["objects"]:
+                grid.insert("", tk.END, text=item["name"], values=(
+                    item["type"], item["table"] if item["type"] == "index" else "", f"{item['pages']:,}",
+                    mib(item["bytes"]), mib(item["unused"]), f"{item['fill']:.0%}", f"{item['overflow']:,}"))
+            status_var.set(f"Measured {len(storage['objects']):,} tables and indexes in {task.elapsed:.1f}s")
+
+        def measure():
+            run("measure the database", lambda task: engine.storage(on_event=task.emit, task=task, conn=task.conn),
+                measured, db=engine)
+
+        def maintain(action, work, report, reload=False):
+            """Runs work(conn) holding the read-write connection, shows report(result) and measures again."""
+            def done(result):
+                self.set_status(report(result))
+                if reload and engine is self.engine and self.current_table:
+                    self.reload_data_view()
+                if storage_win.winfo_exists():
+                    measure()
+            run(action, lambda task: work(task.conn), done, writer=engine)
+
+        def analyze():
+            maintain("analyze the database", lambda conn: engine.analyze(conn=conn),
+                     lambda result: "Planner statistics gathered")
+
+        def optimize():
+            maintain("optimize the database", lambda conn: engine.optimize(conn=conn),
+                     lambda result: "Database optimized")
+
+        def incremental_vacuum():
+            maintain("release free pages", lambda conn: engine.incremental_vacuum(conn=conn),
+                     lambda released: f"{released:,} free pages released")
+
+        def vacuum():
+            mode = auto_vacuum_var.get()
+            auto_vacuum = None if mode == auto_vacuum_modes[0] else mode.split()[-1]
+            if not messagebox.askyesno("Vacuum", "Vacuum rewrites the whole database file and needs space for a "
+                                                 "second copy while it runs. Continue?", parent=storage_win):
+                return
+
+            def start():
+                # VACUUM may renumber rowids, so staged edits and the snapshot's row keys cannot outlive it
+                self.close_read_snapshot()
+                maintain("vacuum the database", lambda conn: engine.vacuum(auto_vacuum, conn=conn),
+                         lambda shrunk: f"Database vacuumed, {mib(shrunk)} MiB smaller", reload=True)
+            self.resolve_staged_edits(then=start)
+
+        def vacuum_into():
+            target_path = filedialog.asksaveasfilename(parent=storage_win, defaultextension=".db",
+                                                       filetypes=[("SQLite Database", "*.db")],
+                                                       title="Write Compacted Copy As")
+            if not target_path:
+                return
+            if os.path.abspath(target_path) == os.path.abspath(engine.db_path):
+                messagebox.showwarning("Warning", "Please choose a different file for the copy", parent=storage_win)
+                return
+            if os.path.exists(target_path):
+                os.remove(target_path)  # The save dialog has already asked to replace it
+
+            def written(path):
+                if storage_win.winfo_exists():
+                    set_running(False)
+                    status_var.set(f"Compacted copy written to {path} ({mib(os.path.getsize(path))} MiB)")
+                self.set_status("Compacted copy written")
+            run("write a compacted copy", lambda task: engine.vacuum_into(target_path, task=task), written)
+
+        def cancel():
+            task = current["task"]
+            if task is not None and task.running:
+                task.cancel()
+
+        def close():
+            cancel()
+            storage_win.destroy()
+
+        buttons = ttk.Frame(storage_win)
+        buttons.pack(fill=tk.X, padx=5, pady=5)
+        action_buttons = [ttk.Button(buttons, text=text, command=command) for text, command in (
+            ("Refresh", measure), ("Analyze", analyze), ("Optimize", optimize),
+            ("Incremental Vacuum", incremental_vacuum), ("Vacuum", vacuum), ("Vacuum Into...", vacuum_into))]
+        incremental_btn = action_buttons[3]
+        for button in action_buttons[:5]:
+            button.pack(side=tk.LEFT, padx=2)
+        ttk.Combobox(buttons, textvariable=auto_vacuum_var, values=auto_vacuum_modes, state="readonly",
+                     width=22).pack(side=tk.LEFT, padx=2)
+        action_buttons[5].pack(side=tk.LEFT, padx=2)
+        ttk.Button(buttons, text="Close", command=close).pack(side=tk.RIGHT, padx=2)
+        ttk.Button(buttons, text="Cancel", command=cancel).pack(side=tk.RIGHT, padx=2)
+        storage_win.protocol("WM_DELETE_WINDOW", close)
+        measure()
+
+    def column_profile_window(self, table_name):
+        """Shows nulls, distinct counts, min/max, top values and a histogram for each column of table_name.
+
+        An estimate from a random sample appears first; the exact profile is
+        then computed in the background and replaces it column by column.
+        Exact profiles are cached until the data changes.
+        """
+        if not table_name:
+            messagebox.showwarning("Warning", "Please select a table first")
+            return
+        engine = self.engine
+        profile_win = tk.Toplevel(self.root)
+        profile_win.title(f"Column Profile: {table_name}")
+        status_var = tk.StringVar(value="Sampling...")
+        ttk.Label(profile_win, textvariable=status_var).pack(anchor="w", padx=5, pady=(5, 0))
+        grid_frame = ttk.Frame(profile_win)
+        grid_frame.pack(fill=tk.BOTH, expand=True, padx=5)
+        grid = self.make_result_grid(grid_frame, ["Column", "Type", "Nulls", "Distinct", "Min", "Max", "Top values"])
+        grid.column("c6", width=300)
+        detail = ttk.Frame(profile_win)
+        detail.pack(fill=tk.X, padx=5, pady=5)
+        canvas = tk.Canvas(detail, width=420, height=160, background="white")
+        canvas.pack(side=tk.LEFT)
+        top_text = scrolledtext.ScrolledText(detail, width=40, height=10)
+        top_text.pack(side=tk.LEFT, fill=tk.BOTH, expand=True, padx=(5, 0))
+        items, tasks = {}, []
+
+        def short(value):
+            text = "NULL" if value is None else str(value)
+            return text if len(text) <= 40 else text[:37] + "..."
+
+        def show(profile):
+            approx = "" if profile["exact"] else "~"
+            top = ", ".join(f"{short(value)} ({count:,})" for value, count in profile["top"][:3])
+            values = (profile["column"], profile["type"], f"{profile['null_fraction']:.1%}",
+                      f"{approx}{profile['distinct']:,}", short(profile["min"]), short(profile["max"]), top)
+            item = items.get(profile["column"])
+            if item is None:
+                item = grid.insert("", tk.END, values=values)
+                items[profile["column"]] = item
+            else:
+                grid.item(item, values=values)
+            profiles[item] = profile
+            if item in grid.selection():
+                show_detail()
+
+        def show_detail(event=None):
+            selected = grid.selection()
+            profile = profiles.get(selected[0]) if selected else None
+            canvas.delete("all")
+            top_text.configure(state="normal")
+            top_text.delete("1.0", tk.END)
+            if profile is None:
+                return
+            approx = "" if profile["exact"] else "~"
+            top_text.insert(tk.END, f"Top values of {profile['column']}:\n")
+            for value, count in profile["top"]:
+                top_text.insert(tk.END, f"{approx}{count:,}  {short(value)}\n")
+            top_text.configure(state="disabled")
+            buckets = profile["histogram"]
+            if not buckets:
+                canvas.create_text(210, 80, text="No numeric values")
+                return
+            width, height, tallest = 400, 130, max(count for _, _, count in buckets) or 1
+            bar = width / len(buckets)
+            for i, (low, high, count) in enumerate(buckets):
+                top = 10 + height - height * count / tallest
+                canvas.create_rectangle(10 + i * bar, top, 10 + (i + 1) * bar - 1, 10 + height, fill="#4a7ebb")
+            canvas.create_text(10, 150, text=short(buckets[0][0]), anchor="w")
+            canvas.create_text(410, 150, text=short(buckets[-1][1]), anchor="e")
+
+        profiles = {}
+        grid.bind("<<TreeviewSelect>>", show_detail)
+
+        def exact_done(result):
+            if profile_win.winfo_exists():
+                rows = result[0]["rows"] if result else 0
+                status_var.set(f"Exact profile of {rows:,} rows")
+
+        def failed(error):
+            if not profile_win.winfo_exists() or isinstance(error, TaskCancelled):
+                return
+            status_var.set("")
+            messagebox.showerror("Error", f"Failed to profile columns: {str(error)}", parent=profile_win)
+
+        def refine():
+            status_var.set(status_var.get() + "; computing the exact profile...")
+            tasks.append(self.executor.submit(
+                lambda task: engine.column_profiles(table_name, exact=True, task=task, conn=task.conn),
+                db=engine, on_batch=lambda profile: profile_win.winfo_exists() and show(profile),
+                on_done=exact_done, on_error=failed))
+
+        def sample_done(result):
+            if not profile_win.winfo_exists():
+                return
+            for profile in result:
+                show(profile)
+            if result and result[0]["exact"]:
+                exact_done(result)
+                return
+            rows = result[0]["rows"] if result else 0
+            status_var.set(f"Estimated from a random sample of ~{rows:,} rows")
+            refine()
+
+        cached = engine.cached_column_profiles(table_name)
+        if cached is not None:
+            sample_done(cached)
+            status_var.set(status_var.get() + " (cached)")
+        else:
+            tasks.append(self.executor.submit(
+                lambda task: engine.column_profiles(table_name, task=task, conn=task.conn),
+                db=engine, on_done=sample_done, on_error=failed))
+
+        def close():
+            for task in tasks:
+                if task.running:
+                    task.cancel()
+            profile_win.destroy()
+
+        ttk.Button(profile_win, text="Close", command=close).pack(pady=5)
+        profile_win.protocol("WM_DELETE_WINDOW", close)
 
     def show_tutorial(self):
         tutorial_window = tk.Toplevel(self.root)
@@ -643,11 +2779,47 @@ class DataManager:
             " - DEFAULT: Sets a default value if none is provided.\n\n"
             "Extra Features:\n"
             " - Run Query: Execute arbitrary SQL queries against the current database.\n"
-            " - Backup Database: Create a backup copy of the current database file.\n"
-            " - Import CSV: Import data from a CSV file into the selected table.\n"
-            " - Export to CSV: Export table data to a CSV file for use in spreadsheets.\n"
+            "   Queries run in the background; use Cancel to stop a slow query.\n"
+            "   Profile shows the query plan, timings and scan/sort statistics without keeping any changes.\n"
+            " - Backup Database: Create a consistent backup copy, even while other programs write to it.\n"
+            " - Scheduled Backups: Take periodic snapshots and keep only the newest few.\n"
+            " - Dump Database (SQL): Write the whole database as an SQL script (.sql.gz compresses it) that\n"
+            "   rebuilds it anywhere; Restore SQL Dump loads such a script into a new database file.\n"
+            " - Import CSV: Import data from a CSV file into the selected table. Select several files to\n"
+            "   parse them in parallel and load them together; rows that cannot be imported are listed.\n"
+            " - Export to CSV: Export table data to a CSV file for use in spreadsheets, or as a columnar\n"
+            "   snapshot (one NumPy .npy file per column) that analysis scripts can load without parsing.\n"
+            "   Import Columnar Snapshot (File menu) loads such a folder back into a table.\n"
+            " - Index Advisor (Tools menu): Review the statements run so far and create the indexes\n"
+            "   that would remove their full table scans and sorts.\n"
             " - Refresh: Quickly update the tables and data views.\n"
-            " - Search: Filter data rows by keywords.\n\n"
+            " - Search: Filter data rows by keywords. Build Search Index adds a full-text index for fast\n"
+            "   keyword search on large tables. Search All Tables looks for a value in every table at once\n"
+            "   and lists the matches by table; double-click one to open its table filtered by the value.\n"
+            " - Large tables: rows are loaded page by page as you scroll; the total row count appears when ready.\n"
+            " - Sorting: Click a column heading to sort by it (again for descending, a third time to unsort).\n"
+            "   Large tables sort fastest with an index on the column; you are offered one when it is missing.\n"
+            " - Stage edits: Add, edit and delete rows without saving each one; staged rows are highlighted.\n"
+            "   Undo (Ctrl+Z) takes back the last one, Commit saves them all in one transaction and Rollback\n"
+            "   discards them.\n"
+            " - Bulk Edit: Delete rows, or set a column to an SQL expression, for all selected rows, all rows\n"
+            "   matching the search or a WHERE clause, in a single statement. Preview shows how many rows change.\n"
+            " - Column Profile (Tools menu or right-click a table): Nulls, distinct values, min/max, top values\n"
+            "   and a histogram per column, estimated from a sample first and then computed exactly.\n"
+            " - Concurrency Settings (Tools menu): Switch to WAL mode so other programs can keep writing while you\n"
+            "   browse, set how long to wait for their locks, browse through a consistent snapshot, and checkpoint\n"
+            "   the write-ahead log.\n"
+            " - Metrics (Tools menu): Timings of every operation (connecting, reading the schema, fetching\n"
+            "   pages, drawing them, committing, importing, exporting) and the rows and bytes involved.\n"
+            "   Tick Trace SQL statements to record every statement too; Save Trace writes it all as JSON.\n"
+            " - Compare Databases (Tools menu): Compare with another database, e.g. a backup or a staging\n"
+            "   copy: schema differences and the inserted, deleted and changed rows of every table. Save\n"
+            "   Sync Script writes the SQL that brings either database in line with the other.\n"
+            " - Storage (Tools menu): Pages, size, fill and unused space of every table and index, and the\n"
+            "   file's free pages. Analyze and Optimize refresh the query planner's statistics; Vacuum and\n"
+            "   Incremental Vacuum give free space back; Vacuum Into writes a compacted copy.\n"
+            " - Result Cache (Tools menu): Tables you return to and queries you re-run are shown from memory\n"
+            "   until the data changes; set how much memory the cache may use.\n\n"
             "Usage:\n"
             "This SQLite Database Manager allows you to create and manage databases, tables, and data.\n"
             "Right-click on table names or data rows to access context-specific options.\n"
@@ -657,17 +2829,206 @@ class DataManager:
     
     # --------------------- Data Filtering (Search Feature) --------------------- #
     def filter_data(self, event):
-        """Filters displayed data rows based on search input."""
-        if not hasattr(self, 'all_rows'):
+        """Schedules a search of the current table once typing pauses."""
+        if self.search_after_id is not None:
+            self.root.after_cancel(self.search_after_id)
+        self.search_after_id = self.root.after(SEARCH_DEBOUNCE_MS, self.apply_search)
+
+    def apply_search(self):
+        """Reloads the data view with the search pushed into SQL (see search_filter)."""
+        self.search_after_id = None
+        if not self.current_table:
             return
-        
-        search_term = self.search_var.get().lower()
-        # Clear current displayed rows
-        self.data_tree.delete(*self.data_tree.get_children())
-        for row in self.all_rows:
-            # If search term is empty or is found in any cell, display the row
-            if not search_term or any(search_term in str(cell).lower() for cell in row):
-                self.data_tree.insert("", tk.END, values=row)
+        if self.search_var.get().strip() == self.search_term:
+            return  # e.g. arrow keys: nothing to re-run
+        try:
+            self.reload_data_view()
+        except Exception as e:
+            messagebox.showerror("Error", f"Search failed: {str(e)}")
+
+    def search_all_dialog(self):
+        """Searches every table for a value in the background, listing the matches grouped by table.
+
+        Tables and columns are searched side by side on several read-only
+        connections (see DatabaseEngine.search_all); double-click a match to
+        open its table filtered by the search term.
+        """
+        if not self.current_db:
+            messagebox.showwarning("Warning", "Please open a database first")
+            return
+        dialog = tk.Toplevel(self.root)
+        dialog.title("Search All Tables")
+        term_var = tk.StringVar(value=self.search_var.get().strip())
+        limit_var = tk.IntVar(value=SEARCH_HITS_PER_TABLE)
+        status_var = tk.StringVar(value="")
+
+        controls = ttk.Frame(dialog)
+        controls.pack(fill=tk.X, padx=5, pady=5)
+        ttk.Label(controls, text="Find:").pack(side=tk.LEFT)
+        term_entry = ttk.Entry(controls, textvariable=term_var, width=40)
+        term_entry.pack(side=tk.LEFT, fill=tk.X, expand=True, padx=5)
+        ttk.Label(controls, text="Matches per table:").pack(side=tk.LEFT)
+        ttk.Spinbox(controls, from_=1, to=10000, textvariable=limit_var, width=6).pack(side=tk.LEFT, padx=5)
+        search_btn = ttk.Button(controls, text="Search")
+        search_btn.pack(side=tk.LEFT, padx=2)
+        progress = ttk.Progressbar(dialog, maximum=1.0)
+        progress.pack(fill=tk.X, padx=5)
+
+        tree_frame = ttk.Frame(dialog)
+        tree_frame.pack(fill=tk.BOTH, expand=True, padx=5, pady=5)
+        results = ttk.Treeview(tree_frame, columns=("column", "key", "value"), height=18)
+        results.heading("#0", text="Table")
+        results.heading("column", text="Column")
+        results.heading("key", text="Row key")
+        results.heading("value", text="Value")
+        results.column("#0", width=180)
+        results.column("column", width=120)
+        results.column("key", width=80)
+        results.column("value", width=360)
+        scroll = ttk.Scrollbar(tree_frame, orient=tk.VERTICAL, command=results.yview)
+        results.configure(yscrollcommand=scroll.set)
+        scroll.pack(side=tk.RIGHT, fill=tk.Y)
+        results.pack(side=tk.LEFT, fill=tk.BOTH, expand=True)
+        ttk.Label(dialog, textvariable=status_var).pack(fill=tk.X, padx=5)
+        current = {"task": None, "term": "", "limit": SEARCH_HITS_PER_TABLE, "groups": {}, "counts": {}, "errors": 0}
+
+        def show(event):
+            task = current["task"]
+            if not dialog.winfo_exists() or task is None:
+                return
+            if event[0] == "progress":
+                _, done, total = event
+                progress["value"] = done / total if total else 1.0
+                status_var.set(f"Searched {done:,} of {total:,} columns, {task.rows:,} matches "
+                               f"({task.elapsed:.1f}s)")
+                return
+            table = event[1]
+            if table not in current["groups"]:
+                current["groups"][table] = results.insert("", tk.END, text=table, open=True)
+                current["counts"][table] = 0
+            group = current["groups"][table]
+            if event[0] == "error":
+                current["errors"] += 1
+                results.insert(group, tk.END, values=("", "", f"Not searched: {event[2]}"))
+                return
+            for column, key, value in event[2]:
+                results.insert(group, tk.END, text="", values=(column, "" if key is None else key, value))
+            current["counts"][table] += len(event[2])
+            count = current["counts"][table]
+            capped = " (first matches only)" if count >= current["limit"] else ""
+            results.item(group, text=f"{table} - {count:,}{capped}")
+
+        def start():
+            term = term_var.get().strip()
+            if not term:
+                messagebox.showwarning("Warning", "Please enter a value to search for", parent=dialog)
+                return
+            try:
+                limit = max(1, int(limit_var.get()))
+            except (tk.TclError, ValueError):
+                messagebox.showwarning("Warning", "Matches per table must be a number", parent=dialog)
+                return
+            results.delete(*results.get_children())
+            current.update(term=term, limit=limit, groups={}, counts={}, errors=0)
+            progress["value"] = 0
+            status_var.set("Searching...")
+
+            def done(found):
+                task = current["task"]
+                if not dialog.winfo_exists():
+                    return
+                search_btn.configure(text="Search", command=start)
+                matched = sum(1 for count in found.values() if count)
+                note = f", {current['errors']} could not be searched" if current["errors"] else ""
+                status_var.set(f"{sum(found.values()):,} matches in {matched:,} of {len(found):,} tables{note} "
+                               f"({task.elapsed:.1f}s)")
+                self.set_status("Search of all tables finished")
+
+            def failed(error):
+                if dialog.winfo_exists():
+                    search_btn.configure(text="Search", command=start)
+                if isinstance(error, TaskCancelled):
+                    if dialog.winfo_exists():
+                        status_var.set(status_var.get() + " - cancelled")
+                    self.set_status("Search cancelled")
+                else:
+                    messagebox.showerror("Error", f"Search failed: {str(error)}")
+
+            search_btn.configure(text="Cancel", command=cancel_search)
+            current["task"] = self.executor.submit(
+                lambda task: self.engine.search_all(term, hits_per_table=limit, on_event=task.emit, task=task),
+                on_batch=show, on_done=done, on_error=failed)
+
+        def cancel_search():
+            task = current["task"]
+            if task is not None and task.running:
+                task.cancel()
+
+        def open_match(event):
+            item = results.focus()
+            if not item:
+                return
+            group = results.parent(item) or item
+            table = next((name for name, node in current["groups"].items() if node == group), None)
+            if table is None:
+                return
+            self.search_var.set(current["term"])
+            if table == self.current_table:
+                self.apply_search()
+            else:
+                self.select_table(table)
+
+        def close():
+            cancel_search()
+            dialog.destroy()
+
+        search_btn.configure(command=start)
+        term_entry.bind("<Return>", lambda event: start())
+        results.bind("<Double-1>", open_match)
+        dialog.protocol("WM_DELETE_WINDOW", close)
+        term_entry.focus_set()
+        if term_var.get():
+            start()
+
+    def update_search_index_button(self):
+        indexed = bool(self.current_table) and self.engine.has_search_index(self.current_table)
+        self.search_index_btn.configure(text="Drop Search Index" if indexed else "Build Search Index")
+
+    def toggle_search_index(self):
+        """Builds (or drops) an FTS5 keyword index for the current table in the background."""
+        if not self.current_table:
+            messagebox.showwarning("Warning", "Please select a table first")
+            return
+        table = self.current_table
+        if self.engine.has_search_index(table):
+            if messagebox.askyesno("Confirm", f"Drop the search index of '{table}'?"):
+                try:
+                    self.engine.drop_search_index(table)
+                    self.load_tables()
+                    self.select_table(table)
+                    self.set_status("Search index dropped")
+                except Exception as e:
+                    messagebox.showerror("Error", f"Failed to drop search index: {str(e)}")
+            return
+        columns = text_columns(self.columns_info)
+        if not columns:
+            messagebox.showwarning("Warning", f"Table '{table}' has no text columns to index")
+            return
+        if self.page_key != "rowid":
+            messagebox.showwarning("Warning", "Search indexes are only supported on tables with a rowid")
+            return
+
+        def done(result):
+            self.load_tables()
+            self.select_table(table)
+            self.set_status("Search index built")
+
+        def failed(error):
+            messagebox.showerror("Error", f"Failed to build search index: {str(error)}")
+
+        self.status_var.set(f"Building search index for {table}...")
+        self.executor.submit(lambda task: self.engine.create_search_index(table, columns, task.conn),
+                             writer=self.engine, on_done=done, on_error=failed)
 
 if __name__ == "__main__":
     root = tk.Tk()
@@ -0,0 +1,167 @@
+"""Tests of the headless engine (db_engine). Run with: python -m pytest"""
+import csv
+
+import pytest
+
+from db_engine import DatabaseEngine
+
+
+@pytest.fixture
+def engine(tmp_path):
+    engine = DatabaseEngine.create(str(tmp_path / "test.db"))
+    yield engine
+    engine.close()
+
+
+def make_people(engine, rows=250):
+    engine.execute_script(["CREATE TABLE people (id INTEGER PRIMARY KEY, name TEXT, age INTEGER)"] +
+                          [f"INSERT INTO people (name, age) VALUES ('person {i}', {20 + i % 50})"
+                           for i in range(rows)])
+
+
+def all_pages(engine, table, page_size, where=None, params=()):
+    page_key = engine.page_key(table)
+    rows, last_key = [], None
+    while True:
+        page, last_key = engine.page(table, page_key, last_key, len(rows), page_size, where, params)
+        if not page:
+            return rows
+        assert len(page) <= page_size
+        rows += page
+
+
+def test_keyset_paging_reads_every_row_once(engine):
+    make_people(engine)
+    assert engine.page_key("people") == "rowid"
+    rows = all_pages(engine, "people", 40)
+    assert [row[0] for row in rows] == list(range(1, 251))
+
+
+def test_keyset_paging_applies_the_filter(engine):
+    make_people(engine)
+    rows = all_pages(engine, "people", 7, "age = ?", (21,))
+    assert rows and all(row[2] == 21 for row in rows)
+    assert len(rows) == engine.count("people", "age = ?", (21,))
+
+
+def test_paging_without_rowid_uses_the_primary_key(engine):
+    engine.execute_script(["CREATE TABLE codes (code TEXT PRIMARY KEY, n INTEGER) WITHOUT ROWID"] +
+                          [f"INSERT INTO codes VALUES ('c{i:03}', {i})" for i in range(30)])
+    assert engine.page_key("codes") == "code"
+    assert [row[1] for row in all_pages(engine, "codes", 8)] == list(range(30))
+
+
+def test_csv_export_and_import_round_trip(engine, tmp_path):
+    make_people(engine, rows=40)
+    path = str(tmp_path / "people.csv")
+    sql, params = engine.table_export_query("people")
+    assert engine.export_csv(sql, path, params) == 40
+    with open(path, newline="", encoding="utf-8") as f:
+        assert next(csv.reader(f)) == ["id", "name", "age"]
+
+    assert engine.import_csv(path, "copy", create_table=True) == 40
+    assert engine.reader.execute("SELECT * FROM copy ORDER BY id").fetchall() == \
+        engine.reader.execute("SELECT * FROM people ORDER BY id").fetchall()
+
+
+def test_compressed_csv_export(engine, tmp_path):
+    make_people(engine, rows=10)
+    path = str(tmp_path / "people.csv.gz")
+    sql, params = engine.table_export_query("people")
+    assert engine.export_csv(sql, path, params, compress=True) == 10
+    with open(path, "rb") as f:
+        assert f.read(2) == b"\x1f\x8b"
+
+
+def test_dump_and_restore(engine, tmp_path):
+    make_people(engine, rows=60)
+    engine.execute_script(["CREATE INDEX people_age ON people (age)",
+                           "CREATE TABLE blobs (k BLOB PRIMARY KEY, v REAL) WITHOUT ROWID",
+                           "INSERT INTO blobs VALUES (x'00ff', 1.5), (x'01', NULL)"])
+    dump_path = str(tmp_path / "dump.sql.gz")
+    assert engine.dump(dump_path) == {"people": 60, "blobs": 2}
+
+    restored = DatabaseEngine.create(str(tmp_path / "restored.db"))
+    try:
+        restored.restore(dump_path)
+        assert sorted(restored.tables()) == ["blobs", "people"]
+        assert "people_age" in [index[0] for index in restored.catalog.indexes("people")]
+        for table in ("people", "blobs"):
+            assert restored.reader.execute(f"SELECT * FROM {table} ORDER BY 1").fetchall() == \
+                engine.reader.execute(f"SELECT * FROM {table} ORDER BY 1").fetchall()
+    finally:
+        restored.close()
+
+
+def test_compare_and_sync(engine, tmp_path):
+    make_people(engine, rows=100)
+    other_path = str(tmp_path / "other.db")
+    engine.backup(other_path)
+    other = DatabaseEngine(other_path)
+    try:
+        other.execute_script(["DELETE FROM people WHERE id = 5",
+                              "UPDATE people SET age = 99 WHERE id = 50",
+                              "INSERT INTO people (id, name, age) VALUES (500, 'new', 1)"])
+    finally:
+        other.close()
+
+    comparison = engine.compare_database(other_path)
+    assert comparison["schema"] == []
+    [result] = comparison["tables"]
+    assert result["inserted"] + result["deleted"] + result["changed"] == 3
+
+    script_path = str(tmp_path / "sync.sql")
+    assert engine.write_sync_script(comparison, script_path) == 3
+    engine.restore(script_path)
+    [result] = engine.compare_database(other_path)["tables"]
+    assert (result["inserted"], result["deleted"], result["changed"]) == (0, 0, 0)
+
+
+def test_keys_filter_selects_the_given_rows(engine):
+    make_people(engine, rows=20)
+    where, params = engine.keys_filter("people", [(3,), (7,), (11,)])
+    assert engine.count("people", where, params) == 3
+    assert engine.bulk_update("people", "age", "age + 100", where, params) == 3
+    assert engine.count("people", "age >= 100") == 3
+
+
+def test_keys_filter_with_a_composite_key(engine):
+    engine.execute_script(["CREATE TABLE pairs (a, b, v, PRIMARY KEY (a, b)) WITHOUT ROWID",
+                           "INSERT INTO pairs VALUES (1, 'x', 1), (1, 'y', 2), (2, 'x', 3)"])
+    assert engine.bulk_delete("pairs", *engine.keys_filter("pairs", [(1, "y"), (2, "x")])) == 2
+    assert engine.reader.execute("SELECT v FROM pairs").fetchall() == [(1,)]
+
+
+def test_keys_filter_matches_blob_keys(engine):
+    engine.execute_script(["CREATE TABLE t (k BLOB PRIMARY KEY, v) WITHOUT ROWID",
+                           "INSERT INTO t VALUES (x'0001', 1), (x'02', 2), ('text', 3), (1e999, 4)"])
+    where, params = engine.keys_filter("t", [(b"\x00\x01",), ("text",), (float("inf"),)])
+    assert engine.count("t", where, params) == 3
+    assert engine.bulk_delete("t", *engine.keys_filter("t", [(b"\x02",)])) == 1
+    assert engine.count("t") == 3
+
+
+def search_count(engine, table, term):
+    where, params = engine.search_filter(table, term)
+    return engine.count(table, where, params)
+
+
+def test_search_index_create_rename_drop(engine):
+    engine.execute_script(["CREATE TABLE notes (body TEXT)",
+                           "INSERT INTO notes VALUES ('apple pie'), ('banana bread'), ('apple tart')"])
+    engine.create_search_index("notes")
+    assert engine.has_search_index("notes")
+    assert engine.tables() == ["notes"]
+    assert search_count(engine, "notes", "apple") == 2
+
+    engine.execute_script(["INSERT INTO notes VALUES ('apple crumble')"])  # Kept in sync by the triggers
+    assert search_count(engine, "notes", "apple") == 3
+
+    assert engine.rename_table("notes", "recipes") is True
+    assert not engine.has_search_index("recipes")
+    assert engine.catalog.tables() == ["recipes"]
+    assert search_count(engine, "recipes", "apple") == 3  # Falls back to scanning
+
+    engine.create_search_index("recipes")
+    engine.drop_table("recipes")
+    assert engine.catalog.tables() == []